@@ -2,11 +2,12 @@
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, UserProfile, EmailVerification, PasswordResetToken, LoginAttempt, UserSession
+from .db_router import ReplicaChangeListMixin
+from .models import User, UserProfile, EmailVerification, PasswordResetToken, LoginAttempt, UserSession, OutboundEmail
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(ReplicaChangeListMixin, BaseUserAdmin):
     list_display = ('username', 'email', 'is_active', 'is_verified', 'is_staff', 'date_joined')
     list_filter = ('is_active', 'is_staff', 'is_verified', 'is_under_13', 'date_joined')
     search_fields = ('username', 'email')
@@ -29,7 +30,7 @@ class UserAdmin(BaseUserAdmin):
     )
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'is_premium', 'robux_balance', 'friends_count', 'created_at')
     list_filter = ('is_premium', 'theme', 'language')
     search_fields = ('user__username', 'user__email')
@@ -37,7 +38,7 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(EmailVerification)
-class EmailVerificationAdmin(admin.ModelAdmin):
+class EmailVerificationAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'token', 'created_at', 'expires_at', 'is_used')
     list_filter = ('is_used', 'created_at')
     search_fields = ('user__username', 'user__email', 'token')
@@ -45,7 +46,7 @@ class EmailVerificationAdmin(admin.ModelAdmin):
 
 
 @admin.register(PasswordResetToken)
-class PasswordResetTokenAdmin(admin.ModelAdmin):
+class PasswordResetTokenAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'token', 'created_at', 'expires_at', 'is_used', 'ip_address')
     list_filter = ('is_used', 'created_at')
     search_fields = ('user__username', 'user__email', 'token')
@@ -53,7 +54,7 @@ class PasswordResetTokenAdmin(admin.ModelAdmin):
 
 
 @admin.register(LoginAttempt)
-class LoginAttemptAdmin(admin.ModelAdmin):
+class LoginAttemptAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('username_or_email', 'ip_address', 'success', 'attempted_at')
     list_filter = ('success', 'attempted_at')
     search_fields = ('username_or_email', 'ip_address')
@@ -61,8 +62,17 @@ class LoginAttemptAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserSession)
-class UserSessionAdmin(admin.ModelAdmin):
+class UserSessionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'device_type', 'ip_address', 'is_active', 'last_activity')
     list_filter = ('is_active', 'device_type', 'created_at')
     search_fields = ('user__username', 'ip_address', 'session_key')
-    readonly_fields = ('created_at', 'last_activity')
\ No newline at end of file
+    readonly_fields = ('created_at', 'last_activity')
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('subject', 'to_email', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject')
+    readonly_fields = ('created_at', 'claimed_at', 'sent_at', 'last_error')
+    # Bodies carry OTP codes and password reset links
+    exclude = ('body', 'html_body')
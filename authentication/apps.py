@@ -8,4 +8,5 @@ class AuthenticationConfig(AppConfig):
     name = 'authentication'
 
     def ready(self):
-        import authentication.signals # Import signals when app is ready
\ No newline at end of file
+        import authentication.signals # Import signals when app is ready
+        import authentication.db_pool  # Pool metrics reporter (connection_created)
\ No newline at end of file
@@ -0,0 +1,172 @@
+# authentication/assets.py
+
+import hashlib
+import json
+import posixpath
+import re
+import threading
+from pathlib import Path
+from django.conf import settings
+from .fontawesome import get_fontawesome_build_root, minify_css
+
+
+BUNDLE_DIR = 'bundles'
+MANIFEST_NAME = 'bundles.json'
+
+STYLESHEET_RE = re.compile(r'<link[^>]+rel="stylesheet"[^>]+href="([^"]+)"', re.I)
+SCRIPT_RE = re.compile(r'<script[^>]+src="([^"]+)"', re.I)
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+HTML_TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9-]*)')
+HTML_CLASS_RE = re.compile(r'\bclass="([^"]*)"')
+HTML_ID_RE = re.compile(r'\bid="([^"]*)"')
+
+SELECTOR_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][_a-zA-Z0-9-]*)')
+SELECTOR_ID_RE = re.compile(r'#(-?[_a-zA-Z][_a-zA-Z0-9-]*)')
+SELECTOR_TAG_RE = re.compile(r'(?:^|[\s>+~(])([a-zA-Z][a-zA-Z0-9-]*)')
+
+# Bytes of <body> treated as "above the fold" when picking critical rules
+DEFAULT_CRITICAL_HTML_BYTES = 12000
+
+
+def get_assets_build_root():
+    """Same build root as the Font Awesome subset; both shadow app static"""
+    return get_fontawesome_build_root()
+
+# ============================
+# CSS HELPERS
+# ============================
+
+def split_css_rules(css):
+    """
+    Split a stylesheet into top-level (prelude, body) pairs.
+    At-rules with nested blocks (@media, @supports) keep their raw body.
+    """
+    rules = []
+    depth = 0
+    start = 0
+    prelude = None
+
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+
+    for i, char in enumerate(css):
+        if char == '{':
+            if depth == 0:
+                prelude = css[start:i].strip()
+                start = i + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append((prelude, css[start:i]))
+                start = i + 1
+        elif char == ';' and depth == 0:
+            # Statement at-rules such as @import or @charset
+            rules.append((css[start:i + 1].strip(), None))
+            start = i + 1
+    return rules
+
+
+def _selector_matches(selector, tokens):
+    """True if every class, id and tag the selector needs is in the page"""
+    # Pseudo classes/elements and attribute selectors don't change the verdict
+    plain = re.sub(r'::?[a-zA-Z-]+(\([^)]*\))?|\[[^\]]*\]', '', selector)
+
+    classes = SELECTOR_CLASS_RE.findall(plain)
+    ids = SELECTOR_ID_RE.findall(plain)
+    tags = [t.lower() for t in SELECTOR_TAG_RE.findall(re.sub(r'[.#][_a-zA-Z0-9-]+', ' ', plain))]
+
+    return (
+        all(c in tokens['classes'] for c in classes)
+        and all(i in tokens['ids'] for i in ids)
+        and all(t in tokens['tags'] for t in tags)
+    )
+
+
+def html_tokens(html, limit=DEFAULT_CRITICAL_HTML_BYTES):
+    """Tags, classes and ids used in the head and first bytes of the body"""
+    body_at = html.find('<body')
+    fold = html[:body_at + limit] if body_at != -1 else html[:limit]
+
+    classes = set()
+    for value in HTML_CLASS_RE.findall(fold):
+        classes.update(value.split())
+
+    return {
+        'tags': {t.lower() for t in HTML_TAG_RE.findall(fold)} | {'html', 'body'},
+        'classes': classes,
+        'ids': set(HTML_ID_RE.findall(fold)),
+    }
+
+
+def critical_css(css, tokens):
+    """Keep the rules whose selectors match elements above the fold"""
+    kept = []
+    for prelude, body in split_css_rules(css):
+        if body is None:
+            continue
+
+        if prelude.startswith('@media') or prelude.startswith('@supports'):
+            inner = critical_css(body, tokens)
+            if inner:
+                kept.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            # @font-face, @keyframes: left to the full bundle
+            continue
+        elif any(_selector_matches(s.strip(), tokens) for s in prelude.split(',')):
+            kept.append(f'{prelude}{{{body}}}')
+
+    return minify_css(''.join(kept))
+
+
+def absolutize_css_urls(css, static_path):
+    """Rewrite relative url()s so the CSS still works from the bundle directory"""
+    base = posixpath.dirname(static_path)
+
+    def rewrite(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(base, url))
+        return f'url({quote}{settings.STATIC_URL}{resolved}{quote})'
+
+    return CSS_URL_RE.sub(rewrite, css)
+
+
+def hashed_name(stem, content, suffix):
+    digest = hashlib.md5(content.encode()).hexdigest()[:12]
+    return f'{BUNDLE_DIR}/{stem}.{digest}.{suffix}'
+
+
+def minify_js(js):
+    """Conservative JS minification: strips full-line // comments and blank lines"""
+    lines = []
+    for line in js.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines)
+
+# ============================
+# MANIFEST
+# ============================
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_bundle_manifest():
+    """Return {template_name: {css, js, critical}} written by build_assets"""
+    global _manifest
+
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                path = Path(get_assets_build_root()) / BUNDLE_DIR / MANIFEST_NAME
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        _manifest = json.load(f)
+                except (OSError, ValueError):
+                    _manifest = {}
+    return _manifest
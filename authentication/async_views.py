@@ -0,0 +1,304 @@
+# authentication/async_views.py
+
+from django.shortcuts import render, redirect
+from django.contrib.auth import alogin, get_user_model
+from django.contrib import messages
+from django.db import IntegrityError
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_http_methods
+import logging
+
+from .forms import SignupForm, LoginForm
+from .models import EmailVerification, OutboundEmail
+from .mail_queue import aget_email_status, queued_email_id
+from .identity import aauthenticate_user
+from .hashing import HashingOverloaded, apply_pending_rehash, pending_rehash
+from .otp_store import OTP_EXPIRED, OTP_LOCKED, OTP_VALID
+from .utils import (
+    asend_verification_email, asend_otp_email, acheck_rate_limit, alog_login_attempt, acreate_user_session, get_client_ip, get_user_agent, aissue_otp, averify_otp, aallow_otp_resend, load_otp_challenge, dump_otp_challenge
+)
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+# Async versions of the signup, login and OTP views, routed instead of
+# the ones in views.py when ASYNC_AUTH_VIEWS is on (ASGI deployments).
+# Every database, hashing and mail call is awaited, so a worker keeps
+# serving other requests while one waits on Argon2, the database or SMTP.
+
+
+async def _load_user(request):
+    """
+    Resolve request.user (and with it the session) up front.
+    Templates, context processors and the messages framework then read
+    them from memory instead of querying synchronously inside the loop.
+    """
+    request.user = await request.auser()
+    return request.user
+
+# ============================
+# SIGNUP VIEW
+# ============================
+
+@never_cache
+@require_http_methods(["GET", "POST"])
+async def signup_view(request):
+    """User registration view"""
+
+    if (await _load_user(request)).is_authenticated:
+        return redirect('authentication:games')
+
+    if request.method == 'POST':
+        form = SignupForm(request.POST)
+
+        if await form.ais_valid():
+            try:
+                user = await form.asave()
+
+                verification = await EmailVerification.objects.acreate(user=user)
+
+                email_sent = await asend_verification_email(user, verification.token)
+
+                if email_sent:
+                    messages.success(
+                        request,
+                        f'Account created successfully! Please check {user.email} to verify your account.',
+                        extra_tags='success'
+                    )
+                    logger.info(f"User registered: {user.username} ({user.email})")
+                else:
+                    messages.warning(
+                        request,
+                        'Account created but verification email failed to send. Please contact support.',
+                        extra_tags='warning'
+                    )
+                    logger.warning(f"Failed to send verification email for {user.email}")
+
+                return redirect('authentication:join')
+
+            except HashingOverloaded:
+                # Let HashingOverloadMiddleware answer with a 429
+                raise
+            except IntegrityError as e:
+                # A concurrent signup claimed the name after validation; the unique index caught it
+                logger.info(f"Signup lost a uniqueness race: {str(e)}")
+                messages.error(
+                    request,
+                    'This username or email is already taken',
+                    extra_tags='error'
+                )
+            except Exception as e:
+                logger.error(f"Signup error: {str(e)}")
+                messages.error(
+                    request,
+                    'An error occurred during registration. Please try again.',
+                    extra_tags='error'
+                )
+        else:
+            for field, errors in form.errors.items():
+                for error in errors:
+                    messages.error(request, error, extra_tags='error')
+
+    else:
+        form = SignupForm()
+
+    return render(request, 'authentication/auth.html', {'form': form})
+
+# ============================
+# LOGIN VIEW (Step 1: Email + Password)
+# ============================
+
+@never_cache
+@require_http_methods(["GET", "POST"])
+async def login_view(request):
+    """User login view with rate limiting - Step 1: Verify credentials"""
+
+    if (await _load_user(request)).is_authenticated:
+        return redirect('authentication:games')
+
+    if request.method == 'POST':
+        form = LoginForm(request.POST)
+
+        if form.is_valid():
+            username_or_email = form.cleaned_data.get('username')
+            password = form.cleaned_data.get('password')
+            remember_me = form.cleaned_data.get('remember_me')
+
+            ip_address = get_client_ip(request)
+            user_agent = get_user_agent(request)
+
+            # In-process counters by default; no database involved
+            is_limited, attempt_count = await acheck_rate_limit(ip_address, username_or_email)
+
+            if is_limited:
+                messages.error(
+                    request,
+                    'Too many failed login attempts. Please try again in 15 minutes.',
+                    extra_tags='error'
+                )
+
+                logger.warning(f"Rate limit exceeded for {username_or_email} from {ip_address}")
+
+                return render(request, 'authentication/auth.html', {'form': form})
+
+            # An upgraded hash is saved with the login write after OTP
+            user = await aauthenticate_user(request, username_or_email, password, save_rehash=False)
+
+            await alog_login_attempt(username_or_email, ip_address, user_agent, success=user is not None)
+
+            if user is not None:
+                if not user.is_active:
+                    messages.error(request, 'Account is deactivated.', extra_tags='error')
+                    return render(request, 'authentication/auth.html', {'form': form})
+
+                if not user.is_verified:
+                    messages.warning(
+                        request,
+                        'Please verify your email first. Check your inbox.',
+                        extra_tags='warning'
+                    )
+                    return render(request, 'authentication/auth.html', {'form': form})
+
+                # The code goes to the OTP store; the users row isn't written
+                otp, challenge = await aissue_otp(user)
+
+                otp_email = await asend_otp_email(user, otp)
+                if otp_email:
+                    await request.session.aset('otp_challenge', challenge)
+                    await request.session.aset('remember_me', remember_me)
+                    await request.session.aset('otp_email_id', queued_email_id(otp_email))
+                    rehash = pending_rehash(user)
+                    if rehash:
+                        await request.session.aset('password_rehash', rehash)
+
+                    messages.info(
+                        request,
+                        'Please enter the code send to your email.',
+                        extra_tags='info'
+                    )
+
+                    return redirect('authentication:verify_otp')
+                else:
+                    messages.error(request, 'Failed to send verification code.', extra_tags='error')
+            else:
+                messages.error(request, 'Invalid username/email or password.', extra_tags='error')
+        else:
+            for field, errors in form.errors.items():
+                for error in errors:
+                    messages.error(request, error, extra_tags='error')
+    else:
+        form = LoginForm()
+
+    return render(request, 'authentication/auth.html', {'form': form})
+
+# ============================
+# OTP VERIFICATION (STEP 2)
+# ============================
+
+@never_cache
+@require_http_methods(["GET", "POST"])
+async def verify_otp_view(request):
+    """OTP verification view - Step 2"""
+
+    await _load_user(request)
+
+    challenge = load_otp_challenge(await request.session.aget('otp_challenge'))
+    if challenge is None:
+        messages.error(request, 'Please log in first.', extra_tags='error')
+        return redirect('authentication:join')
+
+    if request.method == 'POST':
+        otp = request.POST.get('otp', '').strip()
+
+        if not otp:
+            messages.error(request, 'Please enter the verification code.', extra_tags='error')
+            return redirect('authentication:verify_otp')
+
+        # Only the challenge and the OTP store are consulted until the code matches
+        attempts = challenge['n']
+        result = await averify_otp(challenge, otp)
+        if result != OTP_VALID:
+            if challenge['n'] != attempts:
+                await request.session.aset('otp_challenge', dump_otp_challenge(challenge))
+            if result == OTP_LOCKED:
+                messages.error(request, 'Too many incorrect codes. Please try again in a few minutes.', extra_tags='error')
+            elif result == OTP_EXPIRED:
+                messages.error(request, 'Verification code expired. Please request a new one.', extra_tags='error')
+            else:
+                messages.error(request, 'Invalid verification code.', extra_tags='error')
+            return redirect('authentication:verify_otp')
+
+        try:
+            user = await User.objects.aget(id=challenge['uid'])
+        except User.DoesNotExist:
+            messages.error(request, 'Invalid session.', extra_tags='error')
+            return redirect('authentication:join')
+
+        # Same as the sync view: an upgraded hash and otp_verified go out
+        # in alogin()'s last_login UPDATE, with the post_save handlers
+        apply_pending_rehash(user, await request.session.apop('password_rehash', None))
+        if not user.otp_verified:
+            user.otp_verified = True
+
+        await alogin(request, user)
+
+        await acreate_user_session(request, user)
+
+        if await request.session.aget('remember_me', False):
+            await request.session.aset_expiry(30 * 24 * 60 * 60) # 30 days
+        else:
+            await request.session.aset_expiry(0)
+
+        await request.session.apop('otp_challenge', None)
+        await request.session.apop('remember_me', None)
+        await request.session.apop('otp_email_id', None)
+
+        logger.info(f"User logged in with 2FA: {user.username}")
+        messages.success(request, f'Welcome back, {user.get_full_name}!', extra_tags='success')
+
+        return redirect('authentication:games')
+
+    if await aget_email_status(await request.session.aget('otp_email_id')) == OutboundEmail.STATUS_FAILED:
+        messages.error(
+            request,
+            'We could not deliver your verification code. Please request a new one.',
+            extra_tags='error'
+        )
+
+    return render(request, 'authentication/verify_otp.html', {'otp_email': challenge['email']})
+
+
+@require_http_methods(["POST"])
+async def resend_otp_view(request):
+    """Resend OTP code"""
+
+    await _load_user(request)
+
+    challenge = load_otp_challenge(await request.session.aget('otp_challenge'))
+    if challenge is None:
+        messages.error(request, 'Please log in first.', extra_tags='error')
+        return redirect('authentication:join')
+
+    if not await aallow_otp_resend(get_client_ip(request), challenge['uid']):
+        messages.error(request, 'Too many codes requested. Please wait a few minutes.', extra_tags='error')
+        return redirect('authentication:verify_otp')
+
+    try:
+        # The email template needs the user
+        user = await User.objects.aget(id=challenge['uid'])
+
+        otp, challenge = await aissue_otp(user)
+        await request.session.aset('otp_challenge', challenge)
+
+        otp_email = await asend_otp_email(user, otp)
+        if otp_email:
+            await request.session.aset('otp_email_id', queued_email_id(otp_email))
+            messages.success(request, 'New code sent to your email.', extra_tags='success')
+        else:
+            messages.error(request, 'Failed to send code.', extra_tags='error')
+
+    except User.DoesNotExist:
+        messages.error(request, 'Invalid session.', extra_tags='error')
+        return redirect('authentication:join')
+
+    return redirect('authentication:verify_otp')
@@ -0,0 +1,326 @@
+# authentication/audit.py
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+from .shutdown import register_shutdown_hook
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LOGIN_AUDIT = {
+    'ENABLED': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 2.0,  # seconds
+    'MAX_QUEUE': 10000,
+    'SPOOL_DIR': None,  # defaults to BASE_DIR / 'var' / 'login_audit'
+}
+
+
+def get_login_audit_settings():
+    """Merge LOGIN_AUDIT from settings over the defaults"""
+    options = dict(DEFAULT_LOGIN_AUDIT)
+    options.update(getattr(settings, 'LOGIN_AUDIT', {}))
+    if not options['SPOOL_DIR']:
+        options['SPOOL_DIR'] = Path(settings.BASE_DIR) / 'var' / 'login_audit'
+    return options
+
+
+def _lock_file(f):
+    """
+    Take an exclusive lock on an open spool file, held until it is closed.
+    Returns False if another open file (in any process) holds it. Without
+    fcntl (Windows) nothing is locked and replay falls back to PIDs.
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _pid_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class LoginAttemptWriter:
+    """
+    Write-behind buffer for LoginAttempt rows.
+
+    Every attempt is appended to an on-disk journal segment and queued in
+    memory. A background thread bulk inserts the queue when it reaches
+    BATCH_SIZE or every FLUSH_INTERVAL seconds, then deletes the segment
+    it just persisted. Segments left behind by a crashed process, and
+    attempts that did not fit in the queue, are replayed from disk, so
+    rows are delivered at least once.
+
+    Spool layout:
+        <pid>-<ns>.jsonl    journal segment of process <pid>
+        orphan-<ns>.jsonl   rows waiting to be replayed by any process
+
+    A segment is flock()ed by its writer until it has been persisted, so
+    a segment whose lock can be taken belongs to a dead process, even if
+    a new worker has since been given the same PID.
+
+    With autostart=False no thread is started and nothing is written
+    until flush() or shutdown() is called, which tests rely on.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=2.0, max_queue=10000, spool_dir=None, autostart=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.spool_dir = Path(spool_dir)
+        self.autostart = autostart
+
+        self._queue = []
+        self._spilled = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._segment = None
+        self._segment_file = None
+
+    # ----------------------------
+    # Journal
+    # ----------------------------
+
+    def _open_segment(self):
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._segment = self.spool_dir / f"{os.getpid()}-{time.time_ns()}.jsonl"
+        self._segment_file = open(self._segment, 'a', encoding='utf-8')
+        _lock_file(self._segment_file)
+
+    def _rotate_segment(self):
+        """
+        Start a new segment; returns the previous path and its still open,
+        still locked file, for the caller to close once it is persisted
+        """
+        closed, closed_file = self._segment, self._segment_file
+        closed_file.flush()
+        self._open_segment()
+        return closed, closed_file
+
+    def _orphan_spilled(self, segment):
+        """Move the rows that never made it into the queue to an orphan file"""
+        orphan = self.spool_dir / f"orphan-{time.time_ns()}.jsonl"
+        # Written under another name, so it is never replayed half done
+        partial = orphan.with_suffix('.partial')
+        with open(segment, encoding='utf-8') as src, open(partial, 'w', encoding='utf-8') as dst:
+            for line in src:
+                if '"_spilled": true' in line:
+                    dst.write(line)
+        partial.rename(orphan)
+
+    # ----------------------------
+    # Worker
+    # ----------------------------
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        if self._segment_file is not None and self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._queue = []
+        self._spilled = 0
+        self._stopping.clear()
+        self._open_segment()
+        self._thread = None
+        if self.autostart:
+            self._thread = threading.Thread(
+                target=self._run, name='login-audit-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        self.replay_spool()
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self.flush():
+                self.replay_spool()
+
+    def enqueue(self, **fields):
+        """Queue one LoginAttempt; never touches the database"""
+        record = dict(fields)
+        record.setdefault('attempted_at', timezone.now().isoformat())
+
+        with self._lock:
+            self._ensure_started()
+
+            if len(self._queue) >= self.max_queue:
+                # Journal only; picked up again as an orphan after the next flush
+                record['_spilled'] = True
+                self._spilled += 1
+            else:
+                self._queue.append(record)
+
+            try:
+                self._segment_file.write(json.dumps(record) + '\n')
+                self._segment_file.flush()
+            except OSError as e:
+                logger.error(f"Failed to journal login attempt: {str(e)}")
+
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.set()
+
+    def flush(self):
+        """Bulk insert everything queued so far; returns False if the insert failed"""
+        with self._flush_lock:
+            with self._lock:
+                if self._segment_file is None or not (self._queue or self._spilled):
+                    return True
+                batch, self._queue = self._queue, []
+                spilled, self._spilled = self._spilled, 0
+                segment, segment_file = self._rotate_segment()
+
+            # The lock is held until the segment is gone or handed over as an orphan
+            with segment_file:
+                if not self._write(batch):
+                    # Leave the whole segment for replay
+                    segment.rename(segment.with_name(f"orphan-{time.time_ns()}.jsonl"))
+                    return False
+
+                try:
+                    if spilled:
+                        self._orphan_spilled(segment)
+                    segment.unlink()
+                except OSError as e:
+                    logger.error(f"Failed to clean up login audit segment: {str(e)}")
+                return True
+
+    def replay_spool(self):
+        """Insert rows from orphan files and from segments of dead processes"""
+        if not self.spool_dir.exists():
+            return
+
+        for path in sorted(self.spool_dir.glob('*.jsonl')):
+            owner = path.name.split('-', 1)[0]
+            if owner != 'orphan' and not owner.isdigit():
+                continue
+            if owner != 'orphan' and fcntl is None and _pid_is_alive(int(owner)):
+                continue
+
+            try:
+                f = open(path, encoding='utf-8')
+            except OSError:
+                # Replayed by another process meanwhile
+                continue
+
+            with f:
+                if not _lock_file(f):
+                    # Still held by a live writer
+                    continue
+
+                # Claim the file so concurrent workers don't replay it twice
+                claimed = path.with_suffix('.replay')
+                try:
+                    path.rename(claimed)
+                except OSError:
+                    continue
+
+                records = []
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash mid-line
+                        continue
+                    record.pop('_spilled', None)
+                    records.append(record)
+
+            if self._write(records):
+                claimed.unlink()
+                logger.info(f"Replayed {len(records)} login attempts from {path.name}")
+            else:
+                claimed.rename(path)
+                return
+
+    def _write(self, records):
+        from django.db import close_old_connections
+        from .models import LoginAttempt
+
+        if not records:
+            return True
+
+        try:
+            LoginAttempt.objects.bulk_create(
+                [LoginAttempt(**record) for record in records],
+                batch_size=self.batch_size,
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {len(records)} login attempts: {str(e)}")
+            return False
+        finally:
+            # Running outside the request cycle, so nothing else closes it
+            close_old_connections()
+
+    def shutdown(self, timeout=10):
+        """Stop the worker and drain the queue"""
+        if self._segment_file is None or self._pid != os.getpid():
+            return
+
+        if self._thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join(timeout)
+        self.flush()
+
+        with self._lock:
+            self._segment_file.close()
+            # Nothing was journaled since the last flush
+            if self._segment.stat().st_size == 0:
+                self._segment.unlink()
+            self._segment_file = None
+            self._thread = None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_login_attempt_writer():
+    """Return the process-wide LoginAttemptWriter"""
+    global _writer
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                options = get_login_audit_settings()
+                _writer = LoginAttemptWriter(
+                    batch_size=options['BATCH_SIZE'],
+                    flush_interval=options['FLUSH_INTERVAL'],
+                    max_queue=options['MAX_QUEUE'],
+                    spool_dir=options['SPOOL_DIR'],
+                )
+                register_shutdown_hook(_writer.shutdown)
+    return _writer
+
+
+def shutdown_login_audit():
+    """Drain the audit writer if this process started one"""
+    if _writer is not None:
+        _writer.shutdown()
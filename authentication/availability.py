@@ -0,0 +1,362 @@
+# authentication/availability.py
+
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_AVAILABILITY_FILTER = {
+    'ENABLED': True,
+    'ERROR_RATE': 0.01,  # share of free names that still need a query
+    'MIN_CAPACITY': 100000,  # keys; the filter is sized for 2x the current table
+    'REBUILD_INTERVAL': 600,  # seconds; picks up signups made by other processes
+    'CHUNK_SIZE': 5000,  # rows fetched per round trip while scanning users
+    # Saved names are also recorded in this cache for two rebuild intervals,
+    # so a negative answer is checked against signups the local filter has
+    # not seen yet. With the default local memory cache each process only
+    # sees its own; point it at a cache shared by every worker
+    'CACHE_ALIAS': 'default',
+}
+
+
+DEFAULT_AVAILABILITY_CHECK = {
+    'RATE_LIMIT': 30,  # lookups per IP ...
+    'RATE_WINDOW_MINUTES': 1,  # ... per this many minutes
+    'CACHE_SECONDS': 30,  # per-process cache of "taken" answers
+    'CACHE_MAX_ENTRIES': 10000,
+    'MAX_AGE': 10,  # Cache-Control max-age for "taken" answers; "available" is never cached
+}
+
+
+def get_availability_filter_settings():
+    """Merge AVAILABILITY_FILTER from settings over the defaults"""
+    options = dict(DEFAULT_AVAILABILITY_FILTER)
+    options.update(getattr(settings, 'AVAILABILITY_FILTER', {}))
+    return options
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; no false negatives, tunable false positives"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+
+def _key(kind, value):
+    return f'{kind}:{value.lower()}'
+
+
+def _shared_key(key):
+    return f"availability:taken:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+class TakenIdentifiers:
+    """
+    Process-wide Bloom filter of every username and email in users.
+
+    Built by a background thread from a streamed scan of the table and
+    kept current by post_save for writes made in this process; signups
+    handled by other processes are picked up by the periodic rebuild.
+    Until the first build finishes every name counts as possibly taken,
+    so callers simply fall back to the database.
+
+    Saves are also recorded in the shared cache, and a negative answer
+    is checked there, so another worker's signup is seen before the next
+    rebuild. Anything that still slips through (a per-process cache, an
+    eviction) is stopped by the unique indexes when the user is saved.
+    """
+
+    def __init__(self, options=None):
+        self.options = options or get_availability_filter_settings()
+        self._filter = None
+        self._pending = None  # keys added while a rebuild is scanning
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._rebuild_now = threading.Event()
+
+    def start(self):
+        with self._lock:
+            # Threads do not survive fork(), so each worker process starts its own
+            if self._thread is not None and self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='availability-filter', daemon=True)
+            self._thread.start()
+
+    @property
+    def ready(self):
+        return self._filter is not None
+
+    def might_be_taken(self, kind, value):
+        """False when no user had value as of the last build, and none has saved it since"""
+        if not value:
+            return True
+        if not value.isascii():
+            # Python and SQL case folding can disagree outside ASCII
+            return True
+
+        self.start()
+        bloom = self._filter
+        key = _key(kind, value)
+        if bloom is None or key in bloom:
+            return True
+
+        # Saved by another process since our last build?
+        try:
+            return bool(caches[self.options['CACHE_ALIAS']].get(_shared_key(key)))
+        except Exception as e:
+            logger.error(f"Availability cache error: {str(e)}")
+            return True
+
+    def add(self, kind, value):
+        self.add_keys([_key(kind, value)] if value else [])
+
+    def add_user(self, user):
+        self.add_keys([_key(kind, value) for kind, value in (('username', user.username), ('email', user.email)) if value])
+
+    def add_keys(self, keys):
+        if not keys:
+            return
+
+        with self._lock:
+            for key in keys:
+                if self._filter is not None:
+                    self._filter.add(key)
+                if self._pending is not None:
+                    self._pending.append(key)
+            if self._filter is not None and self._filter.is_full:
+                self._rebuild_now.set()
+
+        # Every process rebuilds within REBUILD_INTERVAL; twice that covers a slow scan
+        try:
+            caches[self.options['CACHE_ALIAS']].set_many(
+                {_shared_key(key): True for key in keys},
+                self.options['REBUILD_INTERVAL'] * 2,
+            )
+        except Exception as e:
+            logger.error(f"Availability cache error: {str(e)}")
+
+    def rebuild(self):
+        from django.contrib.auth import get_user_model
+        from django.db import close_old_connections
+        from .db_router import replica_reads
+
+        User = get_user_model()
+        started = time.monotonic()
+
+        with self._lock:
+            self._pending = []
+
+        try:
+            # Every worker scans the whole table each REBUILD_INTERVAL, so keep
+            # it off the primary; saves the replica hasn't seen yet are in the
+            # shared cache for two intervals
+            with replica_reads():
+                rows = User.objects.values_list('username', 'email')
+                # Two keys per user, with room for the table to double before the next build
+                capacity = max(self.options['MIN_CAPACITY'], rows.count() * 4)
+                bloom = BloomFilter(capacity, self.options['ERROR_RATE'])
+
+                for username, email in rows.iterator(chunk_size=self.options['CHUNK_SIZE']):
+                    if username:
+                        bloom.add(_key('username', username))
+                    if email:
+                        bloom.add(_key('email', email))
+
+            with self._lock:
+                for key in self._pending:
+                    bloom.add(key)
+                self._filter = bloom
+        finally:
+            with self._lock:
+                self._pending = None
+            close_old_connections()
+
+        logger.info(
+            f"Availability filter built: {bloom.count} keys, {len(bloom._bits) // 1024} KiB "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+    def _run(self):
+        while True:
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Availability filter build failed: {str(e)}")
+            self._rebuild_now.wait(self.options['REBUILD_INTERVAL'])
+            self._rebuild_now.clear()
+
+
+_taken = None
+_taken_lock = threading.Lock()
+
+
+def get_taken_identifiers():
+    """Return the process-wide TakenIdentifiers"""
+    global _taken
+
+    if _taken is None:
+        with _taken_lock:
+            if _taken is None:
+                _taken = TakenIdentifiers()
+    return _taken
+
+
+def username_might_be_taken(username):
+    """False if this process hasn't seen the username (case-insensitive); True means ask the database"""
+    if not get_availability_filter_settings()['ENABLED']:
+        return True
+    return get_taken_identifiers().might_be_taken('username', username)
+
+
+def email_might_be_taken(email):
+    """False if this process hasn't seen the email (case-insensitive); True means ask the database"""
+    if not get_availability_filter_settings()['ENABLED']:
+        return True
+    return get_taken_identifiers().might_be_taken('email', email)
+
+
+# ============================
+# AVAILABILITY CHECK
+# ============================
+
+def get_availability_check_settings():
+    """Merge AVAILABILITY_CHECK from settings over the defaults"""
+    options = dict(DEFAULT_AVAILABILITY_CHECK)
+    options.update(getattr(settings, 'AVAILABILITY_CHECK', {}))
+    return options
+
+
+class ResultCache:
+    """Per-process LRU of recent "taken" answers, with expiry"""
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+_check_options = get_availability_check_settings()
+availability_results = ResultCache(_check_options['CACHE_SECONDS'], _check_options['CACHE_MAX_ENTRIES'])
+
+
+def normalize_identifier(kind, value):
+    """
+    Apply the SignupForm cleaning rules to a username or email.
+    Returns the value as it would be stored; raises ValidationError with
+    the same messages as the form.
+    """
+    from .utils import sanitize_email, sanitize_username
+
+    if kind == 'username':
+        username = sanitize_username(value or '')
+        if not username:
+            raise ValidationError('Username is required')
+        if len(username) < 3:
+            raise ValidationError('Username must be at least 3 characters')
+        if len(username) > 20:
+            raise ValidationError('Username must be less than 20 characters')
+        if not re.match(r'^[a-zA-Z0-9_]+$', username):
+            raise ValidationError('Username can olny contain letters, numbers, and underscore')
+        return username.lower()
+
+    email = sanitize_email(value or '')
+    if not email:
+        raise ValidationError('Email is required')
+    validate_email(email)
+    return email.lower()
+
+
+def forget_availability(user):
+    """Drop cached answers for a user's username and email after a save"""
+    for kind, value in (('username', user.username), ('email', user.email)):
+        if value:
+            availability_results.discard(_key(kind, value))
+
+
+def is_available(kind, value):
+    """
+    True if no user has this (already normalized) username or email.
+    "Taken" answers come from the result cache; otherwise the availability
+    filter, backed by the shared cache of recent saves, settles the
+    "certainly free" case and anything else goes to an iexact query that
+    may run on a replica. Only "taken" answers are cached, since a name
+    another worker just claimed must not keep showing as available.
+    """
+    from django.contrib.auth import get_user_model
+    from .db_router import replica_reads
+
+    key = _key(kind, value)
+    if availability_results.get(key):
+        return False
+
+    might_be_taken = username_might_be_taken(value) if kind == 'username' else email_might_be_taken(value)
+    if not might_be_taken:
+        available = True
+    else:
+        with replica_reads():
+            available = not get_user_model().objects.filter(**{f'{kind}__iexact': value}).exists()
+
+    if not available:
+        availability_results.set(key, True)
+    return available
@@ -0,0 +1,150 @@
+# authentication/client_ip.py
+
+import ipaddress
+import threading
+from functools import lru_cache
+from django.conf import settings
+
+
+DEFAULT_CLIENT_IP = {
+    'TRUSTED_PROXIES': ['127.0.0.0/8', '::1/128'],  # CIDRs whose X-Forwarded-For is believed
+    'MAX_HOPS': 10,  # X-Forwarded-For entries examined, from the right
+    'IPV4_PREFIX': 32,  # rate limit bucket for IPv4 clients
+    'IPV6_PREFIX': 64,  # rate limit bucket for IPv6 clients (one customer network)
+    'CACHE_SIZE': 4096,  # parsed addresses kept per process
+}
+
+
+def get_client_ip_settings():
+    """Merge CLIENT_IP from settings over the defaults"""
+    options = dict(DEFAULT_CLIENT_IP)
+    options.update(getattr(settings, 'CLIENT_IP', {}))
+    return options
+
+
+_options = get_client_ip_settings()
+
+
+@lru_cache(maxsize=_options['CACHE_SIZE'])
+def parse_ip(value):
+    """
+    Parse one address as found in REMOTE_ADDR or an X-Forwarded-For entry.
+    Accepts surrounding spaces, a port ("1.2.3.4:80", "[::1]:80") and
+    IPv4-mapped IPv6; returns an ipaddress object, or None if it isn't one.
+    """
+    value = (value or '').strip()
+    if value.startswith('['):
+        value = value[1:].partition(']')[0]
+    elif value.count(':') == 1:
+        value = value.partition(':')[0]
+
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+@lru_cache(maxsize=None)
+def parse_networks(cidrs):
+    """Parse a tuple of CIDR strings once; returns (IPv4 networks, IPv6 networks)"""
+    networks = [ipaddress.ip_network(cidr.strip(), strict=False) for cidr in cidrs if cidr.strip()]
+    return (
+        tuple(n for n in networks if n.version == 4),
+        tuple(n for n in networks if n.version == 6),
+    )
+
+
+class ClientIPResolver:
+    """
+    Find the address of the client behind our own proxies.
+
+    X-Forwarded-For is only believed when the connection itself comes
+    from a trusted proxy. The chain is then walked from the right, where
+    our proxies appended what they saw, skipping trusted hops; the first
+    untrusted address is the client. Anything to its left was written by
+    the client and is ignored, so a forged header can't choose the IP
+    that gets rate limited or recorded.
+    """
+
+    def __init__(self, trusted_proxies=(), max_hops=10, ipv4_prefix=32, ipv6_prefix=64, cache_size=4096):
+        self.networks = parse_networks(tuple(trusted_proxies))
+        self.max_hops = max_hops
+        self.ipv4_prefix = ipv4_prefix
+        self.ipv6_prefix = ipv6_prefix
+        # A handful of proxy addresses are checked on every request
+        self.is_trusted = lru_cache(maxsize=cache_size)(self._is_trusted)
+        self.rate_limit_key = lru_cache(maxsize=cache_size)(self._rate_limit_key)
+
+    def _is_trusted(self, address):
+        networks = self.networks[0] if address.version == 4 else self.networks[1]
+        return any(address in network for network in networks)
+
+    def resolve(self, remote_addr, forwarded_for=None):
+        """Return the client address as a normalized string, or None if REMOTE_ADDR is unusable"""
+        client = parse_ip(remote_addr)
+        if client is None:
+            return None
+
+        if forwarded_for and self.is_trusted(client):
+            hops = forwarded_for.split(',')[-self.max_hops:]
+            for hop in reversed(hops):
+                address = parse_ip(hop)
+                if address is None:
+                    # Garbage in the chain: the last hop we could read is the client
+                    break
+                client = address
+                if not self.is_trusted(address):
+                    break
+
+        return str(client)
+
+    def _rate_limit_key(self, ip_address):
+        """
+        Rate limit bucket for an address: the address itself for IPv4, its
+        /64 for IPv6, since one customer usually owns a whole /64 and could
+        otherwise rotate through its addresses for free.
+        """
+        address = parse_ip(ip_address)
+        if address is None:
+            return ip_address
+
+        prefix = self.ipv4_prefix if address.version == 4 else self.ipv6_prefix
+        if prefix >= address.max_prefixlen:
+            return str(address)
+        return str(ipaddress.ip_network((address, prefix), strict=False))
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_client_ip_resolver():
+    """Return the process-wide ClientIPResolver configured by settings.CLIENT_IP"""
+    global _resolver
+
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                options = get_client_ip_settings()
+                _resolver = ClientIPResolver(
+                    trusted_proxies=options['TRUSTED_PROXIES'],
+                    max_hops=options['MAX_HOPS'],
+                    ipv4_prefix=options['IPV4_PREFIX'],
+                    ipv6_prefix=options['IPV6_PREFIX'],
+                    cache_size=options['CACHE_SIZE'],
+                )
+    return _resolver
+
+
+def resolve_client_ip(request):
+    """Client address for a request, resolved once and kept on the request"""
+    if not hasattr(request, '_client_ip'):
+        request._client_ip = get_client_ip_resolver().resolve(
+            request.META.get('REMOTE_ADDR'),
+            request.META.get('HTTP_X_FORWARDED_FOR'),
+        )
+    return request._client_ip
@@ -0,0 +1,157 @@
+# authentication/db_pool.py
+
+import logging
+import os
+import threading
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from .shutdown import register_shutdown_hook
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_DB_POOL_METRICS = {
+    'ENABLED': True,
+    'INTERVAL': 60.0,  # seconds between log lines
+    'SATURATION_WARNING': 0.9,  # share of max_size in use that logs a warning
+}
+
+
+def get_db_pool_metrics_settings():
+    """Merge DB_POOL_METRICS from settings over the defaults"""
+    options = dict(DEFAULT_DB_POOL_METRICS)
+    options.update(getattr(settings, 'DB_POOL_METRICS', {}))
+    return options
+
+
+def get_pool(alias='default'):
+    """The psycopg ConnectionPool behind a database alias, or None if it isn't pooled"""
+    connection = connections[alias]
+    if not connection.settings_dict.get('OPTIONS', {}).get('pool'):
+        return None
+    # Created by Django on first use
+    return getattr(connection, 'pool', None)
+
+
+def summarize_pool_stats(stats):
+    """
+    Turn psycopg_pool get_stats()/pop_stats() counters into the numbers we log:
+    how long requests waited for a connection and how full the pool is.
+    """
+    queued = stats.get('requests_queued', 0)
+    in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+    pool_max = stats.get('pool_max') or 1
+
+    return {
+        'requests': stats.get('requests_num', 0),
+        'queued': queued,
+        'waiting': stats.get('requests_waiting', 0),
+        'avg_wait_ms': stats.get('requests_wait_ms', 0) / queued if queued else 0.0,
+        'timeouts': stats.get('requests_errors', 0),
+        'in_use': in_use,
+        'size': stats.get('pool_size', 0),
+        'max_size': pool_max,
+        'saturation': in_use / pool_max,
+        'connections_opened': stats.get('connections_num', 0),
+    }
+
+
+def get_db_pool_stats(alias='default'):
+    """Current pool numbers without resetting the counters"""
+    pool = get_pool(alias)
+    if pool is None:
+        return None
+    return summarize_pool_stats(pool.get_stats())
+
+
+class PoolMetricsReporter:
+    """
+    Background thread that logs wait time and saturation for every pooled
+    database once per INTERVAL. Counters are popped on each report, so
+    every line covers the last interval only.
+    """
+
+    def __init__(self, options=None):
+        self.options = options or get_db_pool_metrics_settings()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            # Threads do not survive fork(), so each worker process starts its own
+            if self._thread is not None and self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='db-pool-metrics', daemon=True)
+            self._thread.start()
+
+    def report(self):
+        for alias in connections:
+            pool = get_pool(alias)
+            if pool is None:
+                continue
+
+            stats = summarize_pool_stats(pool.pop_stats())
+            line = (
+                f"DB pool {alias}: {stats['requests']} checkouts, {stats['queued']} waited "
+                f"(avg {stats['avg_wait_ms']:.1f}ms), {stats['timeouts']} timeouts, "
+                f"{stats['in_use']}/{stats['max_size']} in use, {stats['waiting']} waiting now"
+            )
+
+            if stats['timeouts'] or stats['saturation'] >= self.options['SATURATION_WARNING']:
+                logger.warning(line)
+            else:
+                logger.info(line)
+
+    def _run(self):
+        while not self._stopping.wait(self.options['INTERVAL']):
+            try:
+                self.report()
+            except Exception as e:
+                logger.error(f"DB pool metrics error: {str(e)}")
+
+    def shutdown(self):
+        if self._thread is None or self._pid != os.getpid():
+            return
+
+        self._stopping.set()
+        self._thread.join(5)
+        self._thread = None
+
+
+def close_db_pools():
+    """Close every pool so Postgres sees clean disconnects on shutdown"""
+    for alias in connections:
+        if get_pool(alias) is not None:
+            connections[alias].close_pool()
+
+
+_reporter = None
+_reporter_lock = threading.Lock()
+
+
+def get_pool_metrics_reporter():
+    """Return the process-wide PoolMetricsReporter"""
+    global _reporter
+
+    if _reporter is None:
+        with _reporter_lock:
+            if _reporter is None:
+                _reporter = PoolMetricsReporter()
+                # Hooks run in reverse: stop reporting, then close the pools
+                register_shutdown_hook(close_db_pools)
+                register_shutdown_hook(_reporter.shutdown)
+    return _reporter
+
+
+@receiver(connection_created)
+def start_pool_metrics(sender, connection, **kwargs):
+    """Start reporting once a pooled database is actually used"""
+    if connection.settings_dict.get('OPTIONS', {}).get('pool') and get_db_pool_metrics_settings()['ENABLED']:
+        get_pool_metrics_reporter().start()
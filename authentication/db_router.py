@@ -0,0 +1,244 @@
+# authentication/db_router.py
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_DB_ROUTING = {
+    'REPLICAS': [],  # database aliases that replicate DEFAULT_DB_ALIAS
+    'STICKY_SECONDS': 15,  # reads stay on the primary this long after a write
+    'PIN_COOKIE': 'dbpin',
+    'MAX_REPLICA_LAG': 5.0,  # seconds; lagging replicas are skipped
+    'LAG_CHECK_INTERVAL': 10.0,  # seconds between lag checks per replica
+}
+
+
+def get_db_routing_settings():
+    """Merge DB_ROUTING from settings over the defaults"""
+    options = dict(DEFAULT_DB_ROUTING)
+    options.update(getattr(settings, 'DB_ROUTING', {}))
+    return options
+
+
+# Set inside replica_reads(); the router only sends reads to a replica then
+_replica_reads = ContextVar('replica_reads', default=False)
+
+# Set by the pin cookie from a recent write in an earlier request
+_pinned = ContextVar('db_pinned', default=False)
+
+# Set for the rest of a request once it writes
+_wrote = ContextVar('db_wrote', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Let reads in this block go to a replica.
+    Only for queries that tolerate a little staleness, such as
+    availability checks and admin listings. Has no effect while the
+    request is pinned to the primary.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def pin_to_primary():
+    """Send every read for the rest of this request, and the next few seconds, to the primary"""
+    _wrote.set(True)
+
+
+def is_pinned():
+    return _pinned.get() or _wrote.get()
+
+# ============================
+# REPLICA LAG
+# ============================
+
+POSTGRES_LAG_SQL = (
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    # Nothing left to replay: an idle primary is not lag
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaHealth:
+    """
+    Per-process view of which replicas are usable.
+    A replica's lag is measured at most once per LAG_CHECK_INTERVAL, on
+    the thread that needs it; a replica that errors or lags more than
+    MAX_REPLICA_LAG is skipped until its next check.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self._checked_at = {}
+        self._healthy = {}
+        self._lock = threading.Lock()
+
+    def measure_lag(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            # SQLite test setups have no replication to lag behind
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0])
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at.get(alias, float('-inf')) < self.options['LAG_CHECK_INTERVAL']:
+                return self._healthy.get(alias, False)
+            # Claim the check so concurrent requests keep the previous verdict
+            self._checked_at[alias] = now
+
+        try:
+            lag = self.measure_lag(alias)
+            healthy = lag <= self.options['MAX_REPLICA_LAG']
+            if not healthy:
+                logger.warning(f"Replica {alias} is {lag:.1f}s behind; reading from the primary")
+        except Exception as e:
+            logger.error(f"Replica {alias} lag check failed: {str(e)}")
+            healthy = False
+
+        with self._lock:
+            self._healthy[alias] = healthy
+        return healthy
+
+    def healthy_replicas(self):
+        return [alias for alias in self.options['REPLICAS'] if self.is_healthy(alias)]
+
+# ============================
+# ROUTER
+# ============================
+
+class ReplicaRouter:
+    """
+    Writes, and reads by default, go to the primary. Reads inside
+    replica_reads() go to a random healthy replica unless the request is
+    pinned: it already wrote, or it carries the pin cookie set after a
+    recent write (signup, password reset, ...). With no healthy replica
+    the primary serves the read.
+    """
+
+    def __init__(self):
+        self.options = get_db_routing_settings()
+        self.health = ReplicaHealth(self.options)
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from wherever the instance was loaded
+            return instance._state.db
+
+        if not self.options['REPLICAS'] or not _replica_reads.get() or is_pinned():
+            return DEFAULT_DB_ALIAS
+
+        replicas = self.health.healthy_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db not in self.options['REPLICAS']
+
+# ============================
+# MIDDLEWARE
+# ============================
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes across requests.
+    A request that writes (or isn't a safe method) sets a short-lived
+    cookie; while it is present, every read goes to the primary, so the
+    page after a signup or password reset never sees a replica that has
+    not caught up yet. A cookie is used rather than the session so this
+    works before and without loading the session.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = get_db_routing_settings()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        tokens = self._start(request)
+        try:
+            response = self.get_response(request)
+            return self._finish(request, response)
+        finally:
+            self._end(tokens)
+
+    async def __acall__(self, request):
+        tokens = self._start(request)
+        try:
+            response = await self.get_response(request)
+            return self._finish(request, response)
+        finally:
+            self._end(tokens)
+
+    def _start(self, request):
+        return _pinned.set(self.options['PIN_COOKIE'] in request.COOKIES), _wrote.set(False)
+
+    def _end(self, tokens):
+        _pinned.reset(tokens[0])
+        _wrote.reset(tokens[1])
+
+    def _finish(self, request, response):
+        if self.options['REPLICAS'] and (_wrote.get() or request.method not in ('GET', 'HEAD', 'OPTIONS')):
+            response.set_cookie(
+                self.options['PIN_COOKIE'],
+                '1',
+                max_age=self.options['STICKY_SECONDS'],
+                httponly=True,
+                samesite='Lax',
+                secure=request.is_secure(),
+            )
+        return response
+
+# ============================
+# ADMIN
+# ============================
+
+class ReplicaChangeListMixin:
+    """Serve admin changelist pages from a replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+
+        with replica_reads():
+            response = super().changelist_view(request, extra_context)
+            # The result list is a lazy queryset; evaluate it while routed
+            if hasattr(response, 'render'):
+                response.render()
+        return response
@@ -0,0 +1,72 @@
+# authentication/dirty_fields.py
+
+from django.db.models import DEFERRED
+
+
+class DirtyFieldsMixin:
+    """
+    Model mixin that remembers field values as loaded from the database.
+
+    save() on a loaded instance writes only the columns that changed (plus
+    auto_now fields) through update_fields, and skips the query entirely
+    when nothing changed. New instances and explicit update_fields saves
+    behave exactly like Model.save().
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
+
+    def _snapshot(self, fields=None):
+        deferred = self.get_deferred_fields()
+        loaded = getattr(self, '_loaded_values', None) or {}
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred:
+                continue
+            if fields is None or field.name in fields or field.attname in fields:
+                loaded[field.attname] = getattr(self, field.attname)
+        self._loaded_values = loaded
+
+    def get_dirty_fields(self):
+        """Names of fields changed since load, or None if this instance wasn't loaded"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in loaded
+            and getattr(self, field.attname) != loaded[field.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        explicit = (
+            args
+            or self._state.adding
+            or kwargs.get('force_insert')
+            or kwargs.get('update_fields') is not None
+        )
+        dirty = None if explicit else self.get_dirty_fields()
+
+        if dirty is None:
+            super().save(*args, **kwargs)
+            self._snapshot(kwargs.get('update_fields'))
+            return
+
+        if not dirty:
+            return
+
+        auto_now = [f.name for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)]
+        kwargs['update_fields'] = dirty + [name for name in auto_now if name not in dirty]
+        super().save(**kwargs)
+        self._snapshot(kwargs['update_fields'])
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot(kwargs.get('fields'))
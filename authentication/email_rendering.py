@@ -0,0 +1,232 @@
+# authentication/email_rendering.py
+
+import logging
+import re
+import threading
+import time
+from django.conf import settings
+from django.template import Variable, VariableDoesNotExist
+from django.template.base import Node, TextNode, VariableNode
+from django.template.loader import get_template, render_to_string
+from django.utils.html import conditional_escape, strip_tags
+
+logger = logging.getLogger(__name__)
+
+
+# Context keys that change per message; everything else is baked in once
+PER_MESSAGE_FIELDS = ('user', 'otp', 'verification_url', 'reset_url')
+
+_MARKER = '\x1f'
+_MARKER_RE = re.compile(f'{_MARKER}([^{_MARKER}]+){_MARKER}')
+
+
+class _FieldSentinel:
+    """
+    Stands in for a per-message context value while a template is compiled.
+    Rendering it, or any attribute of it, yields a marker naming the lookup
+    path, e.g. {{ user.email }} renders as <US>user.email<US>.
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _FieldSentinel(f'{self._path}.{name}')
+
+    def __str__(self):
+        return f'{_MARKER}{self._path}{_MARKER}'
+
+
+def _split_segments(rendered):
+    """Split rendered output into alternating static text and field paths"""
+    parts = _MARKER_RE.split(rendered)
+    return parts[0::2], parts[1::2]
+
+
+def _is_precompilable(template, fields):
+    """
+    Only plain {{ field.attr }} outputs can be substituted after the fact.
+    A per-message field used in a tag ({% if user.x %}) or through a filter
+    ({{ otp|upper }}) changes the output in ways markers can't capture.
+    """
+    pattern = re.compile(r'\b(%s)\b' % '|'.join(re.escape(f) for f in fields))
+
+    for node in template.template.nodelist.get_nodes_by_type(Node):
+        if isinstance(node, TextNode):
+            continue
+        token = getattr(node, 'token', None)
+        contents = token.contents if token is not None else ''
+        if not pattern.search(contents):
+            continue
+        if isinstance(node, VariableNode) and not node.filter_expression.filters:
+            continue
+        return False
+    return True
+
+
+class CompiledEmailTemplate:
+    """
+    An email template rendered once into static segments.
+
+    render() only resolves the per-message fields and joins them with the
+    precomputed HTML and plain-text segments, so sending skips both the
+    template engine and the strip_tags pass.
+    """
+
+    def __init__(self, template_name, static_context=None, fields=PER_MESSAGE_FIELDS):
+        self.template_name = template_name
+        self.static_context = dict(static_context or {})
+        self.fields = fields
+
+        template = get_template(template_name)
+        self.precompiled = _is_precompilable(template, fields)
+
+        if self.precompiled:
+            context = dict(self.static_context)
+            context.update({field: _FieldSentinel(field) for field in fields})
+            html = template.render(context)
+
+            self.html_segments, self.html_fields = _split_segments(html)
+            self.text_segments, self.text_fields = _split_segments(strip_tags(html))
+        else:
+            logger.warning(
+                f"Email template {template_name} uses per-message fields in tags or filters; "
+                f"it will be rendered in full on every send"
+            )
+
+    def _join(self, segments, fields, values):
+        out = [segments[0]]
+        for path, segment in zip(fields, segments[1:]):
+            out.append(values[path])
+            out.append(segment)
+        return ''.join(out)
+
+    def _resolve(self, path, context):
+        try:
+            value = Variable(path).resolve(context)
+        except VariableDoesNotExist:
+            value = ''
+        return str(conditional_escape(value))
+
+    def render(self, context):
+        """Return (html, plain_text) for one message"""
+        if not self.precompiled:
+            full_context = dict(self.static_context)
+            full_context.update(context)
+            html = render_to_string(self.template_name, full_context)
+            return html, strip_tags(html)
+
+        paths = set(self.html_fields) | set(self.text_fields)
+        values = {path: self._resolve(path, context) for path in paths}
+
+        html = self._join(self.html_segments, self.html_fields, values)
+        text = self._join(self.text_segments, self.text_fields, values)
+        return html, text
+
+# ============================
+# METRICS
+# ============================
+
+class RenderStats:
+    """
+    Per-template render timings. The one-time compile is tracked on its
+    own, so EMAIL_RENDER_BUDGET_MS only applies to per-message renders.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry(self, template_name):
+        return self._stats.setdefault(template_name, {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'over_budget': 0,
+            'compiles': 0, 'compile_ms': 0.0,
+        })
+
+    def record_compile(self, template_name, seconds):
+        with self._lock:
+            stats = self._entry(template_name)
+            stats['compiles'] += 1
+            stats['compile_ms'] += seconds * 1000
+
+    def record(self, template_name, seconds):
+        with self._lock:
+            stats = self._entry(template_name)
+            ms = seconds * 1000
+            stats['count'] += 1
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+
+            budget = getattr(settings, 'EMAIL_RENDER_BUDGET_MS', None)
+            if budget is not None and ms > budget:
+                stats['over_budget'] += 1
+                logger.warning(f"Rendering {template_name} took {ms:.1f}ms (budget {budget}ms)")
+
+    def snapshot(self):
+        """Return {template_name: {count, avg_ms, max_ms, over_budget, compiles, compile_ms}}"""
+        with self._lock:
+            return {
+                name: {
+                    'count': s['count'],
+                    'avg_ms': s['total_ms'] / s['count'] if s['count'] else 0.0,
+                    'max_ms': s['max_ms'],
+                    'over_budget': s['over_budget'],
+                    'compiles': s['compiles'],
+                    'compile_ms': s['compile_ms'],
+                }
+                for name, s in self._stats.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+render_stats = RenderStats()
+
+# ============================
+# PUBLIC API
+# ============================
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def _compile(template_name, static_context):
+    started = time.perf_counter()
+    compiled = CompiledEmailTemplate(template_name, static_context)
+    render_stats.record_compile(template_name, time.perf_counter() - started)
+    return compiled
+
+
+def get_email_template(template_name, static_context=None):
+    """Return the compiled template, compiling it on first use"""
+    key = (template_name, tuple(sorted((static_context or {}).items())))
+
+    # Recompile on every send while developing so template edits show up
+    if settings.DEBUG:
+        return _compile(template_name, static_context)
+
+    compiled = _compiled.get(key)
+    if compiled is None:
+        with _compiled_lock:
+            compiled = _compiled.get(key)
+            if compiled is None:
+                compiled = _compile(template_name, static_context)
+                _compiled[key] = compiled
+    return compiled
+
+
+def render_email(template_name, context, static_context=None):
+    """Render an email template; returns (html, plain_text)"""
+    compiled = get_email_template(template_name, static_context)
+    started = time.perf_counter()
+    html, text = compiled.render(context)
+    render_stats.record(template_name, time.perf_counter() - started)
+    return html, text
+
+
+def get_email_render_stats():
+    return render_stats.snapshot()
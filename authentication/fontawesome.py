@@ -0,0 +1,102 @@
+# authentication/fontawesome.py
+
+import re
+from pathlib import Path
+from django.conf import settings
+from django.contrib.staticfiles.finders import AppDirectoriesFinder, FileSystemFinder
+
+
+FA_CLASS_RE = re.compile(r'\bfa-[a-z0-9]+(?:-[a-z0-9]+)*')
+
+# `.fa-house {\n  --fa: "\f015"; }` - one rule per icon name in all.css
+ICON_RULE_RE = re.compile(r'\.fa-([a-z0-9-]+) \{\s*--fa: "\\([0-9a-f]+)"; \}\s*')
+
+FONT_FACE_RE = re.compile(r'@font-face \{[^}]*\}\s*')
+
+# Only the Font Awesome 6 families are used; the v4/v5 shims are dropped
+KEPT_FONT_FAMILIES = ("'Font Awesome 6 Free'", "'Font Awesome 6 Brands'")
+
+SCANNED_SUFFIXES = ('.html', '.js', '.css')
+
+
+def get_fontawesome_build_root():
+    """Static root that holds the subset build (takes precedence over app static)"""
+    return Path(getattr(settings, 'FONTAWESOME_BUILD_ROOT', Path(settings.BASE_DIR) / 'build' / 'static'))
+
+
+def scan_used_classes(paths):
+    """Collect every fa-* class name mentioned in the given files"""
+    used = set()
+    for path in paths:
+        try:
+            text = Path(path).read_text(encoding='utf-8', errors='ignore')
+        except OSError:
+            continue
+        used.update(name[len('fa-'):] for name in FA_CLASS_RE.findall(text))
+    return used
+
+
+def subset_css(css, used_icons):
+    """
+    Drop the icon rules and @font-face blocks that are not needed.
+    Returns (css, codepoints) where codepoints are the glyphs still referenced.
+    """
+    codepoints = set()
+
+    def keep_icon(match):
+        if match.group(1) in used_icons:
+            codepoints.add(int(match.group(2), 16))
+            return match.group(0)
+        return ''
+
+    def keep_font_face(match):
+        block = match.group(0)
+        if not any(family in block for family in KEPT_FONT_FAMILIES):
+            return ''
+        # woff2 is supported by every browser we target; skip the ttf fallback
+        return re.sub(r',\s*url\("[^"]+\.ttf"\) format\("truetype"\)', '', block)
+
+    css = ICON_RULE_RE.sub(keep_icon, css)
+    css = FONT_FACE_RE.sub(keep_font_face, css)
+    return css, codepoints
+
+
+def minify_css(css):
+    """Whitespace and comment removal; keeps /*! license */ comments"""
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+# ============================
+# STATICFILES FINDERS
+# ============================
+
+class _SkipFullFontAwesomeMixin:
+    """
+    Hide the full fontawesome/ tree from collectstatic once a subset has
+    been built with `manage.py build_fontawesome`, so only the subset in
+    FONTAWESOME_BUILD_ROOT is published.
+    """
+
+    def list(self, ignore_patterns):
+        build_root = get_fontawesome_build_root()
+        has_subset = (build_root / 'fontawesome').is_dir()
+
+        for path, storage in super().list(ignore_patterns):
+            if (
+                has_subset
+                and path.startswith('fontawesome/')
+                and Path(storage.location) != build_root
+            ):
+                continue
+            yield path, storage
+
+
+class FileSystemFinder(_SkipFullFontAwesomeMixin, FileSystemFinder):
+    pass
+
+
+class AppDirectoriesFinder(_SkipFullFontAwesomeMixin, AppDirectoriesFinder):
+    pass
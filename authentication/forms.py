@@ -4,8 +4,11 @@ from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from .utils import sanitize_username, sanitize_email
-import re
+from .hashing import aset_user_password, set_user_password
+from .db_router import replica_reads
+from .availability import email_might_be_taken, normalize_identifier, username_might_be_taken
 
 User = get_user_model()
 
@@ -47,6 +50,9 @@ class SignupForm(forms.ModelForm):
         error_messages={'required': 'You must agree to the Terms of Service'}
     )
 
+    # Set by ais_valid() so the uniqueness queries are left to the async checks
+    _skip_unique_queries = False
+
     class Meta:
         model = User
         fields = ['username', 'email', 'password', 'date_of_birth']
@@ -65,27 +71,20 @@ class SignupForm(forms.ModelForm):
 
     def clean_username(self):
         """Validate username"""
-        username = sanitize_username(self.cleaned_data.get('username', ''))
-
-        if not username:
-            raise ValidationError('Username is required')
+        # Length and format rules are shared with the availability endpoint
+        username = normalize_identifier('username', self.cleaned_data.get('username', ''))
+
+        # Check if username exists. The availability filter, which also sees
+        # recent signups on other workers through the shared cache, settles
+        # the common "certainly free" case; possible hits are confirmed on a
+        # replica, and the unique index has the final say on save
+        if not self._skip_unique_queries and username_might_be_taken(username):
+            with replica_reads():
+                taken = User.objects.filter(username__iexact=username).exists()
+            if taken:
+                raise ValidationError('This username is already taken')
         
-        # Check length
-        if len(username) < 3:
-            raise ValidationError('Username must be at least 3 characters')
-        
-        if len(username) > 20:
-            raise ValidationError('Username must be less than 20 characters')
-
-        # Check format (alphanumeric and underscore only)
-        if not re.match(r'^[a-zA-Z0-9_]+$', username):
-            raise ValidationError('Username can olny contain letters, numbers, and underscore')
-
-        # Check if username exists
-        if User.objects.filter(username__iexact=username).exists():
-            raise ValidationError('This username is already taken')
-        
-        return username.lower()
+        return username
 
     def clean_email(self):
         """Validate email"""
@@ -95,8 +94,11 @@ class SignupForm(forms.ModelForm):
             raise ValidationError('Email is required')
         
         # Check if email exists
-        if User.objects.filter(email__iexact=email).exists():
-            raise ValidationError('This email is already registered')
+        if not self._skip_unique_queries and email_might_be_taken(email):
+            with replica_reads():
+                taken = User.objects.filter(email__iexact=email).exists()
+            if taken:
+                raise ValidationError('This email is already registered')
         
         return email.lower()
     
@@ -136,20 +138,68 @@ class SignupForm(forms.ModelForm):
             
         return cleaned_data
     
-    def save(self, commit=True):
-        """Create user with hashed password"""
+    def validate_unique(self):
+        """
+        username and email are left to clean_username/clean_email, which
+        match case-insensitively, and to the unique indexes on save
+        """
+        exclude = self._get_validation_exclusions() | {'username', 'email'}
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
+
+    async def ais_valid(self):
+        """
+        is_valid() for async views.
+        Field cleaning never touches the database; the username and email
+        checks run afterwards with aexists().
+        """
+        self._skip_unique_queries = True
+        try:
+            if not self.is_valid():
+                return False
+        finally:
+            self._skip_unique_queries = False
+
+        with replica_reads():
+            username = self.cleaned_data.get('username')
+            if username_might_be_taken(username) and await User.objects.filter(username__iexact=username).aexists():
+                self.add_error('username', 'This username is already taken')
+
+            email = self.cleaned_data.get('email')
+            if email_might_be_taken(email) and await User.objects.filter(email__iexact=email).aexists():
+                self.add_error('email', 'This email is already registered')
+
+        return not self.errors
+
+    def _build_user(self):
         user = super().save(commit=False)
-        user.set_password(self.cleaned_data['password'])
         user.is_active = True
         user.is_verified = False
 
         # Set COPPA flag if user is under 13
         if self.cleaned_data.get('is_under_13'):
             user.is_under_13 = True
+        return user
+
+    def save(self, commit=True):
+        """Create user with hashed password"""
+        user = self._build_user()
+        set_user_password(user, self.cleaned_data['password'])
         
         if commit:
-            user.save()
+            # Savepoint, so a lost uniqueness race leaves the request's transaction usable
+            with transaction.atomic():
+                user.save()
+
+        return user
 
+    async def asave(self):
+        """Async save(); Argon2 runs on the hashing pool"""
+        user = self._build_user()
+        await aset_user_password(user, self.cleaned_data['password'])
+        await user.asave()
         return user
     
 
@@ -206,7 +256,9 @@ class PasswordResetRequestForm(forms.Form):
         email = self.cleaned_data.get('email', '').strip().lower()
 
         # Check if email exists
-        if not User.objects.filter(email=email).exists():
+        with replica_reads():
+            exists = User.objects.filter(email=email).exists()
+        if not exists:
             raise ValidationError('No account found with this email addess')
         
         return email
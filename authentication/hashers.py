@@ -0,0 +1,63 @@
+# authentication/hashers.py
+
+import json
+from functools import lru_cache
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+def get_argon2_params_file():
+    return Path(getattr(settings, 'ARGON2_PARAMS_FILE', Path(settings.BASE_DIR) / 'var' / 'argon2.json'))
+
+
+@lru_cache(maxsize=None)
+def get_argon2_params():
+    """
+    Argon2 cost parameters: Django's defaults, overridden by the file
+    written by `manage.py tune_argon2`, overridden by settings.ARGON2_PARAMS.
+    """
+    params = {
+        'time_cost': Argon2PasswordHasher.time_cost,
+        'memory_cost': Argon2PasswordHasher.memory_cost,
+        'parallelism': Argon2PasswordHasher.parallelism,
+    }
+
+    try:
+        with open(get_argon2_params_file(), encoding='utf-8') as f:
+            tuned = json.load(f)
+        params.update({k: int(tuned[k]) for k in params if k in tuned})
+    except (OSError, ValueError):
+        pass
+
+    params.update(getattr(settings, 'ARGON2_PARAMS', {}))
+    return params
+
+
+@receiver(setting_changed)
+def _reset_argon2_params(setting, **kwargs):
+    if setting in ('ARGON2_PARAMS', 'ARGON2_PARAMS_FILE'):
+        get_argon2_params.cache_clear()
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 with the cost tuned for this machine.
+    Same algorithm name as Django's hasher, so existing hashes verify and
+    must_update() flags the ones made with other parameters for rehashing
+    on the next successful login.
+    """
+
+    @property
+    def time_cost(self):
+        return get_argon2_params()['time_cost']
+
+    @property
+    def memory_cost(self):
+        return get_argon2_params()['memory_cost']
+
+    @property
+    def parallelism(self):
+        return get_argon2_params()['parallelism']
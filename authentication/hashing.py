@@ -0,0 +1,275 @@
+# authentication/hashing.py
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PASSWORD_HASHING = {
+    'WORKERS': 2,  # concurrent Argon2 computations per process
+    'MAX_PENDING': 8,  # hashes running or waiting before new ones are shed
+    'RETRY_AFTER': 5,  # seconds, sent with the 429
+}
+
+
+def get_password_hashing_settings():
+    """Merge PASSWORD_HASHING from settings over the defaults"""
+    options = dict(DEFAULT_PASSWORD_HASHING)
+    options.update(getattr(settings, 'PASSWORD_HASHING', {}))
+    return options
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing queue is full; turned into a 429 by the middleware"""
+
+# ============================
+# METRICS
+# ============================
+
+class HashingStats:
+    """Hash latency and queue wait per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.shed = 0
+        self.total_hash_ms = 0.0
+        self.max_hash_ms = 0.0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record(self, wait_seconds, hash_seconds):
+        with self._lock:
+            wait_ms, hash_ms = wait_seconds * 1000, hash_seconds * 1000
+            self.count += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.total_hash_ms += hash_ms
+            self.max_hash_ms = max(self.max_hash_ms, hash_ms)
+
+    def record_shed(self):
+        with self._lock:
+            self.shed += 1
+
+    def snapshot(self):
+        with self._lock:
+            count = self.count or 1
+            return {
+                'count': self.count,
+                'shed': self.shed,
+                'avg_hash_ms': self.total_hash_ms / count,
+                'max_hash_ms': self.max_hash_ms,
+                'avg_wait_ms': self.total_wait_ms / count,
+                'max_wait_ms': self.max_wait_ms,
+            }
+
+# ============================
+# POOL
+# ============================
+
+class PasswordHashingPool:
+    """
+    Runs password hashing on a fixed number of threads.
+
+    argon2-cffi releases the GIL while hashing, so the pool bounds how
+    many hashes burn CPU and memory at once while request threads serving
+    other pages keep running. Callers still wait for their own result;
+    once MAX_PENDING hashes are queued, new ones fail fast instead.
+    """
+
+    def __init__(self, workers=2, max_pending=8):
+        self.max_pending = max_pending
+        self.stats = HashingStats()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats.record_shed()
+                raise HashingOverloaded(f'{self._pending} password hashes already pending')
+            self._pending += 1
+
+    def _run(self, func, args, queued_at):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.stats.record(started - queued_at, time.perf_counter() - started)
+            with self._lock:
+                self._pending -= 1
+
+    def submit(self, func, *args):
+        """Schedule func(*args) and return the Future"""
+        self._reserve()
+        try:
+            return self._executor.submit(self._run, func, args, time.perf_counter())
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def run(self, func, *args):
+        """Run func(*args) on the pool and wait for the result"""
+        return self.submit(func, *args).result()
+
+    async def arun(self, func, *args):
+        """Run func(*args) on the pool without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the process-wide PasswordHashingPool"""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = get_password_hashing_settings()
+                _pool = PasswordHashingPool(options['WORKERS'], options['MAX_PENDING'])
+    return _pool
+
+
+def get_hashing_stats():
+    pool = get_hashing_pool()
+    return dict(pool.stats.snapshot(), pending=pool.pending)
+
+# ============================
+# PUBLIC API
+# ============================
+
+def hash_password(raw_password):
+    """make_password() on the hashing pool"""
+    return get_hashing_pool().run(make_password, raw_password)
+
+
+def set_user_password(user, raw_password):
+    """user.set_password() with the hash computed on the pool"""
+    user.password = hash_password(raw_password)
+    # Same bookkeeping as AbstractBaseUser.set_password
+    user._password = raw_password
+
+
+def check_user_password(user, raw_password, save=True):
+    """
+    user.check_password() with the verification on the pool.
+    An outdated hash (older hasher or Argon2 parameters) is upgraded here,
+    in the caller's thread, so the save happens on the request's own
+    database connection. Pass save=False when the caller saves the user
+    anyway; the new hash then rides along with that write.
+    """
+    old_hash = user.password
+    is_correct, must_update = get_hashing_pool().run(verify_password, raw_password, user.password)
+
+    if is_correct and must_update:
+        set_user_password(user, raw_password)
+        _upgraded(user, old_hash, save)
+        if save:
+            user.save(update_fields=['password'])
+    return is_correct
+
+
+def _upgraded(user, old_hash, save):
+    user._password = None
+    # Remembered for pending_rehash() when the save is left to the caller
+    user._rehashed_from = None if save else old_hash
+
+
+def _digest(password_hash):
+    return hashlib.sha256(password_hash.encode()).hexdigest()
+
+
+def pending_rehash(user):
+    """
+    Session value carrying a hash upgraded by check_user_password(save=False)
+    to a later request that saves the user anyway, or None.
+    """
+    old_hash = getattr(user, '_rehashed_from', None)
+    if not old_hash:
+        return None
+    return {'from': _digest(old_hash), 'to': user.password}
+
+
+def apply_pending_rehash(user, pending):
+    """Put a hash from pending_rehash() on user, unless the password changed in between"""
+    if pending and hmac.compare_digest(pending['from'], _digest(user.password)):
+        user.password = pending['to']
+        return True
+    return False
+
+
+async def ahash_password(raw_password):
+    return await get_hashing_pool().arun(make_password, raw_password)
+
+
+async def aset_user_password(user, raw_password):
+    user.password = await ahash_password(raw_password)
+    user._password = raw_password
+
+
+async def acheck_user_password(user, raw_password, save=True):
+    """Async check_user_password(); the event loop keeps serving while Argon2 runs"""
+    old_hash = user.password
+    is_correct, must_update = await get_hashing_pool().arun(verify_password, raw_password, user.password)
+
+    if is_correct and must_update:
+        await aset_user_password(user, raw_password)
+        _upgraded(user, old_hash, save)
+        if save:
+            await user.asave(update_fields=['password'])
+    return is_correct
+
+# ============================
+# MIDDLEWARE
+# ============================
+
+class HashingOverloadMiddleware:
+    """Answer 429 Too Many Requests when the hashing pool sheds a request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Sync or async, whichever get_response is; exceptions reach
+        # process_exception through Django's handler either way
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingOverloaded):
+            return None
+
+        logger.warning(f"Shedding {request.path}: {str(exception)}")
+        response = HttpResponse(
+            'The server is busy. Please try again in a few seconds.',
+            status=429,
+            content_type='text/plain',
+        )
+        response['Retry-After'] = str(get_password_hashing_settings()['RETRY_AFTER'])
+        return response
@@ -0,0 +1,170 @@
+# authentication/identity.py
+
+import hashlib
+from django.conf import settings
+from django.contrib.auth import get_user_model, user_login_failed
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from .hashing import acheck_user_password, ahash_password, check_user_password, hash_password
+
+
+DEFAULT_IDENTITY_CACHE = {
+    # Unknown identifiers are remembered in the cache below, so a signup on
+    # one worker is seen by every worker once forget_identity() runs. With
+    # the default local memory cache each process has its own copy; set
+    # REDIS_URL when running several workers
+    'NEGATIVE_TTL': 60,  # seconds an unknown identifier stays unknown (0 disables)
+    # Positive entries hold the full user row; only enable with a cache
+    # shared by every worker, otherwise another worker may keep serving
+    # a stale password hash until the TTL runs out
+    'POSITIVE_TTL': 0,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_identity_cache_settings():
+    """Merge IDENTITY_CACHE from settings over the defaults"""
+    options = dict(DEFAULT_IDENTITY_CACHE)
+    options.update(getattr(settings, 'IDENTITY_CACHE', {}))
+    return options
+
+
+def _lookup_field(identifier):
+    return 'email' if '@' in identifier else 'username'
+
+
+def _cache_keys(identifier):
+    """(unknown key, user key) for an identifier"""
+    # Hash so arbitrary login input is a valid memcached key
+    digest = hashlib.sha256(identifier.encode()).hexdigest()
+    field = _lookup_field(identifier)
+    return f"identity:unknown:{field}:{digest}", f"identity:user:{field}:{digest}"
+
+
+def _cached(found, unknown_key, user_key):
+    """Return (hit, user) from a get_many() result"""
+    if found.get(unknown_key):
+        return True, None
+    user = found.get(user_key)
+    return user is not None, user
+
+
+def _keys_to_read(options, unknown_key, user_key):
+    keys = []
+    if options['NEGATIVE_TTL']:
+        keys.append(unknown_key)
+    if options['POSITIVE_TTL']:
+        keys.append(user_key)
+    return keys
+
+
+def resolve_user(identifier):
+    """
+    Return the User for a username or email, or None.
+    One cache read or one query; unknown identifiers are remembered
+    for NEGATIVE_TTL seconds so repeated guesses never reach the database.
+    """
+    User = get_user_model()
+    options = get_identity_cache_settings()
+
+    if not identifier:
+        return None
+
+    cache = caches[options['CACHE_ALIAS']]
+    unknown_key, user_key = _cache_keys(identifier)
+    keys = _keys_to_read(options, unknown_key, user_key)
+    if keys:
+        hit, user = _cached(cache.get_many(keys), unknown_key, user_key)
+        if hit:
+            return user
+
+    user = User.objects.filter(**{_lookup_field(identifier): identifier}).first()
+
+    if user is None:
+        if options['NEGATIVE_TTL']:
+            cache.set(unknown_key, True, options['NEGATIVE_TTL'])
+    elif options['POSITIVE_TTL']:
+        cache.set(user_key, user, options['POSITIVE_TTL'])
+    return user
+
+
+async def aresolve_user(identifier):
+    """Async resolve_user()"""
+    User = get_user_model()
+    options = get_identity_cache_settings()
+
+    if not identifier:
+        return None
+
+    cache = caches[options['CACHE_ALIAS']]
+    unknown_key, user_key = _cache_keys(identifier)
+    keys = _keys_to_read(options, unknown_key, user_key)
+    if keys:
+        hit, user = _cached(await cache.aget_many(keys), unknown_key, user_key)
+        if hit:
+            return user
+
+    user = await User.objects.filter(**{_lookup_field(identifier): identifier}).afirst()
+
+    if user is None:
+        if options['NEGATIVE_TTL']:
+            await cache.aset(unknown_key, True, options['NEGATIVE_TTL'])
+    elif options['POSITIVE_TTL']:
+        await cache.aset(user_key, user, options['POSITIVE_TTL'])
+    return user
+
+
+def forget_identity(user):
+    """Drop cached entries for a user after it is saved or deleted"""
+    options = get_identity_cache_settings()
+
+    keys = [key for identifier in (user.username, user.email) if identifier for key in _cache_keys(identifier)]
+    if keys:
+        caches[options['CACHE_ALIAS']].delete_many(keys)
+
+
+def authenticate_user(request, identifier, password, save_rehash=True):
+    """
+    Check a password against the user resolved from identifier.
+    Equivalent to authenticate() with ModelBackend, but reuses the user
+    row already loaded by resolve_user instead of fetching it again.
+    With save_rehash=False an upgraded hash is only set on the returned
+    user, for callers that save it right after.
+    """
+    user = resolve_user(identifier)
+
+    if user is None:
+        # Same mitigation as ModelBackend: hash anyway so response time
+        # doesn't reveal whether the account exists
+        hash_password(password)
+    elif check_user_password(user, password, save=save_rehash) and ModelBackend().user_can_authenticate(user):
+        user.backend = 'django.contrib.auth.backends.ModelBackend'
+        return user
+
+    user_login_failed.send(
+        sender=__name__,
+        credentials={'username': identifier},
+        request=request,
+    )
+    return None
+
+
+async def aauthenticate_user(request, identifier, password, save_rehash=True):
+    """Async authenticate_user(); hashing runs on the pool, not the event loop"""
+    user = await aresolve_user(identifier)
+
+    if user is None:
+        await ahash_password(password)
+    elif (
+        await acheck_user_password(user, password, save=save_rehash)
+        and ModelBackend().user_can_authenticate(user)
+    ):
+        user.backend = 'django.contrib.auth.backends.ModelBackend'
+        return user
+
+    await user_login_failed.asend(
+        sender=__name__,
+        credentials={'username': identifier},
+        request=request,
+    )
+    return None
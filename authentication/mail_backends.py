@@ -0,0 +1,245 @@
+# authentication/mail_backends.py
+
+import logging
+import smtplib
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_EMAIL_POOL = {
+    'MAX_SIZE': 4,  # authenticated connections kept per SMTP server
+    'ACQUIRE_TIMEOUT': 10.0,  # seconds to wait for a free connection
+    'HEALTH_CHECK_INTERVAL': 30.0,  # NOOP a connection idle for longer than this
+    'MAX_AGE': 300.0,  # recycle connections older than this
+    'MAX_MESSAGES': 100,  # recycle after this many messages
+}
+
+
+def get_email_pool_settings():
+    """Merge EMAIL_POOL from settings over the defaults"""
+    options = dict(DEFAULT_EMAIL_POOL)
+    options.update(getattr(settings, 'EMAIL_POOL', {}))
+    return options
+
+
+class PooledConnection:
+    """An open SMTP connection plus the bookkeeping used to recycle it"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of authenticated SMTP connections to one server.
+    At most max_size connections exist at once; idle ones are kept in
+    a LIFO stack so the warmest connection is reused first.
+    """
+
+    def __init__(self, factory, options):
+        self.factory = factory
+        self.options = options
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(options['MAX_SIZE'])
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.options['ACQUIRE_TIMEOUT']):
+            raise smtplib.SMTPException('Timed out waiting for a pooled SMTP connection')
+
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return PooledConnection(self.factory())
+                if self._is_usable(conn):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        try:
+            if broken or self._is_expired(conn):
+                self._discard(conn)
+            else:
+                conn.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def _is_expired(self, conn):
+        return (
+            time.monotonic() - conn.created_at > self.options['MAX_AGE']
+            or conn.messages_sent >= self.options['MAX_MESSAGES']
+        )
+
+    def _is_usable(self, conn):
+        if self._is_expired(conn):
+            return False
+        if time.monotonic() - conn.last_used < self.options['HEALTH_CHECK_INTERVAL']:
+            return True
+        try:
+            return conn.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                conn.smtp.close()
+            except OSError:
+                pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PooledSMTPBackend(EmailBackend):
+    """
+    SMTP backend that borrows connections from a process-wide pool.
+
+    open() takes an authenticated connection from the pool instead of
+    connecting and doing a TLS handshake, and close() hands it back, so
+    concurrent requests share a few long-lived connections. Everything
+    else, including send_messages(), is Django's SMTP backend.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pooled = None
+        self._broken = False
+
+    def _pool_key(self):
+        return (self.host, self.port, self.username, self.use_tls, self.use_ssl)
+
+    def _get_pool(self):
+        key = self._pool_key()
+        pool = _pools.get(key)
+        if pool is None:
+            with _pools_lock:
+                pool = _pools.get(key)
+                if pool is None:
+                    pool = SMTPConnectionPool(self._connect, get_email_pool_settings())
+                    _pools[key] = pool
+        return pool
+
+    def _connect(self):
+        """Open a fresh authenticated connection using Django's own open()"""
+        # A throwaway stock backend does the connect/STARTTLS/login, so the
+        # pool never touches the state of whichever backend created it
+        backend = EmailBackend(
+            host=self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            use_tls=self.use_tls,
+            use_ssl=self.use_ssl,
+            timeout=self.timeout,
+            ssl_keyfile=self.ssl_keyfile,
+            ssl_certfile=self.ssl_certfile,
+            fail_silently=False,
+        )
+        backend.open()
+        logger.debug(f"Opened pooled SMTP connection to {self.host}:{self.port}")
+        return backend.connection
+
+    def open(self):
+        if self.connection:
+            return False
+
+        try:
+            self._pooled = self._get_pool().acquire()
+        except (smtplib.SMTPException, OSError):
+            if not self.fail_silently:
+                raise
+            return None
+
+        self._broken = False
+        self.connection = self._pooled.smtp
+        return True
+
+    def close(self):
+        if self._pooled is None:
+            return
+
+        pooled, self._pooled = self._pooled, None
+        self.connection = None
+        self._get_pool().release(pooled, broken=self._broken)
+
+    def _send(self, email_message):
+        try:
+            sent = super()._send(email_message)
+        except (smtplib.SMTPException, OSError):
+            self._broken = True
+            raise
+
+        if sent and self._pooled is not None:
+            self._pooled.messages_sent += 1
+        elif not sent and email_message.recipients():
+            # fail_silently swallowed an error; don't trust this connection again
+            self._broken = True
+        return sent
+
+
+# ============================
+# ASYNC DELIVERY
+# ============================
+
+async def asend_message(email_message):
+    """
+    Send an EmailMessage from async code.
+    PooledSMTPBackend is called on a worker thread, so the message reuses
+    a pooled connection and the event loop only waits on the thread.
+    Plain SMTP goes through aiosmtplib when it is installed; any other
+    backend (console, locmem in tests) is called through sync_to_async.
+    """
+    if settings.EMAIL_BACKEND == 'authentication.mail_backends.PooledSMTPBackend':
+        # Not thread-sensitive: the pool is thread safe and bounds the connections
+        return await sync_to_async(email_message.send, thread_sensitive=False)(fail_silently=False)
+
+    if aiosmtplib is None or settings.EMAIL_BACKEND != 'django.core.mail.backends.smtp.EmailBackend':
+        return await sync_to_async(email_message.send)(fail_silently=False)
+
+    recipients = email_message.recipients()
+    if not recipients:
+        return 0
+
+    await aiosmtplib.send(
+        email_message.message(),
+        sender=email_message.from_email,
+        recipients=recipients,
+        hostname=settings.EMAIL_HOST,
+        port=settings.EMAIL_PORT,
+        username=settings.EMAIL_HOST_USER or None,
+        password=settings.EMAIL_HOST_PASSWORD or None,
+        start_tls=settings.EMAIL_USE_TLS,
+        use_tls=getattr(settings, 'EMAIL_USE_SSL', False),
+        timeout=getattr(settings, 'EMAIL_TIMEOUT', None),
+    )
+    return 1
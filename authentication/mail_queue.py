@@ -0,0 +1,359 @@
+# authentication/mail_queue.py
+
+import logging
+import os
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .shutdown import register_shutdown_hook
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_EMAIL_QUEUE = {
+    'ENABLED': True,
+    'RUN_IN_PROCESS': True,  # start sender threads inside web workers
+    'WORKERS': 2,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_SECONDS': 5,  # doubled after every failed attempt
+    'MAX_BACKOFF_SECONDS': 600,
+    'POLL_INTERVAL': 5.0,  # seconds
+    'IDLE_CONNECTION_TIMEOUT': 60.0,  # close the SMTP connection after this long unused
+    'STALE_CLAIM_SECONDS': 600,  # requeue messages stuck in 'sending' after a crash
+    'RETENTION_DAYS': 7,  # sent and failed rows are deleted after this many days
+}
+
+
+def get_email_queue_settings():
+    """Merge EMAIL_QUEUE from settings over the defaults"""
+    options = dict(DEFAULT_EMAIL_QUEUE)
+    options.update(getattr(settings, 'EMAIL_QUEUE', {}))
+    return options
+
+# ============================
+# PUBLIC API
+# ============================
+
+def queue_email(subject, body, to_email, html_body=None, from_email=None):
+    """
+    Store an email for delivery by the sender workers.
+    Returns the OutboundEmail; the caller never waits for SMTP.
+    """
+    from .models import OutboundEmail
+
+    message = OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        to_email=to_email,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+    options = get_email_queue_settings()
+    if options['RUN_IN_PROCESS']:
+        # Wake a sender once the row is visible to other connections
+        transaction.on_commit(get_mail_sender_pool().wake)
+
+    return message
+
+
+def get_email_status(message_id):
+    """Return the delivery status of a queued email, or None if it is unknown"""
+    from .models import OutboundEmail
+
+    if not message_id:
+        return None
+
+    return (
+        OutboundEmail.objects
+        .filter(id=message_id)
+        .values_list('status', flat=True)
+        .first()
+    )
+
+def queued_email_id(result):
+    """Return the OutboundEmail id from a send_*_email result, if it was queued"""
+    pk = getattr(result, 'pk', None)
+    return str(pk) if pk else None
+
+
+async def aqueue_email(subject, body, to_email, html_body=None, from_email=None):
+    """
+    Async queue_email().
+    Async views run in autocommit, so the row is visible as soon as
+    acreate() returns and the senders can be woken right away.
+    """
+    from .models import OutboundEmail
+
+    message = await OutboundEmail.objects.acreate(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        to_email=to_email,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+    if get_email_queue_settings()['RUN_IN_PROCESS']:
+        get_mail_sender_pool().wake()
+
+    return message
+
+
+async def aget_email_status(message_id):
+    """Async get_email_status()"""
+    from .models import OutboundEmail
+
+    if not message_id:
+        return None
+
+    return await (
+        OutboundEmail.objects
+        .filter(id=message_id)
+        .values_list('status', flat=True)
+        .afirst()
+    )
+
+# ============================
+# SENDER WORKERS
+# ============================
+
+# Bodies hold live OTP codes and reset links; once a message is sent or
+# has failed for good nothing needs them, so they are blanked right away
+REDACTED_BODY = {'body': '', 'html_body': None}
+
+
+class MailSender:
+    """
+    One sender worker.
+    Keeps a single SMTP connection open across messages and closes it
+    after IDLE_CONNECTION_TIMEOUT seconds without work.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.connection = None
+        self.last_used = 0
+
+    def _get_connection(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        self.last_used = time.monotonic()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def close_if_idle(self):
+        if self.connection is not None:
+            if time.monotonic() - self.last_used > self.options['IDLE_CONNECTION_TIMEOUT']:
+                self.close()
+
+    def claim_next(self):
+        """Atomically take the next due message; returns None when there is nothing to do"""
+        from .models import OutboundEmail
+
+        now = timezone.now()
+
+        candidates = (
+            OutboundEmail.objects
+            .filter(status=OutboundEmail.STATUS_QUEUED, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:10]
+        )
+
+        for message_id in candidates:
+            # A conditional UPDATE is the claim, so workers in several
+            # processes never send the same message twice
+            claimed = OutboundEmail.objects.filter(
+                id=message_id, status=OutboundEmail.STATUS_QUEUED
+            ).update(status=OutboundEmail.STATUS_SENDING, claimed_at=now)
+
+            if claimed:
+                return OutboundEmail.objects.get(id=message_id)
+
+        return None
+
+    def deliver(self, message):
+        """Send one claimed message, retrying later with backoff on failure"""
+        from .models import OutboundEmail
+
+        email = EmailMultiAlternatives(
+            subject=message.subject,
+            body=message.body,
+            from_email=message.from_email,
+            to=[message.to_email],
+        )
+        if message.html_body:
+            email.attach_alternative(message.html_body, 'text/html')
+
+        attempts = message.attempts + 1
+
+        try:
+            try:
+                self._get_connection().send_messages([email])
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped our idle connection; retry once on a fresh one
+                self.close()
+                self._get_connection().send_messages([email])
+        except Exception as e:
+            self.close()
+
+            if attempts >= self.options['MAX_ATTEMPTS']:
+                status = OutboundEmail.STATUS_FAILED
+                next_attempt_at = message.next_attempt_at
+                logger.error(f"Giving up on email to {message.to_email} after {attempts} attempts: {str(e)}")
+            else:
+                status = OutboundEmail.STATUS_QUEUED
+                delay = min(
+                    self.options['BACKOFF_SECONDS'] * (2 ** (attempts - 1)),
+                    self.options['MAX_BACKOFF_SECONDS'],
+                )
+                next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                logger.warning(f"Email to {message.to_email} failed, retrying in {delay}s: {str(e)}")
+
+            OutboundEmail.objects.filter(id=message.id).update(
+                status=status,
+                attempts=attempts,
+                last_error=str(e),
+                next_attempt_at=next_attempt_at,
+                claimed_at=None,
+                **(REDACTED_BODY if status == OutboundEmail.STATUS_FAILED else {}),
+            )
+            return False
+
+        OutboundEmail.objects.filter(id=message.id).update(
+            status=OutboundEmail.STATUS_SENT,
+            attempts=attempts,
+            last_error=None,
+            sent_at=timezone.now(),
+            **REDACTED_BODY,
+        )
+        logger.info(f"Email '{message.subject}' sent to {message.to_email}")
+        return True
+
+    def run_once(self):
+        """Deliver every due message; returns how many were handled"""
+        handled = 0
+        while True:
+            message = self.claim_next()
+            if message is None:
+                break
+            self.deliver(message)
+            handled += 1
+        return handled
+
+
+def requeue_stale_claims(options):
+    """Put messages left in 'sending' by a crashed worker back on the queue"""
+    from .models import OutboundEmail
+
+    cutoff = timezone.now() - timedelta(seconds=options['STALE_CLAIM_SECONDS'])
+    return OutboundEmail.objects.filter(
+        status=OutboundEmail.STATUS_SENDING, claimed_at__lt=cutoff
+    ).update(status=OutboundEmail.STATUS_QUEUED, claimed_at=None)
+
+
+def purge_old_emails(options):
+    """Delete sent and failed messages older than RETENTION_DAYS; returns how many"""
+    from .models import OutboundEmail
+
+    cutoff = timezone.now() - timedelta(days=options['RETENTION_DAYS'])
+    deleted, _ = OutboundEmail.objects.filter(
+        status__in=[OutboundEmail.STATUS_SENT, OutboundEmail.STATUS_FAILED],
+        created_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+class MailSenderPool:
+    """Fixed-size pool of MailSender threads for one process"""
+
+    def __init__(self, options=None):
+        self.options = options or get_email_queue_settings()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            # Threads do not survive fork(), so each worker process starts its own
+            if self._threads and self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = []
+            for i in range(self.options['WORKERS']):
+                thread = threading.Thread(
+                    target=self._run, name=f'mail-sender-{i}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        sender = MailSender(self.options)
+        last_requeue = 0
+        try:
+            while not self._stopping.is_set():
+                try:
+                    if time.monotonic() - last_requeue > 60:
+                        requeue_stale_claims(self.options)
+                        purge_old_emails(self.options)
+                        last_requeue = time.monotonic()
+                    handled = sender.run_once()
+                except Exception as e:
+                    logger.error(f"Mail sender error: {str(e)}")
+                    handled = 0
+                finally:
+                    close_old_connections()
+
+                if not handled:
+                    sender.close_if_idle()
+                    self._wakeup.wait(self.options['POLL_INTERVAL'])
+                    self._wakeup.clear()
+        finally:
+            sender.close()
+
+    def shutdown(self, timeout=10):
+        """Stop the senders; messages still queued stay in the database"""
+        if not self._threads or self._pid != os.getpid():
+            return
+
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_mail_sender_pool():
+    """Return the process-wide MailSenderPool"""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = MailSenderPool()
+                register_shutdown_hook(_pool.shutdown)
+    return _pool
@@ -0,0 +1,116 @@
+# authentication/management/commands/bench_auth_views.py
+
+import asyncio
+import importlib
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches, reverse
+from authentication.hashing import set_user_password
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the login step through the sync stack (WSGI handler, "
+        "views.login_view) and the async stack (ASGI handler, "
+        "async_views.login_view) and compare requests per second. "
+        "Creates a throwaway verified user and removes it afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--stack', choices=('sync', 'async', 'both'), default='both')
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        password = f'Bench-{uuid.uuid4().hex}'
+        user = User(username=f'bench_{suffix}', email=f'bench_{suffix}@example.invalid')
+        set_user_password(user, password)
+        user.is_active = True
+        user.is_verified = True
+        user.save()
+
+        credentials = {'username': user.username, 'password': password}
+        stacks = ('sync', 'async') if options['stack'] == 'both' else (options['stack'],)
+
+        # Queue the OTP mails but never hand them to a real SMTP server
+        email_queue = dict(getattr(settings, 'EMAIL_QUEUE', {}), RUN_IN_PROCESS=False)
+
+        try:
+            with override_settings(EMAIL_QUEUE=email_queue):
+                for stack in stacks:
+                    with self._routed(stack == 'async'):
+                        url = reverse('authentication:login')
+                        run = self._run_async if stack == 'async' else self._run_sync
+                        elapsed, statuses = run(url, credentials, options)
+
+                    rate = options['requests'] / elapsed
+                    summary = ', '.join(f'{code}: {n}' for code, n in sorted(statuses.items()))
+                    self.stdout.write(f"{stack:<6} {rate:8.1f} req/s  ({summary})")
+        finally:
+            from authentication.models import OutboundEmail
+            OutboundEmail.objects.filter(to_email=user.email).delete()
+            user.delete()
+
+    @contextmanager
+    def _routed(self, use_async):
+        """Reload the URLconf with ASYNC_AUTH_VIEWS set, and restore it afterwards"""
+        try:
+            with override_settings(ASYNC_AUTH_VIEWS=use_async):
+                self._reload_urls()
+                yield
+        finally:
+            self._reload_urls()
+
+    def _reload_urls(self):
+        import authentication.urls
+        importlib.reload(authentication.urls)
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    def _run_sync(self, url, credentials, options):
+        def worker(count):
+            client = Client()
+            statuses = Counter()
+            for _ in range(count):
+                statuses[client.post(url, credentials).status_code] += 1
+            return statuses
+
+        started = time.perf_counter()
+        statuses = Counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            for result in executor.map(worker, self._split(options)):
+                statuses.update(result)
+        return time.perf_counter() - started, statuses
+
+    def _run_async(self, url, credentials, options):
+        async def worker(count):
+            client = AsyncClient()
+            statuses = Counter()
+            for _ in range(count):
+                statuses[(await client.post(url, credentials)).status_code] += 1
+            return statuses
+
+        async def main():
+            return await asyncio.gather(*(worker(count) for count in self._split(options)))
+
+        started = time.perf_counter()
+        statuses = Counter()
+        for result in asyncio.run(main()):
+            statuses.update(result)
+        return time.perf_counter() - started, statuses
+
+    def _split(self, options):
+        """Spread --requests over --concurrency clients"""
+        base, extra = divmod(options['requests'], options['concurrency'])
+        return [base + (1 if i < extra else 0) for i in range(options['concurrency'])]
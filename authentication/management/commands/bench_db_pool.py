@@ -0,0 +1,98 @@
+# authentication/management/commands/bench_db_pool.py
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from authentication.db_pool import summarize_pool_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request database cost with a fresh connection per request "
+        "against a psycopg_pool ConnectionPool, using the 'default' Postgres "
+        "database. Each simulated request runs --queries short queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--queries', type=int, default=3, help='Queries per simulated request')
+        parser.add_argument('--pool-size', type=int, default=8)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        try:
+            import psycopg
+            from psycopg.conninfo import make_conninfo
+            from psycopg_pool import ConnectionPool
+        except ImportError:
+            raise CommandError('psycopg and psycopg_pool are required (pip install "psycopg[pool]")')
+
+        settings_dict = connections[options['database']].settings_dict
+        if settings_dict['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError(f"Database '{options['database']}' is not PostgreSQL")
+
+        conninfo = make_conninfo(
+            dbname=settings_dict['NAME'],
+            user=settings_dict['USER'] or None,
+            password=settings_dict['PASSWORD'] or None,
+            host=settings_dict['HOST'] or None,
+            port=settings_dict['PORT'] or None,
+        )
+
+        def run_queries(conn):
+            with conn.cursor() as cursor:
+                for _ in range(options['queries']):
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+
+        def unpooled():
+            # What every request paid when no connection survived it
+            with psycopg.connect(conninfo, autocommit=True) as conn:
+                run_queries(conn)
+
+        self._report('before (connect per request)', unpooled, options)
+
+        pool = ConnectionPool(
+            conninfo,
+            min_size=options['pool_size'],
+            max_size=options['pool_size'],
+            kwargs={'autocommit': True},
+            open=True,
+        )
+        try:
+            pool.wait()
+
+            def pooled():
+                with pool.connection() as conn:
+                    run_queries(conn)
+
+            self._report('after (pooled)', pooled, options)
+
+            stats = summarize_pool_stats(pool.get_stats())
+            self.stdout.write(
+                f"  pool: {stats['queued']} of {stats['requests']} checkouts waited, "
+                f"avg wait {stats['avg_wait_ms']:.2f}ms, {stats['connections_opened']} connections opened"
+            )
+        finally:
+            pool.close()
+
+    def _report(self, label, request, options):
+        def timed(_):
+            started = time.perf_counter()
+            request()
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            timings = list(executor.map(timed, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{label:<30} {options['requests'] / elapsed:8.1f} req/s  "
+            f"median {statistics.median(timings):6.2f}ms  p95 {p95:6.2f}ms"
+        )
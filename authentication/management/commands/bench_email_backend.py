@@ -0,0 +1,108 @@
+# authentication/management/commands/bench_email_backend.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from authentication.email_rendering import get_email_render_stats, render_email, render_stats
+
+
+STOCK_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+POOLED_BACKEND = 'authentication.mail_backends.PooledSMTPBackend'
+
+# (template, per-message context, static context), as sent from authentication/utils.py
+RENDER_SAMPLES = (
+    ('authentication/emails/otp_email.html', {'otp': '123456'}, {'valid_minutes': 10}),
+    ('authentication/emails/verify_email.html', {'verification_url': 'https://example.com/auth/verify-email/token/'}, None),
+    ('authentication/emails/reset_password.html', {'reset_url': 'https://example.com/auth/reset-password/token/'},
+     {'domain': 'https://example.com'}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare messages per second for Django's SMTP backend and the pooled "
+        "backend against a local aiosmtpd sink, then report email render timings. "
+        "Requires `pip install aiosmtpd` unless --render-only is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8, help='Simulated concurrent requests')
+        parser.add_argument('--port', type=int, default=8025)
+        parser.add_argument('--render-only', action='store_true', help='Skip the SMTP comparison')
+
+    def handle(self, *args, **options):
+        if not options['render_only']:
+            self._compare_backends(options)
+        self._report_rendering(options)
+
+    def _compare_backends(self, options):
+        try:
+            from aiosmtpd.controller import Controller
+            from aiosmtpd.handlers import Sink
+        except ImportError:
+            raise CommandError('aiosmtpd is not installed (pip install aiosmtpd)')
+
+        controller = Controller(Sink(), hostname='127.0.0.1', port=options['port'])
+        controller.start()
+
+        try:
+            for label, backend in (('before (stock SMTP)', STOCK_BACKEND), ('after (pooled SMTP)', POOLED_BACKEND)):
+                rate = self._run(backend, options)
+                self.stdout.write(f"{label:<22} {rate:8.1f} msg/s")
+        finally:
+            controller.stop()
+
+    def _run(self, backend, options):
+        def send_one(i):
+            # Each call mirrors one request: new backend instance, one message
+            connection = get_connection(
+                backend=backend,
+                host='127.0.0.1',
+                port=options['port'],
+                username='',
+                password='',
+                use_tls=False,
+                use_ssl=False,
+                fail_silently=False,
+            )
+            message = EmailMultiAlternatives(
+                subject=f'Benchmark {i}',
+                body='Your login code is 123456',
+                from_email='bench@example.com',
+                to=['user@example.com'],
+                connection=connection,
+            )
+            message.attach_alternative('<p>Your login code is <b>123456</b></p>', 'text/html')
+            return message.send()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            sent = sum(executor.map(send_one, range(options['messages'])))
+        elapsed = time.perf_counter() - started
+
+        if sent != options['messages']:
+            raise CommandError(f'Only {sent} of {options["messages"]} messages were accepted')
+        return sent / elapsed
+
+    def _report_rendering(self, options):
+        """Render each email template and print compile and per-message timings"""
+        render_stats.clear()
+        user = get_user_model()(username='bench', email='bench@example.com')
+
+        for template_name, context, static_context in RENDER_SAMPLES:
+            for _ in range(options['messages']):
+                render_email(template_name, {**context, 'user': user}, static_context=static_context)
+
+        budget = getattr(settings, 'EMAIL_RENDER_BUDGET_MS', None)
+        self.stdout.write(f"\nEmail rendering (budget {budget}ms per message)")
+        for template_name, stats in get_email_render_stats().items():
+            self.stdout.write(
+                f"{template_name.rsplit('/', 1)[-1]:<22} "
+                f"compile {stats['compile_ms']:7.2f}ms ({stats['compiles']}x)  "
+                f"render avg {stats['avg_ms']:6.3f}ms  max {stats['max_ms']:6.3f}ms  "
+                f"over budget {stats['over_budget']}/{stats['count']}"
+            )
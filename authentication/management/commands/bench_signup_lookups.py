@@ -0,0 +1,115 @@
+# authentication/management/commands/bench_signup_lookups.py
+
+import statistics
+import time
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from authentication.forms import SignupForm
+
+User = get_user_model()
+
+SEED_PREFIX = 'seed_'
+UPPER_INDEXES = ('users_username_upper_idx', 'users_email_upper_idx')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure signup validation latency (SignupForm.is_valid, including the "
+        "username/email __iexact checks) with and without the UPPER() indexes. "
+        "Use --seed on a benchmark database to add a few million users first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Users to insert before measuring')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--cleanup', action='store_true', help='Delete the seeded users and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(username__startswith=SEED_PREFIX).delete()
+            self.stdout.write(f"Deleted {deleted} seeded rows")
+            return
+
+        if options['seed']:
+            self._seed(options['seed'], options['batch_size'])
+
+        self.stdout.write(f"{User.objects.count()} users, {connection.vendor}")
+        self.stdout.write(f"  plan: {self._plan()}")
+        after = self._measure(options['iterations'])
+
+        # Drop the indexes inside a transaction and roll back: no lasting change
+        try:
+            with transaction.atomic():
+                with connection.schema_editor(atomic=False) as editor:
+                    for index in User._meta.indexes:
+                        if index.name in UPPER_INDEXES:
+                            editor.remove_index(User, index)
+                self.stdout.write(f"  plan without index: {self._plan()}")
+                before = self._measure(options['iterations'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        for label, timings in (('before (unique indexes only)', before), ('after (UPPER() indexes)', after)):
+            timings.sort()
+            self.stdout.write(
+                f"{label:<30} median {statistics.median(timings):7.2f}ms  "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:7.2f}ms"
+            )
+
+    def _seed(self, count, batch_size):
+        start = User.objects.filter(username__startswith=SEED_PREFIX).count()
+        now = timezone.now()
+
+        for offset in range(start, start + count, batch_size):
+            stop = min(offset + batch_size, start + count)
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=f'{SEED_PREFIX}{i}',
+                        email=f'{SEED_PREFIX}{i}@example.invalid',
+                        password='!',  # unusable
+                        date_joined=now,
+                    )
+                    for i in range(offset, stop)
+                ],
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"  seeded {stop - start}/{count}", ending='\r')
+        self.stdout.write('')
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {User._meta.db_table}')
+
+    def _plan(self):
+        plan = User.objects.filter(username__iexact='Nobody_Here').explain()
+        return plan.splitlines()[0]
+
+    @override_settings(AVAILABILITY_FILTER={'ENABLED': False})
+    def _measure(self, iterations):
+        """SignupForm.is_valid() latency with the availability filter off, so every check queries"""
+        timings = []
+        for _ in range(iterations):
+            name = uuid.uuid4().hex[:12]
+            form = SignupForm({
+                'username': name,
+                'email': f'{name}@example.com',
+                'password': 'Bench-Passw0rd!',
+                'confirm_password': 'Bench-Passw0rd!',
+                'agree_terms': True,
+            })
+
+            started = time.perf_counter()
+            form.is_valid()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
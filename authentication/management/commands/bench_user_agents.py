@@ -0,0 +1,104 @@
+# authentication/management/commands/bench_user_agents.py
+
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from authentication.models import LoginAttempt, UserSession
+from authentication.user_agents import (
+    classify_user_agent, clear_user_agent_cache, parse_user_agent, user_agent_cache_info
+)
+
+# Used when there is no --file and no recorded traffic yet: real headers,
+# weighted roughly like a consumer site where a few browsers dominate
+SAMPLE_USER_AGENTS = [
+    (30, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'),
+    (20, 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Mobile/15E148 Safari/604.1'),
+    (15, 'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36'),
+    (8, 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Safari/605.1.15'),
+    (6, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0'),
+    (5, 'Mozilla/5.0 (iPad; CPU OS 17_4_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Mobile/15E148 Safari/604.1'),
+    (4, 'Mozilla/5.0 (Linux; Android 14; SM-X710) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'),
+    (3, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0'),
+    (2, 'Mozilla/5.0 (Linux; Android 14; SAMSUNG SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36'),
+    (2, 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/124.0.6367.88 Mobile/15E148 Safari/604.1'),
+    (1, 'Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'),
+    (1, 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'),
+    (1, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 OPR/109.0.0.0'),
+    (1, 'Mozilla/5.0 (Linux; Android 13; Kindle Fire HD) AppleWebKit/537.36 (KHTML, like Gecko) Silk/124.2.1 like Chrome/124.0.0.0 Safari/537.36'),
+    (1, 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'),
+]
+
+
+def legacy_device_type(user_agent):
+    """detect_device_type() as it was: substring scans, 'android' before 'tablet'"""
+    user_agent = user_agent.lower()
+
+    if 'mobile' in user_agent or 'android' in user_agent or 'iphone' in user_agent:
+        return 'mobile'
+    elif 'tablet' in user_agent or 'ipad' in user_agent:
+        return 'tablet'
+    else:
+        return 'desktop'
+
+
+class Command(BaseCommand):
+    help = (
+        "Time device detection over a corpus of User-Agent headers: the old "
+        "substring chain, the compiled classifier, and the classifier behind "
+        "its LRU cache. The corpus is --file (one header per line), else the "
+        "headers recorded in user_sessions and login_attempts, else a built-in sample."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Text file with one User-Agent per line')
+        parser.add_argument('--limit', type=int, default=100000, help='Headers read from the database')
+        parser.add_argument('--repeat', type=int, default=5, help='Passes over the corpus per variant')
+
+    def handle(self, *args, **options):
+        corpus = self._corpus(options)
+        if not corpus:
+            raise CommandError('Empty corpus')
+        self.stdout.write(f"{len(corpus)} headers, {len(set(corpus))} distinct")
+
+        results = [
+            ('before (substring chain)', self._time(legacy_device_type, corpus, options['repeat'])),
+            ('compiled, uncached', self._time(lambda ua: classify_user_agent(ua).device, corpus, options['repeat'])),
+        ]
+        clear_user_agent_cache()
+        results.append(('compiled + LRU', self._time(lambda ua: parse_user_agent(ua).device, corpus, options['repeat'])))
+
+        for label, ns_per_call in results:
+            self.stdout.write(f"{label:<26} {ns_per_call:8.0f} ns/call")
+
+        info = user_agent_cache_info()
+        self.stdout.write(f"  LRU: {info.hits / max(1, info.hits + info.misses):.1%} hits, {info.currsize}/{info.maxsize} entries")
+
+        changed = Counter(
+            (legacy_device_type(ua), parse_user_agent(ua).device)
+            for ua in corpus
+            if legacy_device_type(ua) != parse_user_agent(ua).device
+        )
+        for (before, after), count in changed.most_common():
+            self.stdout.write(f"  reclassified {before} -> {after}: {count}")
+
+    def _corpus(self, options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                return [line.rstrip('\n') for line in f if line.strip()]
+
+        limit = options['limit']
+        corpus = list(UserSession.objects.values_list('user_agent', flat=True)[:limit])
+        corpus += LoginAttempt.objects.values_list('user_agent', flat=True)[:max(0, limit - len(corpus))]
+        corpus = [ua for ua in corpus if ua]
+        if corpus:
+            return corpus
+
+        self.stdout.write('No recorded traffic; using the built-in sample')
+        return [ua for weight, ua in SAMPLE_USER_AGENTS for _ in range(weight * 100)]
+
+    def _time(self, func, corpus, repeat):
+        started = time.perf_counter_ns()
+        for _ in range(repeat):
+            for ua in corpus:
+                func(ua)
+        return (time.perf_counter_ns() - started) / (len(corpus) * repeat)
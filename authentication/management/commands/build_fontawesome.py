@@ -0,0 +1,82 @@
+# authentication/management/commands/build_fontawesome.py
+
+import shutil
+from pathlib import Path
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from authentication.fontawesome import (
+    SCANNED_SUFFIXES, get_fontawesome_build_root, minify_css, scan_used_classes, subset_css,
+)
+
+try:
+    from fontTools import subset as font_subset
+except ImportError:
+    font_subset = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Build a Font Awesome subset containing only the icons our templates and "
+        "static JS/CSS use. Writes fontawesome/css/all.min.css and trimmed webfonts "
+        "to FONTAWESOME_BUILD_ROOT; collectstatic then publishes only those. "
+        "Install fonttools and brotli to also subset the glyphs."
+    )
+
+    def handle(self, *args, **options):
+        source = Path(finders.find('fontawesome/css/all.css', all=False) or '')
+        if not source.is_file():
+            raise CommandError('fontawesome/css/all.css not found in static files')
+        source_root = source.parent.parent
+
+        used = scan_used_classes(self._files_to_scan())
+        used.update(getattr(settings, 'FONTAWESOME_EXTRA_ICONS', []))
+
+        css, codepoints = subset_css(source.read_text(encoding='utf-8'), used)
+
+        build_root = get_fontawesome_build_root() / 'fontawesome'
+        if build_root.exists():
+            shutil.rmtree(build_root)
+        (build_root / 'css').mkdir(parents=True)
+        (build_root / 'webfonts').mkdir()
+
+        (build_root / 'css' / 'all.min.css').write_text(minify_css(css), encoding='utf-8')
+        shutil.copy(source_root / 'LICENSE.txt', build_root / 'LICENSE.txt')
+
+        if font_subset is None:
+            self.stdout.write(self.style.WARNING('fonttools is not installed; copying full woff2 fonts'))
+
+        for font in ('fa-solid-900', 'fa-regular-400', 'fa-brands-400'):
+            target = build_root / 'webfonts' / f'{font}.woff2'
+            if font_subset is None:
+                shutil.copy(source_root / 'webfonts' / f'{font}.woff2', target)
+            else:
+                self._subset_font(source_root / 'webfonts' / f'{font}.ttf', target, codepoints)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Kept {len(codepoints)} icons; wrote subset to {build_root}"
+        ))
+
+    def _files_to_scan(self):
+        for engine in engines.all():
+            for directory in engine.template_dirs:
+                directory = Path(directory)
+                if directory.is_dir():
+                    yield from directory.rglob('*.html')
+
+        for finder in finders.get_finders():
+            for path, storage in finder.list(['fontawesome/*', 'admin/*']):
+                if path.endswith(SCANNED_SUFFIXES):
+                    yield storage.path(path)
+
+    def _subset_font(self, source, target, codepoints):
+        font_options = font_subset.Options()
+        font_options.flavor = 'woff2'
+        font_options.layout_features = ['*']
+
+        font = font_subset.load_font(str(source), font_options)
+        subsetter = font_subset.Subsetter(font_options)
+        subsetter.populate(unicodes=codepoints)
+        subsetter.subset(font)
+        font_subset.save_font(font, str(target), font_options)
@@ -0,0 +1,88 @@
+# authentication/management/commands/prerender_pages.py
+
+import gzip
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from authentication.prerender import get_prerender_root
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Footer pages that render the same for every anonymous visitor
+PRERENDERED_PAGES = [
+    # About Roblox
+    'about', 'career', 'press', 'investors',
+    # Help
+    'customer_support', 'safety_center', 'report_abuse', 'community_standards',
+    # Resources
+    'developer_hub', 'education', 'blog', 'community',
+    # Legal
+    'term_of_use', 'privacy_policy', 'cookie_policy', 'license',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Prerender the anonymous footer pages (about, help, resources, legal) "
+        "to static HTML with gzip and brotli variants for PrerenderedPageMiddleware."
+    )
+
+    def handle(self, *args, **options):
+        root = get_prerender_root()
+        if root.exists():
+            shutil.rmtree(root)
+        root.mkdir(parents=True)
+
+        if brotli is None:
+            self.stdout.write(self.style.WARNING("brotli is not installed; skipping .br variants"))
+
+        factory = RequestFactory()
+        manifest = {}
+
+        for name in PRERENDERED_PAGES:
+            path = reverse(f'authentication:{name}')
+
+            request = factory.get(path, secure=not settings.DEBUG)
+            request.user = AnonymousUser()
+            request.resolver_match = match = resolve(path)
+
+            response = match.func(request, *match.args, **match.kwargs)
+            if response.status_code != 200:
+                raise CommandError(f"{path} returned {response.status_code}")
+            if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                raise CommandError(f"{path} uses a CSRF token and cannot be prerendered")
+
+            content = response.content
+            target = root / path.strip('/') / 'index.html'
+            target.parent.mkdir(parents=True, exist_ok=True)
+
+            files = {'identity': self._write(target, content)}
+            files['gzip'] = self._write(target.with_name('index.html.gz'), gzip.compress(content, 9, mtime=0))
+            if brotli is not None:
+                files['br'] = self._write(target.with_name('index.html.br'), brotli.compress(content))
+
+            manifest[path] = {
+                'content_type': response['Content-Type'],
+                'etag': f'"{hashlib.md5(content).hexdigest()}"',
+                'files': files,
+            }
+            self.stdout.write(f"  {path} ({len(content)} bytes)")
+
+        with open(root / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f"Prerendered {len(manifest)} pages to {root}"))
+
+    def _write(self, path, data):
+        Path(path).write_bytes(data)
+        return str(Path(path).relative_to(get_prerender_root()))
@@ -0,0 +1,52 @@
+# authentication/management/commands/send_queued_mail.py
+
+import time
+from django.core.management.base import BaseCommand
+from authentication.mail_queue import (
+    MailSender, MailSenderPool, get_email_queue_settings, purge_old_emails, requeue_stale_claims
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the outbound mail queue workers in the foreground. "
+        "Use with EMAIL_QUEUE['RUN_IN_PROCESS'] = False to keep SMTP out of web workers. "
+        "Sent and failed messages older than EMAIL_QUEUE['RETENTION_DAYS'] are deleted. "
+        "To try it locally, start a stub server with "
+        "`python -m aiosmtpd -n -l localhost:1025` and set EMAIL_HOST=localhost, "
+        "EMAIL_PORT=1025, EMAIL_USE_TLS=False."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Number of sender threads')
+        parser.add_argument('--once', action='store_true', help='Deliver what is due and exit')
+
+    def handle(self, *args, **options):
+        queue_options = get_email_queue_settings()
+        if options['workers']:
+            queue_options['WORKERS'] = options['workers']
+
+        purged = purge_old_emails(queue_options)
+        if purged:
+            self.stdout.write(f"Purged {purged} old emails")
+
+        if options['once']:
+            requeue_stale_claims(queue_options)
+            sender = MailSender(queue_options)
+            try:
+                handled = sender.run_once()
+            finally:
+                sender.close()
+            self.stdout.write(self.style.SUCCESS(f"Handled {handled} queued emails"))
+            return
+
+        pool = MailSenderPool(queue_options)
+        pool.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {queue_options['WORKERS']} mail senders"))
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping mail senders...")
+            pool.shutdown()
@@ -0,0 +1,119 @@
+# authentication/management/commands/tune_argon2.py
+
+import json
+import os
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from authentication.hashers import get_argon2_params, get_argon2_params_file
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+
+# OWASP minimum for Argon2id: 19 MiB memory with 2 iterations
+MIN_MEMORY_KIB = 19456
+MIN_TIME_COST = 2
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark Argon2 on this machine and pick time_cost, memory_cost and "
+        "parallelism whose verify time stays within --target-ms. The result is "
+        "written to ARGON2_PARAMS_FILE and used by TunedArgon2PasswordHasher. "
+        "Existing hashes are rehashed to the new parameters on login, so "
+        "parameters weaker than the current ones are refused without --allow-weaker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=100.0, help='Verify time budget')
+        parser.add_argument(
+            '--max-memory-kib', type=int,
+            help="Starting memory cost; defaults to the current hasher's memory_cost",
+        )
+        parser.add_argument('--parallelism', type=int, default=min(os.cpu_count() or 1, 4))
+        parser.add_argument('--samples', type=int, default=5)
+        parser.add_argument('--dry-run', action='store_true', help="Print the result without writing it")
+        parser.add_argument(
+            '--allow-weaker', action='store_true',
+            help='Write parameters with less memory or fewer iterations than the current ones',
+        )
+
+    def handle(self, *args, **options):
+        if argon2 is None:
+            raise CommandError('argon2-cffi is not installed')
+
+        current = get_argon2_params()
+        target = options['target_ms']
+        parallelism = options['parallelism']
+        memory_cost = options['max_memory_kib'] or current['memory_cost']
+
+        # Shrink memory until the minimum iterations fit in the budget
+        while True:
+            elapsed = self._measure(MIN_TIME_COST, memory_cost, parallelism, options['samples'])
+            self.stdout.write(f"  t={MIN_TIME_COST} m={memory_cost}KiB p={parallelism}: {elapsed:.1f}ms")
+            if elapsed <= target or memory_cost // 2 < MIN_MEMORY_KIB:
+                break
+            memory_cost //= 2
+
+        if elapsed > target:
+            self.stdout.write(self.style.WARNING(
+                f"Even the minimum cost takes {elapsed:.1f}ms; using it anyway"
+            ))
+
+        # Then spend what is left of the budget on iterations
+        time_cost = MIN_TIME_COST
+        while True:
+            elapsed = self._measure(time_cost + 1, memory_cost, parallelism, options['samples'])
+            self.stdout.write(f"  t={time_cost + 1} m={memory_cost}KiB p={parallelism}: {elapsed:.1f}ms")
+            if elapsed > target:
+                break
+            time_cost += 1
+
+        params = {
+            'time_cost': time_cost,
+            'memory_cost': memory_cost,
+            'parallelism': parallelism,
+            'target_ms': target,
+        }
+        self.stdout.write(self.style.SUCCESS(f"Selected {json.dumps(params)}"))
+
+        weaker = memory_cost < current['memory_cost'] or time_cost < current['time_cost']
+        if weaker:
+            message = (
+                f"Selected parameters are weaker than the current "
+                f"t={current['time_cost']} m={current['memory_cost']}KiB; every "
+                f"hash would be downgraded on its next login"
+            )
+            if not (options['allow_weaker'] or options['dry_run']):
+                raise CommandError(f"{message}. Pass --allow-weaker to write them anyway.")
+            self.stdout.write(self.style.WARNING(message))
+
+        if options['dry_run']:
+            return
+
+        path = get_argon2_params_file()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(params, f, indent=2)
+        self.stdout.write(f"Wrote {path}; restart the workers to apply it")
+
+    def _measure(self, time_cost, memory_cost, parallelism, samples):
+        """Median verify time in milliseconds"""
+        hasher = argon2.PasswordHasher(
+            time_cost=time_cost,
+            memory_cost=memory_cost,
+            parallelism=parallelism,
+            hash_len=argon2.DEFAULT_HASH_LENGTH,
+            salt_len=argon2.DEFAULT_RANDOM_SALT_LENGTH,
+        )
+        encoded = hasher.hash('benchmark-password')
+
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            hasher.verify(encoded, 'benchmark-password')
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_user_otp_code_user_otp_expires_at_user_otp_verified'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loginattempt',
+            name='attempted_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-17 10:05
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    CREATE INDEX CONCURRENTLY on Postgres so signups keep writing to a
+    large users table while the index builds; a plain AddIndex elsewhere.
+    Inlined rather than using django.contrib.postgres, which needs psycopg
+    to import.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+
+    # CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('authentication', '0004_outboundemail'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Upper('username'), name='users_username_upper_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='users_email_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-17 11:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0005_user_upper_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='otp_code',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='otp_expires_at',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 12:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_remove_user_otp_code_remove_user_otp_expires_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usersession',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
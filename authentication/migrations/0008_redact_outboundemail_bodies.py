@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def redact_delivered_bodies(apps, schema_editor):
+    # Rows sent or failed before bodies were blanked on delivery
+    OutboundEmail = apps.get_model('authentication', 'OutboundEmail')
+    OutboundEmail.objects.filter(status__in=['sent', 'failed']).update(body='', html_body=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_alter_usersession_last_activity'),
+    ]
+
+    operations = [
+        migrations.RunPython(redact_delivered_bodies, migrations.RunPython.noop),
+    ]
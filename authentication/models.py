@@ -1,10 +1,12 @@
 # authentication/models.py
 
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 from django.core.validators import MinLengthValidator
 import uuid
+from .dirty_fields import DirtyFieldsMixin
 
 
 class CustomUserManager(BaseUserManager):
@@ -42,7 +44,7 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(username, email, password, **extra_fields)
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class User(DirtyFieldsMixin, AbstractBaseUser, PermissionsMixin):
     """Custom User model for Roblox-style authentication"""
     
     # Unique identifier
@@ -76,9 +78,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_under_13 = models.BooleanField(default=False)
     parental_consent = models.BooleanField(default=False)
 
-    # OTP fields
-    otp_code = models.CharField(max_length=255, blank=True, null=True) # Hashed OTP
-    otp_expires_at = models.DateTimeField(blank=True, null=True)
+    # OTP state
+    # Pending codes live in the OTP store (authentication/otp_store.py)
     otp_verified = models.BooleanField(default=False) # Track if user has verified OTP before
     
     # Timestamps
@@ -118,6 +119,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name = 'User'
         verbose_name_plural = 'Users'
         ordering = ['-date_joined']
+        indexes = [
+            # __iexact compiles to UPPER(col) = UPPER(%s) on Postgres, which
+            # the unique indexes can't serve; these match it exactly
+            models.Index(Upper('username'), name='users_username_upper_idx'),
+            models.Index(Upper('email'), name='users_email_upper_idx'),
+        ]
     
     def __str__(self):
         return self.username
@@ -138,7 +145,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         return None
 
 
-class UserProfile(models.Model):
+class UserProfile(DirtyFieldsMixin, models.Model):
     """Extended profile information for users"""
     
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -251,7 +258,7 @@ class LoginAttempt(models.Model):
     username_or_email = models.CharField(max_length=255)
     ip_address = models.GenericIPAddressField()
     success = models.BooleanField(default=False)
-    attempted_at = models.DateTimeField(auto_now_add=True)
+    attempted_at = models.DateTimeField(default=timezone.now)  # Set by the caller so buffered rows keep their time
     user_agent = models.CharField(max_length=500, blank=True, null=True)
     
     class Meta:
@@ -274,10 +281,12 @@ class UserSession(models.Model):
     session_key = models.CharField(max_length=40, unique=True)
     ip_address = models.GenericIPAddressField()
     user_agent = models.CharField(max_length=500)
-    device_type = models.CharField(max_length=50, blank=True, null=True)  # mobile, desktop, tablet
+    device_type = models.CharField(max_length=50, blank=True, null=True)  # mobile, desktop, tablet, bot
     
     created_at = models.DateTimeField(auto_now_add=True)
-    last_activity = models.DateTimeField(auto_now=True)
+    # Set by the session activity tracker (authentication/session_activity.py),
+    # which writes the time the activity happened, not the time of the flush
+    last_activity = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
     
     class Meta:
@@ -285,4 +294,46 @@ class UserSession(models.Model):
         ordering = ['-last_activity']
     
     def __str__(self):
-        return f"{self.user.username} - {self.device_type} ({self.ip_address})"
\ No newline at end of file
+        return f"{self.user.username} - {self.device_type} ({self.ip_address})"
+
+class OutboundEmail(models.Model):
+    """Transactional email waiting to be delivered by the mail queue workers"""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    subject = models.CharField(max_length=255)
+    from_email = models.CharField(max_length=255)
+    to_email = models.EmailField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, null=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'outbound_emails'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
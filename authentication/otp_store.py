@@ -0,0 +1,273 @@
+# authentication/otp_store.py
+
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+DEFAULT_OTP_STORE = {
+    'BACKEND': 'authentication.otp_store.CacheBackend',
+    'CACHE_ALIAS': 'default',
+    'TTL': 600,  # seconds a code stays valid
+    'MAX_ATTEMPTS': 5,  # guesses per TTL window, across resent codes
+    'MAX_KEYS': 10000,  # LocalMemoryBackend only
+    'RESEND_LIMIT': 3,  # new codes per user, and per IP, ...
+    'RESEND_WINDOW_MINUTES': 15,  # ... per this many minutes
+}
+
+
+def get_otp_store_settings():
+    """Merge OTP_STORE from settings over the defaults"""
+    options = dict(DEFAULT_OTP_STORE)
+    options.update(getattr(settings, 'OTP_STORE', {}))
+    return options
+
+
+# Results of OTPStore.check()
+OTP_VALID = 'valid'
+OTP_INVALID = 'invalid'
+OTP_EXPIRED = 'expired'  # expired, already used, or never issued
+OTP_LOCKED = 'locked'  # too many wrong guesses
+
+# ============================
+# BACKENDS
+# ============================
+
+class BaseOTPBackend:
+    """
+    Storage for pending one-time codes.
+    Each key holds one code hash and a counter of verification attempts;
+    both disappear on their own once the TTL passes. The counter is kept
+    when a new code replaces the old one, so resending a code never buys
+    more guesses. The async methods default to the sync ones, which suits
+    backends that never block.
+    """
+
+    def __init__(self, max_keys=10000, **options):
+        self.max_keys = max_keys
+
+    def set(self, key, code_hash, timeout):
+        """Store a new code for key, keeping its attempt counter"""
+        raise NotImplementedError
+
+    def get(self, key):
+        """Return the stored code hash, or None if there is none or it expired"""
+        raise NotImplementedError
+
+    def incr_attempts(self, key, timeout):
+        """Atomically count one attempt for key and return the new count"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Forget the code and attempt counter for key"""
+        raise NotImplementedError
+
+    async def aset(self, key, code_hash, timeout):
+        self.set(key, code_hash, timeout)
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aincr_attempts(self, key, timeout):
+        return self.incr_attempts(key, timeout)
+
+    async def adelete(self, key):
+        self.delete(key)
+
+
+class LocalMemoryBackend(BaseOTPBackend):
+    """
+    In-process codes, for tests and single-process development.
+    A code issued by one worker can't be verified by another.
+    """
+
+    def __init__(self, max_keys=10000, **options):
+        super().__init__(max_keys=max_keys, **options)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry['expires'] < time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def set(self, key, code_hash, timeout):
+        with self._lock:
+            entry = self._live(key)
+            attempts = entry['attempts'] if entry else 0
+            self._data.pop(key, None)
+            self._data[key] = {'hash': code_hash, 'attempts': attempts, 'expires': time.monotonic() + timeout}
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry['hash'] if entry else None
+
+    def incr_attempts(self, key, timeout):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                # Count guesses against a missing code too, so they can't be free
+                entry = {'hash': None, 'attempts': 0, 'expires': time.monotonic() + timeout}
+                self._data[key] = entry
+            entry['attempts'] += 1
+            return entry['attempts']
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class CacheBackend(BaseOTPBackend):
+    """
+    Codes shared between processes through a Django cache.
+    Use a cache every worker can reach (Redis or memcached) in
+    production; the counter relies on the cache's atomic incr().
+    """
+
+    def __init__(self, max_keys=10000, cache_alias='default', **options):
+        super().__init__(max_keys=max_keys, **options)
+        self.cache = caches[cache_alias]
+
+    def _code_key(self, key):
+        return f"otp:{key}:code"
+
+    def _attempts_key(self, key):
+        return f"otp:{key}:attempts"
+
+    def set(self, key, code_hash, timeout):
+        # The attempt counter keeps its own expiry, counted from the first guess
+        self.cache.set(self._code_key(key), code_hash, timeout)
+
+    def get(self, key):
+        return self.cache.get(self._code_key(key))
+
+    def incr_attempts(self, key, timeout):
+        attempts_key = self._attempts_key(key)
+        self.cache.add(attempts_key, 0, timeout)
+        try:
+            return self.cache.incr(attempts_key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(attempts_key, 1, timeout)
+            return 1
+
+    def delete(self, key):
+        self.cache.delete_many([self._code_key(key), self._attempts_key(key)])
+
+    async def aset(self, key, code_hash, timeout):
+        await self.cache.aset(self._code_key(key), code_hash, timeout)
+
+    async def aget(self, key):
+        return await self.cache.aget(self._code_key(key))
+
+    async def aincr_attempts(self, key, timeout):
+        attempts_key = self._attempts_key(key)
+        await self.cache.aadd(attempts_key, 0, timeout)
+        try:
+            return await self.cache.aincr(attempts_key)
+        except ValueError:
+            await self.cache.aset(attempts_key, 1, timeout)
+            return 1
+
+    async def adelete(self, key):
+        await self.cache.adelete_many([self._code_key(key), self._attempts_key(key)])
+
+# ============================
+# STORE
+# ============================
+
+class OTPStore:
+    """
+    Pending login codes, keyed by user id.
+    Nothing here touches the users table: a code lives for ttl seconds,
+    is consumed by the first correct guess and stops matching after
+    max_attempts wrong ones, even if it is reissued in between. Every
+    check counts as an attempt before the stored hash is even read, and
+    hashes are compared in constant time.
+    """
+
+    def __init__(self, backend, ttl=600, max_attempts=5):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+
+    def issue(self, user_id, code_hash):
+        self.backend.set(str(user_id), code_hash, self.ttl)
+
+    def check(self, user_id, code_hash):
+        """Count one attempt and return OTP_VALID, OTP_INVALID, OTP_EXPIRED or OTP_LOCKED"""
+        key = str(user_id)
+        if self.backend.incr_attempts(key, self.ttl) > self.max_attempts:
+            # The counter outlives reissued codes, so the user is locked until it expires
+            return OTP_LOCKED
+
+        stored = self.backend.get(key)
+        if stored is None:
+            return OTP_EXPIRED
+        if not hmac.compare_digest(stored, code_hash):
+            return OTP_INVALID
+
+        self.backend.delete(key)
+        return OTP_VALID
+
+    def record_attempt(self, user_id):
+        """Count a wrong guess already rejected elsewhere; returns OTP_INVALID or OTP_LOCKED"""
+        if self.backend.incr_attempts(str(user_id), self.ttl) > self.max_attempts:
+            return OTP_LOCKED
+        return OTP_INVALID
+
+    def discard(self, user_id):
+        self.backend.delete(str(user_id))
+
+    async def aissue(self, user_id, code_hash):
+        await self.backend.aset(str(user_id), code_hash, self.ttl)
+
+    async def arecord_attempt(self, user_id):
+        if await self.backend.aincr_attempts(str(user_id), self.ttl) > self.max_attempts:
+            return OTP_LOCKED
+        return OTP_INVALID
+
+    async def acheck(self, user_id, code_hash):
+        """Async check()"""
+        key = str(user_id)
+        if await self.backend.aincr_attempts(key, self.ttl) > self.max_attempts:
+            return OTP_LOCKED
+
+        stored = await self.backend.aget(key)
+        if stored is None:
+            return OTP_EXPIRED
+        if not hmac.compare_digest(stored, code_hash):
+            return OTP_INVALID
+
+        await self.backend.adelete(key)
+        return OTP_VALID
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_otp_store():
+    """Return the shared store configured by settings.OTP_STORE"""
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = get_otp_store_settings()
+                backend_class = import_string(options['BACKEND'])
+                backend = backend_class(
+                    max_keys=options['MAX_KEYS'],
+                    cache_alias=options['CACHE_ALIAS'],
+                )
+                _store = OTPStore(backend, options['TTL'], options['MAX_ATTEMPTS'])
+    return _store
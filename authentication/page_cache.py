@@ -0,0 +1,186 @@
+# authentication/page_cache.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from pathlib import Path
+from django.conf import settings
+from django.http import HttpResponse
+from django.template import engines
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+DEFAULT_PAGE_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 500,
+    'VERSION': None,  # defaults to a hash of every template file
+}
+
+
+def get_page_cache_settings():
+    """Merge PAGE_CACHE from settings over the defaults"""
+    options = dict(DEFAULT_PAGE_CACHE)
+    options.update(getattr(settings, 'PAGE_CACHE', {}))
+    return options
+
+# ============================
+# TEMPLATE VERSION
+# ============================
+
+_template_version = None
+_template_version_lock = threading.Lock()
+
+
+def _template_files():
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            directory = Path(directory)
+            if directory.is_dir():
+                yield from (p for p in directory.rglob('*.html') if p.is_file())
+
+
+def get_template_version():
+    """
+    Return (version, last_modified) for the templates on disk.
+    Computed once per process; a deploy restarts the workers, so cached
+    pages from a previous release can never be served.
+    """
+    global _template_version
+
+    if _template_version is None:
+        with _template_version_lock:
+            if _template_version is None:
+                digest = hashlib.sha1()
+                last_modified = 0
+                for path in sorted(_template_files()):
+                    stat = path.stat()
+                    digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+                    last_modified = max(last_modified, stat.st_mtime)
+
+                version = get_page_cache_settings()['VERSION'] or digest.hexdigest()[:12]
+                _template_version = (version, int(last_modified))
+    return _template_version
+
+# ============================
+# CACHE
+# ============================
+
+class CachedPage:
+    """Rendered body and validators for one page variant"""
+
+    def __init__(self, content, content_type, last_modified):
+        self.content = content
+        self.content_type = content_type
+        self.etag = f'"{hashlib.md5(content).hexdigest()}"'
+        self.last_modified = last_modified
+
+
+class PageCache:
+    """Per-process LRU of rendered pages"""
+
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            page = self._data.get(key)
+            if page is not None:
+                self._data.move_to_end(key)
+            return page
+
+    def set(self, key, page):
+        with self._lock:
+            self._data[key] = page
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+page_cache = PageCache(get_page_cache_settings()['MAX_ENTRIES'])
+
+
+def _variant(request):
+    """'anon' for anonymous visitors, otherwise one variant per user"""
+    # No session cookie means no user, without loading the session at all
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return 'anon'
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return 'anon'
+
+
+def _is_cacheable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # The page asked for a CSRF token, so its HTML is per visitor
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _finish(request, response, variant):
+    patch_vary_headers(response, ('Cookie',))
+    if variant == 'anon':
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    else:
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
+
+
+def cached_page(view_func):
+    """
+    Cache the full response of a view that only renders a fixed template.
+
+    Anonymous visitors share one entry per path; logged-in users get
+    their own. Requests with a query string are rendered uncached: these
+    pages ignore it, and every distinct one would otherwise take an entry. Responses carry ETag and Last-Modified, and conditional
+    GETs are answered with 304 without rendering. Entries are keyed by
+    the template version, so a deploy invalidates them.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        options = get_page_cache_settings()
+        if (
+            not options['ENABLED']
+            or settings.DEBUG
+            or request.method not in ('GET', 'HEAD')
+            or request.META.get('QUERY_STRING')
+        ):
+            return view_func(request, *args, **kwargs)
+
+        version, last_modified = get_template_version()
+        variant = _variant(request)
+        key = (version, request.path, variant)
+
+        page = page_cache.get(key)
+        if page is None:
+            response = view_func(request, *args, **kwargs)
+            if not _is_cacheable(request, response):
+                return response
+
+            page = CachedPage(response.content, response['Content-Type'], last_modified)
+            page_cache.set(key, page)
+
+        response = HttpResponse(page.content, content_type=page.content_type)
+        response['ETag'] = page.etag
+        response['Last-Modified'] = http_date(page.last_modified)
+
+        response = get_conditional_response(
+            request,
+            etag=page.etag,
+            last_modified=page.last_modified,
+            response=response,
+        )
+        return _finish(request, response, variant)
+
+    return wrapper
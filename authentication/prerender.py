@@ -0,0 +1,109 @@
+# authentication/prerender.py
+
+import json
+import logging
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+logger = logging.getLogger(__name__)
+
+
+def get_prerender_root():
+    """Directory written by `manage.py prerender_pages`, next to STATIC_ROOT"""
+    return Path(getattr(settings, 'PRERENDER_ROOT', Path(settings.STATIC_ROOT).parent / 'prerendered'))
+
+
+class PrerenderedPage:
+    """One prerendered page with its encoded variants loaded in memory"""
+
+    def __init__(self, root, entry):
+        self.content_type = entry['content_type']
+        self.etag = entry['etag']
+        self.variants = {
+            encoding: (root / relative).read_bytes()
+            for encoding, relative in entry['files'].items()
+        }
+
+    def pick(self, accept_encoding):
+        """Return (encoding, body) preferring brotli, then gzip"""
+        accepted = {e.split(';')[0].strip() for e in accept_encoding.split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.variants:
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+
+class PrerenderedPageMiddleware:
+    """
+    Serve prerendered footer pages to anonymous visitors.
+
+    Must sit above SessionMiddleware: a GET without a session cookie is
+    answered from memory without loading the session, resolving a view
+    or touching the template engine. Everyone else falls through to the
+    normal view (which is still covered by the page cache).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pages = {} if settings.DEBUG else self._load()
+
+        # Under ASGI stay async, so no request pays for a thread hop here
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _load(self):
+        root = get_prerender_root()
+        manifest_path = root / 'manifest.json'
+        if not manifest_path.exists():
+            return {}
+
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            return {path: PrerenderedPage(root, entry) for path, entry in manifest.items()}
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Ignoring prerendered pages: {str(e)}")
+            return {}
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self._serve(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self._serve(request)
+        return response if response is not None else await self.get_response(request)
+
+    def _serve(self, request):
+        """The prerendered response for this request, or None to fall through"""
+        page = self.pages.get(request.path_info)
+        if (
+            page is None
+            or request.method not in ('GET', 'HEAD')
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return None
+
+        if page.etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            encoding, body = page.pick(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            response = HttpResponse(body, content_type=page.content_type)
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = page.etag
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        # XFrameOptionsMiddleware is further down the stack and won't run
+        response['X-Frame-Options'] = getattr(settings, 'X_FRAME_OPTIONS', 'DENY')
+        patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+        return response
@@ -0,0 +1,253 @@
+# authentication/ratelimit.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from .client_ip import get_client_ip_resolver
+
+
+DEFAULT_RATE_LIMIT = {
+    'BACKEND': 'authentication.ratelimit.LocalMemoryBackend',
+    'LIMIT': 5,
+    'WINDOW_MINUTES': 15,
+    'MAX_KEYS': 10000,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_rate_limit_settings():
+    """Merge RATE_LIMIT from settings over the defaults"""
+    options = dict(DEFAULT_RATE_LIMIT)
+    options.update(getattr(settings, 'RATE_LIMIT', {}))
+    return options
+
+# ============================
+# BACKENDS
+# ============================
+
+class BaseRateLimitBackend:
+    """
+    Storage for fixed-window counters.
+    A counter is addressed by (key, bucket) where bucket is the window index.
+    The async methods default to the sync ones, which suits backends that
+    never block.
+    """
+
+    def __init__(self, max_keys=10000, **options):
+        self.max_keys = max_keys
+
+    def incr(self, key, bucket, timeout):
+        """Increment the counter for key in bucket and return the new value"""
+        raise NotImplementedError
+
+    def get_counts(self, key, buckets):
+        """Return {bucket: count} for the requested buckets"""
+        raise NotImplementedError
+
+    def reset(self, key, buckets):
+        """Forget the counters stored for key"""
+        raise NotImplementedError
+
+    async def aincr(self, key, bucket, timeout):
+        return self.incr(key, bucket, timeout)
+
+    async def aget_counts(self, key, buckets):
+        return self.get_counts(key, buckets)
+
+    async def areset(self, key, buckets):
+        self.reset(key, buckets)
+
+
+class LocalMemoryBackend(BaseRateLimitBackend):
+    """
+    In-process counters.
+    Keeps at most max_keys keys, evicting the least recently used one.
+    """
+
+    def __init__(self, max_keys=10000, **options):
+        super().__init__(max_keys=max_keys, **options)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def incr(self, key, bucket, timeout):
+        with self._lock:
+            buckets = self._data.pop(key, None) or {}
+
+            # Only the current and previous windows are ever read
+            for old in [b for b in buckets if b < bucket - 1]:
+                del buckets[old]
+
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+            self._data[key] = buckets
+
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+
+            return buckets[bucket]
+
+    def get_counts(self, key, buckets):
+        with self._lock:
+            stored = self._data.get(key)
+            if stored is None:
+                return {}
+            self._data.move_to_end(key)
+            return {b: stored[b] for b in buckets if b in stored}
+
+    def reset(self, key, buckets):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class CacheBackend(BaseRateLimitBackend):
+    """
+    Counters shared between processes through a Django cache.
+    Every counter expires after two windows; the cache's own MAX_ENTRIES
+    and culling keep memory bounded.
+    """
+
+    def __init__(self, max_keys=10000, cache_alias='default', **options):
+        super().__init__(max_keys=max_keys, **options)
+        self.cache = caches[cache_alias]
+
+    def _make_key(self, key, bucket):
+        # Hash so arbitrary usernames/emails are valid memcached keys
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return f"ratelimit:{digest}:{bucket}"
+
+    def incr(self, key, bucket, timeout):
+        cache_key = self._make_key(key, bucket)
+        self.cache.add(cache_key, 0, timeout)
+        try:
+            return self.cache.incr(cache_key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(cache_key, 1, timeout)
+            return 1
+
+    def get_counts(self, key, buckets):
+        keys = {self._make_key(key, b): b for b in buckets}
+        found = self.cache.get_many(list(keys))
+        return {keys[k]: v for k, v in found.items()}
+
+    def reset(self, key, buckets):
+        self.cache.delete_many([self._make_key(key, b) for b in buckets])
+
+    async def aincr(self, key, bucket, timeout):
+        cache_key = self._make_key(key, bucket)
+        await self.cache.aadd(cache_key, 0, timeout)
+        try:
+            return await self.cache.aincr(cache_key)
+        except ValueError:
+            await self.cache.aset(cache_key, 1, timeout)
+            return 1
+
+    async def aget_counts(self, key, buckets):
+        keys = {self._make_key(key, b): b for b in buckets}
+        found = await self.cache.aget_many(list(keys))
+        return {keys[k]: v for k, v in found.items()}
+
+    async def areset(self, key, buckets):
+        await self.cache.adelete_many([self._make_key(key, b) for b in buckets])
+
+# ============================
+# SLIDING WINDOW LIMITER
+# ============================
+
+class SlidingWindowRateLimiter:
+    """
+    Approximate sliding-window counter.
+    The previous window's count is weighted by how much of it still
+    overlaps the sliding window, so only two counters are kept per key.
+    """
+
+    def __init__(self, backend, limit=5, window_seconds=900):
+        self.backend = backend
+        self.limit = limit
+        self.window_seconds = window_seconds
+
+    def _bucket(self, now):
+        return int(now // self.window_seconds)
+
+    def hit(self, key, now=None):
+        """Record one event for key"""
+        now = time.time() if now is None else now
+        self.backend.incr(key, self._bucket(now), self.window_seconds * 2)
+
+    def count(self, key, now=None):
+        """Return the weighted number of events for key in the sliding window"""
+        now = time.time() if now is None else now
+        bucket = self._bucket(now)
+        return self._weigh(self.backend.get_counts(key, [bucket - 1, bucket]), bucket, now)
+
+    def _weigh(self, counts, bucket, now):
+        elapsed = (now % self.window_seconds) / self.window_seconds
+        weighted = counts.get(bucket, 0) + counts.get(bucket - 1, 0) * (1 - elapsed)
+        return int(weighted)
+
+    def is_limited(self, key, now=None):
+        """Check if key has reached the limit"""
+        return self.count(key, now) >= self.limit
+
+    def reset(self, key, now=None):
+        """Clear the counters for key"""
+        now = time.time() if now is None else now
+        bucket = self._bucket(now)
+        self.backend.reset(key, [bucket - 1, bucket])
+
+    async def ahit(self, key, now=None):
+        """Async hit(); the event loop never waits on a shared cache"""
+        now = time.time() if now is None else now
+        await self.backend.aincr(key, self._bucket(now), self.window_seconds * 2)
+
+    async def acount(self, key, now=None):
+        """Async count()"""
+        now = time.time() if now is None else now
+        bucket = self._bucket(now)
+        return self._weigh(await self.backend.aget_counts(key, [bucket - 1, bucket]), bucket, now)
+
+    async def ais_limited(self, key, now=None):
+        return await self.acount(key, now) >= self.limit
+
+    async def areset(self, key, now=None):
+        now = time.time() if now is None else now
+        bucket = self._bucket(now)
+        await self.backend.areset(key, [bucket - 1, bucket])
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(window_minutes=None, limit=None):
+    """Return the shared limiter configured by settings.RATE_LIMIT"""
+    options = get_rate_limit_settings()
+    window_minutes = options['WINDOW_MINUTES'] if window_minutes is None else window_minutes
+    limit = options['LIMIT'] if limit is None else limit
+
+    cache_key = (options['BACKEND'], window_minutes, limit)
+    limiter = _limiters.get(cache_key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(cache_key)
+            if limiter is None:
+                backend_class = import_string(options['BACKEND'])
+                backend = backend_class(
+                    max_keys=options['MAX_KEYS'],
+                    cache_alias=options['CACHE_ALIAS'],
+                )
+                limiter = SlidingWindowRateLimiter(backend, limit, window_minutes * 60)
+                _limiters[cache_key] = limiter
+    return limiter
+
+
+def ip_key(ip_address):
+    # IPv6 clients share one bucket per /64
+    return f"ip:{get_client_ip_resolver().rate_limit_key(ip_address)}"
+
+
+def identity_key(username_or_email):
+    return f"user:{(username_or_email or '').lower()}"
@@ -0,0 +1,347 @@
+# authentication/session_activity.py
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .shutdown import register_shutdown_hook
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SESSION_ACTIVITY = {
+    'ENABLED': True,  # off: create_user_session writes user_sessions directly
+    'TRACK_REQUESTS': True,  # record last-seen from SessionActivityMiddleware
+    'FLUSH_INTERVAL': 30.0,  # seconds between batched writes
+    'MIN_TOUCH_INTERVAL': 60.0,  # seconds; one activity record per session per interval
+    'MAX_BUFFER': 10000,  # sessions buffered; further activity is dropped until a flush
+}
+
+
+def get_session_activity_settings():
+    """Merge SESSION_ACTIVITY from settings over the defaults"""
+    options = dict(DEFAULT_SESSION_ACTIVITY)
+    options.update(getattr(settings, 'SESSION_ACTIVITY', {}))
+    return options
+
+
+# Columns refreshed when a buffered login meets an existing row, and when
+# a buffered request does (activity never reactivates a retired session)
+START_FIELDS = ['user', 'ip_address', 'user_agent', 'device_type', 'last_activity', 'is_active']
+TOUCH_FIELDS = ['ip_address', 'last_activity']
+
+
+class SessionActivityTracker:
+    """
+    Write-behind buffer for UserSession rows.
+
+    Logins, logouts and per-request activity only update an in-memory
+    record per session key. A background thread turns the buffer into
+    one upsert for new logins, one for activity and one UPDATE retiring
+    older sessions, every FLUSH_INTERVAL seconds. Repeated activity on a
+    session between flushes costs nothing but a dict lookup.
+
+    The buffer is bounded: once MAX_BUFFER sessions are waiting, activity
+    for further sessions is dropped (last-seen is best effort) while
+    logins and logouts are always kept. Anything still buffered when the
+    process exits is written by the shutdown hook.
+
+    With autostart=False no thread is started and nothing is written
+    until flush() or shutdown() is called, which tests rely on.
+    """
+
+    def __init__(self, flush_interval=30.0, min_touch_interval=60.0, max_buffer=10000, autostart=True):
+        self.flush_interval = flush_interval
+        self.min_touch_interval = min_touch_interval
+        self.max_buffer = max_buffer
+        self.autostart = autostart
+
+        self._records = {}  # session_key -> pending row values
+        self._retire = {}  # user_id -> session key to keep active (None: retire all)
+        self._touched = OrderedDict()  # session_key -> monotonic time of the last record
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._records = {}
+        self._retire = {}
+        self._touched.clear()
+        self._stopping.clear()
+        self._thread = None
+        if self.autostart:
+            self._thread = threading.Thread(target=self._run, name='session-activity', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    # ----------------------------
+    # Recording
+    # ----------------------------
+
+    def start(self, session_key, user_id, ip_address, user_agent, device_type):
+        """Record a login; the user's other sessions are retired at the next flush"""
+        user_id = str(user_id)  # the session stores it as a string
+        now = timezone.now()
+        with self._lock:
+            self._ensure_started()
+            self._records[session_key] = {
+                'start': True,
+                'user_id': user_id,
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                'device_type': device_type,
+                'last_activity': now,
+                'is_active': True,
+            }
+            previous = self._retire.get(user_id)
+            if previous and previous in self._records:
+                # Two logins between flushes: only the latest stays active
+                self._records[previous]['is_active'] = False
+            self._retire[user_id] = session_key
+            self._mark_touched(session_key, time.monotonic())
+
+    def end(self, user_id):
+        """Record a logout; every active session of the user is retired"""
+        user_id = str(user_id)
+        with self._lock:
+            self._ensure_started()
+            kept = self._retire.get(user_id)
+            if kept and kept in self._records:
+                self._records[kept]['is_active'] = False
+            self._retire[user_id] = None
+
+    def is_due(self, session_key):
+        """False if activity for session_key was recorded within MIN_TOUCH_INTERVAL"""
+        last = self._touched.get(session_key)
+        return last is None or time.monotonic() - last >= self.min_touch_interval
+
+    def touch(self, session_key, user_id, ip_address, user_agent, device_type):
+        """Record activity on a session; at most once per MIN_TOUCH_INTERVAL"""
+        now = time.monotonic()
+        with self._lock:
+            if not self.is_due(session_key):
+                return
+
+            record = self._records.get(session_key)
+            if record is None:
+                if len(self._records) >= self.max_buffer:
+                    self._dropped += 1
+                    self._wakeup.set()
+                    return
+                self._ensure_started()
+                record = self._records[session_key] = {
+                    'start': False,
+                    'user_id': user_id,
+                    'user_agent': user_agent,
+                    'device_type': device_type,
+                    'is_active': True,
+                }
+            record['ip_address'] = ip_address
+            record['last_activity'] = timezone.now()
+            self._mark_touched(session_key, now)
+
+    def _mark_touched(self, session_key, now):
+        self._touched[session_key] = now
+        self._touched.move_to_end(session_key)
+        while len(self._touched) > self.max_buffer:
+            self._touched.popitem(last=False)
+
+    # ----------------------------
+    # Writing
+    # ----------------------------
+
+    def flush(self):
+        """Write everything buffered so far; returns False if the write failed"""
+        with self._flush_lock:
+            with self._lock:
+                if not (self._records or self._retire):
+                    return True
+                records, self._records = self._records, {}
+                retire, self._retire = self._retire, {}
+                dropped, self._dropped = self._dropped, 0
+
+            if dropped:
+                logger.warning(f"Session activity buffer full; dropped {dropped} activity records")
+
+            if self._write(records, retire):
+                return True
+
+            self._requeue(records, retire)
+            return False
+
+    def _write(self, records, retire):
+        from django.db import close_old_connections, transaction
+        from .models import UserSession
+
+        starts = [UserSession(session_key=key, **_row(r)) for key, r in records.items() if r['start']]
+        touches = [UserSession(session_key=key, **_row(r)) for key, r in records.items() if not r['start']]
+
+        logout_users = [user_id for user_id, kept in retire.items() if kept is None]
+        login_users = [user_id for user_id, kept in retire.items() if kept is not None]
+        kept_keys = [kept for kept in retire.values() if kept is not None]
+
+        try:
+            with transaction.atomic():
+                if starts:
+                    UserSession.objects.bulk_create(
+                        starts,
+                        update_conflicts=True,
+                        unique_fields=['session_key'],
+                        update_fields=START_FIELDS,
+                    )
+                if touches:
+                    UserSession.objects.bulk_create(
+                        touches,
+                        update_conflicts=True,
+                        unique_fields=['session_key'],
+                        update_fields=TOUCH_FIELDS,
+                    )
+                if retire:
+                    UserSession.objects.filter(is_active=True).filter(
+                        Q(user_id__in=logout_users)
+                        | (Q(user_id__in=login_users) & ~Q(session_key__in=kept_keys))
+                    ).update(is_active=False)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {len(records)} session activity records: {str(e)}")
+            return False
+        finally:
+            # Running outside the request cycle, so nothing else closes it
+            close_old_connections()
+
+    def _requeue(self, records, retire):
+        """Put a failed batch back, letting anything recorded since win"""
+        with self._lock:
+            for key, record in records.items():
+                if key in self._records:
+                    continue
+                if not record['start'] and len(self._records) >= self.max_buffer:
+                    self._dropped += 1
+                    continue
+                self._records[key] = record
+            for user_id, kept in retire.items():
+                self._retire.setdefault(user_id, kept)
+
+    def shutdown(self, timeout=10):
+        """Stop the worker and write what is left"""
+        if self._pid != os.getpid():
+            return
+
+        if self._thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join(timeout)
+        self.flush()
+        self._thread = None
+        self._pid = None
+
+
+def _row(record):
+    return {
+        'user_id': record['user_id'],
+        'ip_address': record['ip_address'],
+        'user_agent': record['user_agent'],
+        'device_type': record['device_type'],
+        'last_activity': record['last_activity'],
+        'is_active': record['is_active'],
+    }
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_session_activity_tracker():
+    """Return the process-wide SessionActivityTracker"""
+    global _tracker
+
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                options = get_session_activity_settings()
+                _tracker = SessionActivityTracker(
+                    flush_interval=options['FLUSH_INTERVAL'],
+                    min_touch_interval=options['MIN_TOUCH_INTERVAL'],
+                    max_buffer=options['MAX_BUFFER'],
+                )
+                register_shutdown_hook(_tracker.shutdown)
+    return _tracker
+
+# ============================
+# MIDDLEWARE
+# ============================
+
+class SessionActivityMiddleware:
+    """
+    Record last-seen time, IP and device for logged-in requests.
+    Only requests that already loaded the session are tracked, so pages
+    that never touch the session or the user gain no session query.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = get_session_activity_settings()
+        self.enabled = options['ENABLED'] and options['TRACK_REQUESTS']
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        self._record(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self._record(request)
+        return response
+
+    def _record(self, request):
+        from django.contrib.auth import SESSION_KEY
+        from .utils import detect_device_type, get_client_ip, get_user_agent
+
+        session = getattr(request, 'session', None)
+        if not self.enabled or session is None or not session.accessed:
+            return
+
+        # Reads the already loaded session data; no query
+        user_id = session.get(SESSION_KEY)
+        if not user_id or not session.session_key:
+            return
+
+        tracker = get_session_activity_tracker()
+        if not tracker.is_due(session.session_key):
+            return
+
+        tracker.touch(
+            session.session_key,
+            user_id,
+            get_client_ip(request),
+            get_user_agent(request),
+            detect_device_type(request),
+        )
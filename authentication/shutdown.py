@@ -0,0 +1,41 @@
+# authentication/shutdown.py
+
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_hooks = []
+_lock = threading.Lock()
+_installed = False
+
+
+def register_shutdown_hook(func):
+    """
+    Run func when the server process shuts down.
+    Hooks run once, in reverse order of registration, either from the
+    ASGI lifespan shutdown event or from atexit under WSGI servers.
+    """
+    global _installed
+
+    with _lock:
+        if func not in _hooks:
+            _hooks.append(func)
+        if not _installed:
+            atexit.register(run_shutdown_hooks)
+            _installed = True
+    return func
+
+
+def run_shutdown_hooks():
+    """Run and clear every registered hook"""
+    with _lock:
+        hooks = list(reversed(_hooks))
+        _hooks.clear()
+
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.error(f"Shutdown hook {hook.__qualname__} failed: {str(e)}")
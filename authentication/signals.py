@@ -1,8 +1,12 @@
 # authentication/signals.py
 
-from django.db.models.signals import post_save
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from .models import User, UserProfile
+from .identity import forget_identity
+from .availability import forget_availability, get_taken_identifiers
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -11,7 +15,49 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save UserProfile when User is saved"""
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+def save_user_profile(sender, instance, created, **kwargs):
+    """
+    Save UserProfile along with User, but only a profile that was loaded
+    and changed; hasattr(instance, 'profile') would SELECT it every time
+    """
+    related = User.profile.related
+    if created or not related.is_cached(instance):
+        return
+
+    profile = related.get_cached_value(instance)
+    if profile is not None and profile.get_dirty_fields():
+        profile.save()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_identity_cache(sender, instance, **kwargs):
+    """Forget cached lookups for this user's username and email"""
+    forget_identity(instance)
+
+@receiver(post_save, sender=User)
+def mark_identifiers_taken(sender, instance, update_fields=None, **kwargs):
+    """Add the username and email to the availability filter and its shared cache"""
+    if update_fields is not None and not {'username', 'email'} & set(update_fields):
+        # e.g. last_login; nothing the filter tracks changed
+        return
+    get_taken_identifiers().add_user(instance)
+    forget_availability(instance)
+
+# Replaces django.contrib.auth's update_last_login, which saves last_login
+# alone; ours also writes what the login flow changed on the user
+user_logged_in.disconnect(dispatch_uid='update_last_login')
+
+@receiver(user_logged_in, dispatch_uid='update_last_login')
+def update_last_login(sender, user, **kwargs):
+    """
+    Save last_login in one UPDATE with anything else the login flow
+    changed on the user, such as an upgraded password hash or otp_verified
+    """
+    user.last_login = timezone.now()
+    dirty = user.get_dirty_fields() if isinstance(user, User) else None
+
+    fields = set(dirty or ()) | {'last_login'}
+    if len(fields) > 1:
+        # A real change, unlike last_login alone
+        fields.add('updated_at')
+    user.save(update_fields=sorted(fields))
@@ -238,6 +238,88 @@ function initAuthPage() {
     };
     
     
+    // ========================================
+    // LIVE AVAILABILITY CHECK
+    // ========================================
+    
+    const availabilityUrl = signupForm ? signupForm.dataset.availabilityUrl : null;
+    const availabilityTimers = {};
+    // Only "taken" answers are kept, like the endpoint; a free name can be claimed any moment
+    const takenResults = {};
+    // Last answer per field: { value, status: 'pending' | 'taken' | 'available' | 'unknown', message }
+    const availabilityState = {};
+    let submitWhenChecked = false;
+    
+    const normalizedValue = (input) => input.value.trim().toLowerCase();
+    
+    // Message to show if the current value is known to be taken
+    const takenMessage = (input, field) => {
+        const state = availabilityState[field];
+        if (state && state.status === 'taken' && state.value === normalizedValue(input)) {
+            return state.message;
+        }
+        return null;
+    };
+    
+    const isChecking = (input, field) => {
+        const state = availabilityState[field];
+        return Boolean(state && state.status === 'pending' && state.value === normalizedValue(input));
+    };
+    
+    const checkAvailability = (input, field) => {
+        if (!availabilityUrl || !input) return;
+        
+        const value = normalizedValue(input);
+        clearTimeout(availabilityTimers[field]);
+        
+        const apply = (status, message) => {
+            // Ignore answers for a value the user has already changed
+            if (normalizedValue(input) !== value) return;
+            
+            availabilityState[field] = { value, status, message };
+            if (status === 'taken') {
+                setError(input, message);
+            } else if (status === 'available') {
+                setSuccess(input);
+            }
+            
+            if (submitWhenChecked && !isChecking(signupUsername, 'username') && !isChecking(signupEmail, 'email')) {
+                submitWhenChecked = false;
+                signupForm.requestSubmit();
+            }
+        };
+        
+        const cacheKey = `${field}:${value}`;
+        if (takenResults[cacheKey]) {
+            apply('taken', takenResults[cacheKey]);
+            return;
+        }
+        
+        availabilityState[field] = { value, status: 'pending', message: null };
+        
+        // Debounced: one request once typing pauses
+        availabilityTimers[field] = setTimeout(() => {
+            fetch(`${availabilityUrl}?${field}=${encodeURIComponent(value)}`, {
+                headers: { 'Accept': 'application/json' },
+                credentials: 'omit',
+            })
+                .then(response => (response.status === 429 ? null : response.json()))
+                .then(result => {
+                    if (!result || result.value === undefined) {
+                        // Rate limited or rejected: the server still validates on submit
+                        apply('unknown', null);
+                    } else if (result.available) {
+                        apply('available', null);
+                    } else {
+                        takenResults[cacheKey] = result.message;
+                        apply('taken', result.message);
+                    }
+                })
+                .catch(() => apply('unknown', null));
+        }, 400);
+    };
+    
+    
     // ========================================
     // LOGIN FORM VALIDATION
     // ========================================
@@ -343,6 +425,12 @@ function initAuthPage() {
             return false;
         }
         
+        const taken = takenMessage(signupUsername, 'username');
+        if (taken) {
+            setError(signupUsername, taken);
+            return false;
+        }
+        
         setSuccess(signupUsername);
         return true;
     };
@@ -362,6 +450,12 @@ function initAuthPage() {
             return false;
         }
         
+        const taken = takenMessage(signupEmail, 'email');
+        if (taken) {
+            setError(signupEmail, taken);
+            return false;
+        }
+        
         setSuccess(signupEmail);
         return true;
     };
@@ -433,7 +527,9 @@ function initAuthPage() {
         if (signupUsername) {
             signupUsername.addEventListener('blur', validateSignupUsername);
             signupUsername.addEventListener('input', () => {
-                validateSignupUsername();
+                if (validateSignupUsername()) {
+                    checkAvailability(signupUsername, 'username');
+                }
                 clearServerMessages();
             });
         }
@@ -441,7 +537,9 @@ function initAuthPage() {
         if (signupEmail) {
             signupEmail.addEventListener('blur', validateSignupEmail);
             signupEmail.addEventListener('input', () => {
-                validateSignupEmail();
+                if (validateSignupEmail()) {
+                    checkAvailability(signupEmail, 'email');
+                }
                 clearServerMessages();
             });
         }
@@ -472,6 +570,12 @@ function initAuthPage() {
             const isTermsValid = validateTerms();
             
             if (isUsernameValid && isEmailValid && isPasswordValid && isConfirmPasswordValid && isTermsValid) {
+                // Don't start the expensive POST until pending availability checks answer
+                if (isChecking(signupUsername, 'username') || isChecking(signupEmail, 'email')) {
+                    submitWhenChecked = true;
+                    return;
+                }
+                
                 const submitBtn = signupForm.querySelector('button[type="submit"]');
                 submitBtn.disabled = true;
                 submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Creating Account...';
@@ -0,0 +1,57 @@
+# authentication/templatetags/asset_bundles.py
+
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from authentication.assets import get_bundle_manifest
+
+register = template.Library()
+
+
+class BundleNode(template.Node):
+    def __init__(self, kind, nodelist):
+        self.kind = kind
+        self.nodelist = nodelist
+
+    def render(self, context):
+        bundle = None
+        if not settings.DEBUG and context.template is not None:
+            bundle = get_bundle_manifest().get(context.template.name)
+
+        # No build for this page yet: emit the individual tags as written
+        if not bundle or not bundle.get(self.kind):
+            return self.nodelist.render(context)
+
+        url = static(bundle[self.kind])
+
+        if self.kind == 'js':
+            return format_html('<script src="{}" defer></script>', url)
+
+        return format_html(
+            '<style>{}</style>'
+            '<link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+            '<noscript><link rel="stylesheet" href="{}"></noscript>',
+            mark_safe(bundle.get('critical', '')),
+            url,
+            url,
+        )
+
+
+@register.tag
+def bundle(parser, token):
+    """
+    {% bundle 'css' %}<link ...>{% endbundle %}
+
+    Replaced by the page's inlined critical CSS and hashed bundle (or the
+    hashed JS bundle) once `manage.py build_assets` has run; otherwise
+    renders its contents unchanged.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2 or bits[1].strip('\'"') not in ('css', 'js'):
+        raise template.TemplateSyntaxError("{% bundle %} takes 'css' or 'js'")
+
+    nodelist = parser.parse(('endbundle',))
+    parser.delete_first_token()
+    return BundleNode(bits[1].strip('\'"'), nodelist)
@@ -1,3 +1,1478 @@
-from django.test import TestCase
+import json
+import os
+import smtplib
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.core.mail import EmailMessage
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import async_views, availability, email_rendering, views
+from . import urls as auth_urls
+from .audit import LoginAttemptWriter
+from .availability import (
+    BloomFilter, ResultCache, TakenIdentifiers, get_availability_filter_settings, normalize_identifier
+)
+from .client_ip import ClientIPResolver
+from .db_router import ReplicaPinningMiddleware, ReplicaRouter, replica_reads
+from .email_rendering import get_email_render_stats, render_email, render_stats
+from .forms import SignupForm
+from . import hashing
+from .hashing import HashingOverloaded, PasswordHashingPool, apply_pending_rehash, check_user_password
+from .identity import resolve_user
+from .mail_backends import PooledSMTPBackend, asend_message
+from .mail_queue import MailSender, get_email_queue_settings, purge_old_emails, requeue_stale_claims
+from .models import LoginAttempt, OutboundEmail, User, UserProfile, UserSession
+from .otp_store import OTP_EXPIRED, OTP_INVALID, OTP_LOCKED, OTP_VALID, LocalMemoryBackend, OTPStore, get_otp_store
+from .otp_store import CacheBackend as OTPCacheBackend
+from .page_cache import page_cache
+from .ratelimit import CacheBackend as RateLimitCacheBackend
+from .ratelimit import LocalMemoryBackend as RateLimitMemoryBackend
+from .ratelimit import SlidingWindowRateLimiter, identity_key, ip_key
+from .session_activity import SessionActivityTracker
+from .shutdown import register_shutdown_hook, run_shutdown_hooks
+from .user_agents import parse_user_agent
+from .utils import (
+    check_rate_limit, generate_otp, hash_otp, issue_otp, load_otp_challenge, record_failed_login, verify_otp
+)
+
+
+class DirtyFieldSaveTests(TestCase):
+    """User.save() writes only changed columns and leaves the profile alone"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='builder', email='builder@example.com', is_verified=True)
+
+    def test_unchanged_user_save_runs_no_query(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            user.save()
+
+    def test_changed_fields_are_one_narrow_update(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.display_name = 'Builder'
+        user.last_login = timezone.now()
+
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertTrue(sql.startswith('UPDATE'))
+        self.assertIn('"display_name"', sql)
+        self.assertIn('"updated_at"', sql)
+        self.assertNotIn('"email"', sql)
+        self.assertNotIn('"bio"', sql)
+
+    def test_user_save_does_not_load_or_save_profile(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.otp_verified = True
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_loaded_but_unchanged_profile_is_not_saved(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        user.otp_verified = True
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_changed_profile_is_saved_with_user(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        user.otp_verified = True
+        user.profile.theme = 'light'
+        with self.assertNumQueries(2):
+            user.save()
+
+        self.assertEqual(UserProfile.objects.get(user=self.user).theme, 'light')
+
+    def test_second_save_after_write_is_free(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.display_name = 'Builder'
+        user.save()
+        with self.assertNumQueries(0):
+            user.save()
+
+    def test_new_user_still_gets_a_profile(self):
+        user = User.objects.create(username='newcomer', email='newcomer@example.com')
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+
+    def test_explicit_update_fields_are_respected(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.bio = 'not saved'
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+
+        self.assertIsNone(User.objects.get(pk=self.user.pk).bio)
+        # bio is still pending and goes out with the next plain save
+        self.assertEqual(user.get_dirty_fields(), ['bio'])
+
+
+class OTPStoreTests(SimpleTestCase):
+    """Pending codes expire, are single-use and allow a bounded number of guesses"""
+
+    def setUp(self):
+        self.store = OTPStore(LocalMemoryBackend(), ttl=600, max_attempts=3)
+
+    def test_correct_code_is_valid_once(self):
+        self.store.issue(1, 'right')
+        self.assertEqual(self.store.check(1, 'right'), OTP_VALID)
+        self.assertEqual(self.store.check(1, 'right'), OTP_EXPIRED)
+
+    def test_wrong_code_is_invalid(self):
+        self.store.issue(1, 'right')
+        self.assertEqual(self.store.check(1, 'wrong'), OTP_INVALID)
+        self.assertEqual(self.store.check(1, 'right'), OTP_VALID)
+
+    def test_code_expires(self):
+        store = OTPStore(LocalMemoryBackend(), ttl=-1, max_attempts=3)
+        store.issue(1, 'right')
+        self.assertEqual(store.check(1, 'right'), OTP_EXPIRED)
+
+    def test_too_many_attempts_discard_the_code(self):
+        self.store.issue(1, 'right')
+        for _ in range(3):
+            self.assertEqual(self.store.check(1, 'wrong'), OTP_INVALID)
+        self.assertEqual(self.store.check(1, 'right'), OTP_LOCKED)
+        self.assertEqual(self.store.check(1, 'right'), OTP_LOCKED)
+
+    def test_reissue_keeps_attempts(self):
+        self.store.issue(1, 'first')
+        for _ in range(3):
+            self.store.check(1, 'wrong')
+        self.store.issue(1, 'second')
+        self.assertEqual(self.store.check(1, 'second'), OTP_LOCKED)
+
+    def test_reissue_keeps_attempts_in_the_cache(self):
+        cache.clear()
+        store = OTPStore(OTPCacheBackend(cache_alias='default'), ttl=600, max_attempts=3)
+        store.issue(1, 'first')
+        self.assertEqual(store.check(1, 'wrong'), OTP_INVALID)
+        store.issue(1, 'second')
+        self.assertEqual(store.check(1, 'second'), OTP_VALID)
+
+        store.issue(1, 'third')
+        for _ in range(3):
+            store.check(1, 'wrong')
+        store.issue(1, 'fourth')
+        self.assertEqual(store.check(1, 'fourth'), OTP_LOCKED)
+
+    def test_users_are_independent(self):
+        self.store.issue(1, 'one')
+        self.store.issue(2, 'two')
+        self.assertEqual(self.store.check(1, 'two'), OTP_INVALID)
+        self.assertEqual(self.store.check(2, 'two'), OTP_VALID)
+
+
+class OTPEngineTests(TestCase):
+    """Codes are random digits, HMACed per user, and checked without touching the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='otp_user', email='otp_user@example.com', is_verified=True)
+
+    def tearDown(self):
+        get_otp_store().discard(self.user.pk)
+
+    def test_generated_codes_are_six_digits(self):
+        for _ in range(100):
+            otp = generate_otp()
+            self.assertEqual(len(otp), 6)
+            self.assertTrue(otp.isdigit())
+
+    def test_hash_is_keyed_per_user(self):
+        self.assertNotEqual(hash_otp(1, '123456'), hash_otp(2, '123456'))
+        self.assertEqual(hash_otp(1, '123456'), hash_otp('1', '123456'))
+
+    def _wrong(self, otp):
+        return '000000' if otp != '000000' else '111111'
+
+    def test_verify_runs_no_query(self):
+        otp, token = issue_otp(self.user)
+        challenge = load_otp_challenge(token)
+        with self.assertNumQueries(0):
+            self.assertEqual(verify_otp(challenge, self._wrong(otp)), OTP_INVALID)
+            self.assertEqual(verify_otp(challenge, otp), OTP_VALID)
+
+    def test_malformed_codes_do_not_use_attempts(self):
+        otp, token = issue_otp(self.user)
+        challenge = load_otp_challenge(token)
+        for guess in ('', '12345', '1234567', 'abcdef', '１２３４５６'):
+            self.assertEqual(verify_otp(challenge, guess), OTP_INVALID)
+        self.assertEqual(challenge['n'], 0)
+        self.assertEqual(verify_otp(challenge, otp), OTP_VALID)
+
+    def test_exhausted_code_is_rejected_even_when_correct(self):
+        otp, token = issue_otp(self.user)
+        challenge = load_otp_challenge(token)
+        for _ in range(get_otp_store().max_attempts):
+            verify_otp(challenge, self._wrong(otp))
+        self.assertEqual(verify_otp(challenge, otp), OTP_LOCKED)
+
+    def test_budget_is_shared_between_challenges(self):
+        # A copy of the challenge (e.g. a replayed session) doesn't get fresh guesses
+        otp, token = issue_otp(self.user)
+        for _ in range(get_otp_store().max_attempts):
+            verify_otp(load_otp_challenge(token), self._wrong(otp))
+        self.assertEqual(verify_otp(load_otp_challenge(token), otp), OTP_LOCKED)
+
+    def test_expired_challenge(self):
+        otp, token = issue_otp(self.user)
+        challenge = load_otp_challenge(token)
+        challenge['exp'] = 0
+        self.assertEqual(verify_otp(challenge, otp), OTP_EXPIRED)
+
+    def test_tampered_challenge_is_rejected(self):
+        _, token = issue_otp(self.user)
+        self.assertIsNone(load_otp_challenge(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+        self.assertIsNone(load_otp_challenge(None))
+
+    def test_older_code_stops_working_after_resend(self):
+        first, first_token = issue_otp(self.user)
+        issue_otp(self.user)
+        self.assertNotEqual(verify_otp(load_otp_challenge(first_token), first), OTP_VALID)
+
+    def start_challenge(self):
+        otp, token = issue_otp(self.user)
+        session = self.client.session
+        session['otp_challenge'] = token
+        session.save()
+        return otp
+
+    def post_message(self, name, data=None, **extra):
+        """POST and return the message it added; earlier ones pile up unread"""
+        response = self.client.post(reverse(f'authentication:{name}'), data or {}, **extra)
+        self.assertRedirects(response, reverse('authentication:verify_otp'), fetch_redirect_response=False)
+        return [str(message) for message in get_messages(response.wsgi_request)][-1]
+
+    @override_settings(OTP_STORE={'RESEND_LIMIT': 100})
+    def test_resend_does_not_refill_the_guess_budget(self):
+        otp = self.start_challenge()
+        max_attempts = get_otp_store().max_attempts
+
+        with mock.patch('authentication.views.send_otp_email', return_value=None) as send:
+            for _ in range(max_attempts):
+                self.post_message('verify_otp', {'otp': self._wrong(otp)}, REMOTE_ADDR='198.51.100.1')
+                self.post_message('resend_otp', REMOTE_ADDR='198.51.100.1')
+                otp = send.call_args[0][1]
+
+        self.assertEqual(
+            self.post_message('verify_otp', {'otp': otp}, REMOTE_ADDR='198.51.100.1'),
+            'Too many incorrect codes. Please try again in a few minutes.',
+        )
+
+    @override_settings(OTP_STORE={'RESEND_LIMIT': 2})
+    def test_resend_is_rate_limited_per_user_and_ip(self):
+        self.start_challenge()
+
+        with mock.patch('authentication.views.send_otp_email', return_value=None) as send:
+            for _ in range(2):
+                self.post_message('resend_otp', REMOTE_ADDR='198.51.100.2')
+            # A new address doesn't help: the user's own budget is spent too
+            for address in ('198.51.100.2', '198.51.100.3'):
+                self.assertEqual(
+                    self.post_message('resend_otp', REMOTE_ADDR=address),
+                    'Too many codes requested. Please wait a few minutes.',
+                )
+        self.assertEqual(send.call_count, 2)
+
+    def test_wrong_code_post_does_not_query_users(self):
+        otp, token = issue_otp(self.user)
+        session = self.client.session
+        session['otp_challenge'] = token
+        session.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('authentication:verify_otp'), {'otp': self._wrong(otp)})
+
+        self.assertRedirects(response, reverse('authentication:verify_otp'), fetch_redirect_response=False)
+        self.assertFalse([q for q in queries if 'FROM "users"' in q['sql']])
+
+
+class SessionActivityTrackerTests(TestCase):
+    """Logins, logouts and activity are buffered and written as one batch"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='tracked', email='tracked@example.com', is_verified=True)
+
+    def setUp(self):
+        self.tracker = self.make_tracker()
+
+    def make_tracker(self, min_touch_interval=60, max_buffer=3):
+        # No background thread: the test flushes by hand
+        tracker = SessionActivityTracker(min_touch_interval=min_touch_interval, max_buffer=max_buffer, autostart=False)
+        self.addCleanup(tracker.shutdown)
+        return tracker
+
+    def _start(self, key, ip='10.0.0.1'):
+        self.tracker.start(key, self.user.pk, ip, 'Mozilla/5.0', 'desktop')
+
+    def _touch(self, key, ip='10.0.0.2'):
+        self.tracker.touch(key, str(self.user.pk), ip, 'Mozilla/5.0', 'desktop')
+
+    def test_recording_runs_no_query(self):
+        with self.assertNumQueries(0):
+            self._start('a' * 32)
+            self._touch('a' * 32)
+            self.tracker.end(self.user.pk)
+        self.assertFalse(UserSession.objects.exists())
+
+        self.assertTrue(self.tracker.flush())
+        self.assertFalse(UserSession.objects.get(session_key='a' * 32).is_active)
+
+    def test_login_creates_session_and_retires_older_ones(self):
+        UserSession.objects.create(
+            user=self.user, session_key='old', ip_address='10.0.0.9', user_agent='x', is_active=True
+        )
+        self._start('new')
+        self.assertTrue(self.tracker.flush())
+
+        self.assertFalse(UserSession.objects.get(session_key='old').is_active)
+        self.assertTrue(UserSession.objects.get(session_key='new').is_active)
+
+    def test_two_logins_between_flushes_keep_only_the_latest(self):
+        self._start('first')
+        self._start('second')
+        self.tracker.flush()
+
+        active = UserSession.objects.filter(user=self.user, is_active=True)
+        self.assertEqual([s.session_key for s in active], ['second'])
+
+    def test_activity_is_coalesced(self):
+        UserSession.objects.create(
+            user=self.user, session_key='key', ip_address='10.0.0.1', user_agent='x', is_active=True
+        )
+        for ip in ('10.0.0.2', '10.0.0.3', '10.0.0.4'):
+            self._touch('key', ip)
+        self.tracker.flush()
+
+        # Only the first touch in MIN_TOUCH_INTERVAL is recorded
+        self.assertEqual(UserSession.objects.get(session_key='key').ip_address, '10.0.0.2')
+        self.assertFalse(self.tracker.is_due('key'))
+
+    def test_activity_does_not_reactivate_a_retired_session(self):
+        self.tracker = self.make_tracker(min_touch_interval=0)
+        self._start('key')
+        self.tracker.end(self.user.pk)
+        self.tracker.flush()
+
+        self._touch('key')
+        self.tracker.flush()
+
+        session = UserSession.objects.get(session_key='key')
+        self.assertEqual(session.ip_address, '10.0.0.2')
+        self.assertFalse(session.is_active)
+
+    def test_logout_retires_every_session(self):
+        self._start('key')
+        self.tracker.flush()
+        self.tracker.end(self.user.pk)
+        self.tracker.flush()
+
+        self.assertFalse(UserSession.objects.filter(user=self.user, is_active=True).exists())
+
+    def test_full_buffer_drops_activity_but_keeps_logins(self):
+        for key in ('t1', 't2', 't3', 't4'):
+            self._touch(key)
+        self._start('login')
+
+        with self.assertLogs('authentication.session_activity', 'WARNING') as logs:
+            self.assertTrue(self.tracker.flush())
+        self.assertIn('dropped 1 activity records', logs.output[0])
+        self.assertEqual(
+            set(UserSession.objects.values_list('session_key', flat=True)),
+            {'t1', 't2', 't3', 'login'},
+        )
+
+    def test_shutdown_writes_what_is_left(self):
+        self._start('key')
+        self.tracker.shutdown()
+        self.assertTrue(UserSession.objects.get(session_key='key').is_active)
+
+
+class UserAgentTests(SimpleTestCase):
+    """parse_user_agent() classifies device, OS and browser from real headers"""
+
+    def assertClassified(self, user_agent, device, os, browser):
+        self.assertEqual(tuple(parse_user_agent(user_agent)), (device, os, browser))
+
+    def test_desktop(self):
+        self.assertClassified(
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+            'Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0',
+            'desktop', 'Windows', 'Edge',
+        )
+        self.assertClassified(
+            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+            'Version/17.4.1 Safari/605.1.15',
+            'desktop', 'macOS', 'Safari',
+        )
+
+    def test_phones(self):
+        self.assertClassified(
+            'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+            'CriOS/124.0.6367.88 Mobile/15E148 Safari/604.1',
+            'mobile', 'iOS', 'Chrome',
+        )
+        self.assertClassified(
+            'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) '
+            'Chrome/124.0.0.0 Mobile Safari/537.36',
+            'mobile', 'Android', 'Chrome',
+        )
+
+    def test_tablets_are_not_phones(self):
+        # Android tablets leave "Mobile" out; the old check called them phones
+        self.assertClassified(
+            'Mozilla/5.0 (Linux; Android 14; SM-X710) AppleWebKit/537.36 (KHTML, like Gecko) '
+            'Chrome/124.0.0.0 Safari/537.36',
+            'tablet', 'Android', 'Chrome',
+        )
+        self.assertClassified(
+            'Mozilla/5.0 (iPad; CPU OS 17_4_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+            'Version/17.4.1 Mobile/15E148 Safari/604.1',
+            'tablet', 'iOS', 'Safari',
+        )
+
+    def test_bots_and_unknowns(self):
+        self.assertClassified('Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)', 'bot', 'Other', 'Other')
+        self.assertClassified('', 'desktop', 'Other', 'Other')
+        self.assertClassified(None, 'desktop', 'Other', 'Other')
+
+
+class ClientIPTests(SimpleTestCase):
+    """X-Forwarded-For is only believed behind trusted proxies, read from the right"""
+
+    def setUp(self):
+        self.resolver = ClientIPResolver(trusted_proxies=['10.0.0.0/8', '::1/128'])
+
+    def test_direct_connection_ignores_forwarded_for(self):
+        self.assertEqual(self.resolver.resolve('203.0.113.7', '1.2.3.4'), '203.0.113.7')
+
+    def test_forged_entries_left_of_the_client_are_ignored(self):
+        # The client sent "6.6.6.6"; our proxies appended what they saw
+        self.assertEqual(self.resolver.resolve('10.0.0.5', '6.6.6.6, 203.0.113.7 ,10.0.0.2'), '203.0.113.7')
+
+    def test_unreadable_hop_stops_the_walk(self):
+        self.assertEqual(self.resolver.resolve('10.0.0.5', '203.0.113.7, not-an-ip, 10.0.0.2'), '10.0.0.2')
+
+    def test_ports_brackets_and_mapped_addresses(self):
+        self.assertEqual(self.resolver.resolve('10.0.0.5', '198.51.100.2:8080'), '198.51.100.2')
+        self.assertEqual(self.resolver.resolve('::1', '[2001:db8::1]:443'), '2001:db8::1')
+        self.assertEqual(self.resolver.resolve('::ffff:203.0.113.7'), '203.0.113.7')
+        self.assertIsNone(self.resolver.resolve(''))
+
+    def test_rate_limit_key_buckets_ipv6_per_64(self):
+        self.assertEqual(self.resolver.rate_limit_key('203.0.113.7'), '203.0.113.7')
+        self.assertEqual(self.resolver.rate_limit_key('2001:db8:1:2::1'), '2001:db8:1:2::/64')
+        self.assertEqual(
+            self.resolver.rate_limit_key('2001:db8:1:2:ffff::9'),
+            self.resolver.rate_limit_key('2001:db8:1:2::1'),
+        )
+
+
+class SlidingWindowRateLimiterTests(SimpleTestCase):
+    """Failed logins are counted per key over a weighted sliding window"""
+
+    backend_class = RateLimitMemoryBackend
+
+    def setUp(self):
+        self.limiter = SlidingWindowRateLimiter(self.backend_class(), limit=3, window_seconds=60)
+
+    def test_hits_are_counted_until_the_limit(self):
+        for _ in range(2):
+            self.limiter.hit('k', now=600)
+        self.assertEqual(self.limiter.count('k', now=600), 2)
+        self.assertFalse(self.limiter.is_limited('k', now=600))
+        self.limiter.hit('k', now=600)
+        self.assertTrue(self.limiter.is_limited('k', now=600))
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        for _ in range(4):
+            self.limiter.hit('k', now=600)
+        # 15s into the next window, 3/4 of the previous one still overlaps
+        self.assertEqual(self.limiter.count('k', now=675), 3)
+        self.assertEqual(self.limiter.count('k', now=690), 2)
+        # Two windows later nothing is left
+        self.assertEqual(self.limiter.count('k', now=720), 0)
+
+    def test_keys_are_independent_and_resettable(self):
+        self.limiter.hit('a', now=600)
+        self.limiter.hit('b', now=600)
+        self.limiter.reset('a', now=600)
+        self.assertEqual(self.limiter.count('a', now=600), 0)
+        self.assertEqual(self.limiter.count('b', now=600), 1)
+
+    async def test_async_methods_share_the_counters(self):
+        for _ in range(3):
+            await self.limiter.ahit('k', now=600)
+        self.assertEqual(await self.limiter.acount('k', now=675), 2)
+        self.assertEqual(self.limiter.count('k', now=675), 2)
+        self.assertTrue(await self.limiter.ais_limited('k', now=600))
+        await self.limiter.areset('k', now=600)
+        self.assertEqual(await self.limiter.acount('k', now=600), 0)
+
+
+class CacheRateLimitBackendTests(SlidingWindowRateLimiterTests):
+    """The same window over counters kept in the Django cache"""
+
+    def backend_class(self):
+        cache.clear()
+        return RateLimitCacheBackend(cache_alias='default')
+
+
+class RateLimitKeyTests(SimpleTestCase):
+
+    def test_identity_key_ignores_case(self):
+        self.assertEqual(identity_key('Player@Example.com'), identity_key('player@example.com'))
+        self.assertEqual(identity_key(None), 'user:')
+
+    def test_ip_key_buckets_ipv6_per_64(self):
+        self.assertEqual(ip_key('203.0.113.7'), 'ip:203.0.113.7')
+        self.assertEqual(ip_key('2001:db8:1:2::1'), ip_key('2001:db8:1:2:ffff::9'))
+        self.assertNotEqual(ip_key('2001:db8:1:2::1'), ip_key('2001:db8:1:3::1'))
+
+    @override_settings(RATE_LIMIT={'LIMIT': 2, 'WINDOW_MINUTES': 7})
+    def test_login_limit_comes_from_settings(self):
+        self.assertEqual(check_rate_limit('198.51.100.20', 'settings-limited'), (False, 0))
+        record_failed_login('198.51.100.20', 'settings-limited')
+        record_failed_login('198.51.100.20', 'settings-limited')
+        self.assertEqual(check_rate_limit('198.51.100.21', 'settings-limited'), (True, 2))
+
+
+class LoginAttemptWriterTests(TestCase):
+    """Login attempts are journaled, bulk inserted and replayed after failures"""
+
+    def setUp(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool_dir = Path(spool.name)
+        self.writer = LoginAttemptWriter(batch_size=100, spool_dir=self.spool_dir, autostart=False)
+        self.addCleanup(self.writer.shutdown)
+
+    def enqueue(self, count):
+        for i in range(count):
+            self.writer.enqueue(
+                username_or_email=f'player{i}',
+                ip_address='203.0.113.7',
+                user_agent='test',
+                success=False,
+            )
+
+    def spool_files(self):
+        return sorted(path.name for path in self.spool_dir.iterdir() if path.stat().st_size)
+
+    def test_enqueue_runs_no_query(self):
+        with self.assertNumQueries(0):
+            self.enqueue(3)
+        self.assertEqual(len(self.spool_files()), 1)
+
+    def test_flush_is_one_bulk_insert(self):
+        self.enqueue(3)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.writer.flush())
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(LoginAttempt.objects.count(), 3)
+        # The persisted segment is gone
+        self.assertEqual(self.spool_files(), [])
+
+    def test_failed_write_is_kept_and_replayed(self):
+        self.enqueue(3)
+        with mock.patch.object(self.writer, '_write', return_value=False):
+            self.assertFalse(self.writer.flush())
+
+        orphans = self.spool_files()
+        self.assertEqual(len(orphans), 1)
+        self.assertTrue(orphans[0].startswith('orphan-'))
+        self.assertEqual(LoginAttempt.objects.count(), 0)
+
+        self.writer.replay_spool()
+        self.assertEqual(
+            sorted(LoginAttempt.objects.values_list('username_or_email', flat=True)),
+            ['player0', 'player1', 'player2'],
+        )
+        self.assertEqual(self.spool_files(), [])
+
+    def test_segment_of_a_dead_worker_with_a_reused_pid_is_replayed(self):
+        # A crashed worker's journal, named after the PID a new worker now has
+        self.spool_dir.joinpath(f'{os.getpid()}-1.jsonl').write_text(''.join(
+            json.dumps({'username_or_email': name, 'ip_address': '203.0.113.7', 'user_agent': 'test',
+                        'success': False, 'attempted_at': timezone.now().isoformat()}) + '\n'
+            for name in ('crashed0', 'crashed1')
+        ))
+        self.writer.replay_spool()
+        self.assertEqual(
+            sorted(LoginAttempt.objects.values_list('username_or_email', flat=True)),
+            ['crashed0', 'crashed1'],
+        )
+        self.assertEqual(self.spool_files(), [])
+
+    @skipUnless(fcntl, 'needs flock()')
+    def test_live_segment_is_not_replayed(self):
+        self.enqueue(2)
+        # Another worker's replay finds the segment locked
+        LoginAttemptWriter(spool_dir=self.spool_dir, autostart=False).replay_spool()
+        self.assertEqual(LoginAttempt.objects.count(), 0)
+
+        self.assertTrue(self.writer.flush())
+        self.assertEqual(LoginAttempt.objects.count(), 2)
+
+    def test_shutdown_hook_drains_the_queue(self):
+        self.enqueue(2)
+        register_shutdown_hook(self.writer.shutdown)
+        run_shutdown_hooks()
+        self.assertEqual(LoginAttempt.objects.count(), 2)
+        self.assertEqual(list(self.spool_dir.iterdir()), [])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class StubSMTPHandler:
+    """Collects every message a local aiosmtpd server receives"""
+
+    def __init__(self):
+        self.messages = []
+        self.peers = []  # client address of each message, one per connection used
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.peers.append(session.peer)
+        return '250 OK'
+
+
+class StubSMTPMixin:
+    """Run a local SMTP server and point Django's SMTP settings at it"""
+
+    def start_smtp_server(self):
+        self.smtp = StubSMTPHandler()
+        self.smtp_port = free_port()
+        controller = Controller(self.smtp, hostname='127.0.0.1', port=self.smtp_port)
+        controller.start()
+        self.addCleanup(controller.stop)
+        return controller
+
+    def smtp_settings(self, port=None, **extra):
+        return override_settings(
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=port or self.smtp_port,
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_TIMEOUT=5,
+            **extra,
+        )
+
+
+@skipUnless(Controller, 'aiosmtpd is not installed')
+class MailSenderTests(StubSMTPMixin, TestCase):
+    """Queued mail is claimed once, retried with backoff and redacted after delivery"""
+
+    def setUp(self):
+        self.start_smtp_server()
+        self.options = dict(get_email_queue_settings(), MAX_ATTEMPTS=3, BACKOFF_SECONDS=5, RETENTION_DAYS=7)
+        self.sender = MailSender(self.options)
+        self.addCleanup(self.sender.close)
+
+        settings_override = self.smtp_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def queue(self, **fields):
+        fields.setdefault('subject', 'Your code')
+        fields.setdefault('body', 'Your code is 123456')
+        fields.setdefault('html_body', '<p>Your code is 123456</p>')
+        return OutboundEmail.objects.create(to_email='player@example.com', from_email='noreply@example.com', **fields)
+
+    def test_run_once_delivers_over_smtp_and_redacts(self):
+        message = self.queue()
+        self.assertEqual(self.sender.run_once(), 1)
+
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(self.smtp.messages[0].rcpt_tos, ['player@example.com'])
+        self.assertIn(b'123456', self.smtp.messages[0].content)
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual((message.body, message.html_body), ('', None))
+
+    def test_connection_is_reused_between_messages(self):
+        self.queue()
+        self.queue()
+        self.sender.run_once()
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertIsNotNone(self.sender.connection)
+
+    def test_message_is_claimed_once(self):
+        message = self.queue()
+        claimed = self.sender.claim_next()
+        self.assertEqual(claimed.id, message.id)
+        self.assertEqual(claimed.status, OutboundEmail.STATUS_SENDING)
+        self.assertIsNone(MailSender(self.options).claim_next())
+
+    def test_failures_back_off_then_give_up(self):
+        message = self.queue()
+        with self.smtp_settings(port=free_port()):
+            for attempt, delay in [(1, 5), (2, 10)]:
+                before = timezone.now()
+                self.assertFalse(self.sender.deliver(OutboundEmail.objects.get(id=message.id)))
+                message.refresh_from_db()
+                self.assertEqual((message.status, message.attempts), (OutboundEmail.STATUS_QUEUED, attempt))
+                self.assertGreaterEqual(message.next_attempt_at, before + timedelta(seconds=delay))
+                self.assertLess(message.next_attempt_at, before + timedelta(seconds=delay + 5))
+                # Not due yet
+                self.assertIsNone(self.sender.claim_next())
+
+            self.assertFalse(self.sender.deliver(OutboundEmail.objects.get(id=message.id)))
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboundEmail.STATUS_FAILED, 3))
+        self.assertTrue(message.last_error)
+        self.assertEqual((message.body, message.html_body), ('', None))
+        self.assertEqual(self.smtp.messages, [])
+
+    def test_stale_claims_are_requeued(self):
+        stale = self.queue(status=OutboundEmail.STATUS_SENDING, claimed_at=timezone.now() - timedelta(hours=1))
+        fresh = self.queue(status=OutboundEmail.STATUS_SENDING, claimed_at=timezone.now())
+
+        self.assertEqual(requeue_stale_claims(self.options), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.status, OutboundEmail.STATUS_QUEUED)
+        self.assertEqual(fresh.status, OutboundEmail.STATUS_SENDING)
+
+        self.sender.run_once()
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    def test_old_delivered_rows_are_purged(self):
+        old_sent = self.queue(status=OutboundEmail.STATUS_SENT)
+        old_failed = self.queue(status=OutboundEmail.STATUS_FAILED)
+        old_queued = self.queue(next_attempt_at=timezone.now() + timedelta(days=1))
+        recent_sent = self.queue(status=OutboundEmail.STATUS_SENT)
+        OutboundEmail.objects.exclude(id=recent_sent.id).update(created_at=timezone.now() - timedelta(days=8))
+
+        self.assertEqual(purge_old_emails(self.options), 2)
+        self.assertEqual(
+            set(OutboundEmail.objects.values_list('id', flat=True)),
+            {old_queued.id, recent_sent.id},
+        )
+        self.assertFalse(OutboundEmail.objects.filter(id__in=[old_sent.id, old_failed.id]).exists())
+
+
+@skipUnless(Controller, 'aiosmtpd is not installed')
+class PooledSMTPBackendTests(StubSMTPMixin, SimpleTestCase):
+    """Connections are reused, dropped when broken and bounded per server"""
+
+    def setUp(self):
+        self.start_smtp_server()
+        settings_override = self.smtp_settings(EMAIL_POOL={
+            'MAX_SIZE': 1,
+            'ACQUIRE_TIMEOUT': 0.2,
+            'HEALTH_CHECK_INTERVAL': 60.0,
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def backend(self):
+        backend = PooledSMTPBackend(fail_silently=False)
+        self.addCleanup(backend._get_pool().close_all)
+        return backend
+
+    def send(self, backend=None):
+        message = EmailMessage('Hi', 'Body', 'noreply@example.com', ['player@example.com'])
+        return (backend or self.backend()).send_messages([message])
+
+    def test_connection_is_reused_between_backends(self):
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertEqual(self.smtp.peers[0], self.smtp.peers[1])
+
+    def test_disconnected_connection_is_not_returned_to_the_pool(self):
+        self.send()
+
+        backend = self.backend()
+        backend.open()
+        # The server dropped the pooled connection while it sat idle
+        backend.connection.sock.shutdown(socket.SHUT_RDWR)
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            self.send(backend)
+        backend.close()
+        self.assertEqual(backend._get_pool()._idle, [])
+
+        self.assertEqual(self.send(), 1)
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertNotEqual(self.smtp.peers[0], self.smtp.peers[1])
+
+    def test_exhausted_pool_times_out_then_recovers(self):
+        holder = self.backend()
+        holder.open()
+
+        waiting = self.backend()
+        with self.assertRaisesMessage(smtplib.SMTPException, 'Timed out waiting'):
+            waiting.open()
+
+        holder.close()
+        self.assertTrue(waiting.open())
+        self.assertEqual(self.send(waiting), 1)
+        waiting.close()
+
+
+@skipUnless(Controller, 'aiosmtpd is not installed')
+class AsyncSendMessageTests(StubSMTPMixin, SimpleTestCase):
+    """asend_message() goes through the SMTP connection pool"""
+
+    def setUp(self):
+        self.start_smtp_server()
+        settings_override = self.smtp_settings(
+            EMAIL_BACKEND='authentication.mail_backends.PooledSMTPBackend',
+            EMAIL_POOL={'MAX_SIZE': 1},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(lambda: PooledSMTPBackend()._get_pool().close_all())
+
+    async def test_messages_reuse_a_pooled_connection(self):
+        for _ in range(2):
+            message = EmailMessage('Hi', 'Body', 'noreply@example.com', ['player@example.com'])
+            self.assertEqual(await asend_message(message), 1)
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertEqual(self.smtp.peers[0], self.smtp.peers[1])
+
+
+# URLconf for AsyncAuthViewTests: authentication.urls as routed with ASYNC_AUTH_VIEWS on
+ASYNC_VIEWS = {'signup_view', 'login_view', 'verify_otp_view', 'resend_otp_view'}
+urlpatterns = [
+    path('auth/', include(([
+        path(
+            str(pattern.pattern),
+            getattr(async_views, pattern.callback.__name__) if pattern.callback.__name__ in ASYNC_VIEWS else pattern.callback,
+            name=pattern.name,
+        )
+        for pattern in auth_urls.urlpatterns
+    ], 'authentication'))),
+]
+
+
+# No background writers: session and audit rows are written inline
+@override_settings(
+    ROOT_URLCONF='authentication.tests',
+    SESSION_ACTIVITY={'ENABLED': False},
+    LOGIN_AUDIT={'ENABLED': False},
+)
+class AsyncAuthViewTests(TestCase):
+    """The async login, OTP and resend views behave like the sync ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='async_player', email='async_player@example.com',
+            password=make_password('secret-password'), is_verified=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(get_otp_store().discard, self.user.pk)
+        patcher = mock.patch('authentication.async_views.asend_otp_email', new_callable=mock.AsyncMock, return_value=True)
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def post(self, name, data=None, remote_addr='198.51.100.20'):
+        return await self.async_client.post(reverse(f'authentication:{name}'), data or {}, REMOTE_ADDR=remote_addr)
+
+    def message(self, response):
+        """The message the request added; earlier ones pile up unread"""
+        return [str(message) for message in get_messages(response.asgi_request)][-1]
+
+    async def log_in(self):
+        response = await self.post('login', {'username': 'async_player', 'password': 'secret-password'})
+        self.assertRedirects(response, reverse('authentication:verify_otp'), fetch_redirect_response=False)
+        return self.send.call_args[0][1]
+
+    def _wrong(self, otp):
+        return '000000' if otp != '000000' else '111111'
+
+    async def test_login_and_verify(self):
+        otp = await self.log_in()
+        before = self.user.updated_at
+
+        response = await self.post('verify_otp', {'otp': otp})
+        self.assertRedirects(response, reverse('authentication:games'), fetch_redirect_response=False)
+
+        session = await self.async_client.asession()
+        self.assertEqual(await session.aget('_auth_user_id'), str(self.user.pk))
+        self.assertIsNone(await session.aget('otp_challenge'))
+
+        user = await User.objects.aget(pk=self.user.pk)
+        self.assertTrue(user.otp_verified)
+        self.assertGreater(user.updated_at, before)
+
+    async def test_wrong_password(self):
+        response = await self.post('login', {'username': 'async_player', 'password': 'wrong-password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.message(response), 'Invalid username/email or password.')
+        self.send.assert_not_called()
+
+    async def test_wrong_code(self):
+        otp = await self.log_in()
+        response = await self.post('verify_otp', {'otp': self._wrong(otp)})
+        self.assertRedirects(response, reverse('authentication:verify_otp'), fetch_redirect_response=False)
+        self.assertEqual(self.message(response), 'Invalid verification code.')
+        self.assertFalse((await User.objects.aget(pk=self.user.pk)).otp_verified)
+
+    @override_settings(OTP_STORE={'RESEND_LIMIT': 100})
+    async def test_resend_does_not_refill_the_guess_budget(self):
+        otp = await self.log_in()
+        for _ in range(get_otp_store().max_attempts):
+            await self.post('verify_otp', {'otp': self._wrong(otp)})
+            await self.post('resend_otp')
+            otp = self.send.call_args[0][1]
+
+        response = await self.post('verify_otp', {'otp': otp})
+        self.assertEqual(self.message(response), 'Too many incorrect codes. Please try again in a few minutes.')
+
+    @override_settings(OTP_STORE={'RESEND_LIMIT': 2})
+    async def test_resend_is_rate_limited_per_user_and_ip(self):
+        await self.log_in()
+        for _ in range(2):
+            response = await self.post('resend_otp', remote_addr='198.51.100.21')
+            self.assertEqual(self.message(response), 'New code sent to your email.')
+        for address in ('198.51.100.21', '198.51.100.22'):
+            response = await self.post('resend_otp', remote_addr=address)
+            self.assertEqual(self.message(response), 'Too many codes requested. Please wait a few minutes.')
+        self.assertEqual(self.send.call_count, 3)  # the login and two resends
+
+
+class ResolveUserTests(TestCase):
+    """Identifier lookups are cached, including misses, and invalidated on save"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unknown_identifier_is_remembered(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolve_user('ghost'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_user('ghost'))
+
+    def test_signup_clears_the_shared_miss(self):
+        self.assertIsNone(resolve_user('newcomer@example.com'))
+
+        user = User.objects.create(username='newcomer', email='newcomer@example.com')
+        self.assertEqual(resolve_user('newcomer@example.com'), user)
+        self.assertEqual(resolve_user('newcomer'), user)
+
+    def test_users_are_not_cached_by_default(self):
+        User.objects.create(username='builder', email='builder@example.com')
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.assertEqual(resolve_user('builder').username, 'builder')
+
+    @override_settings(IDENTITY_CACHE={'POSITIVE_TTL': 60})
+    def test_positive_cache_hit_and_invalidation(self):
+        user = User.objects.create(username='builder', email='builder@example.com')
+        with self.assertNumQueries(1):
+            resolve_user('builder')
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_user('builder'), user)
+
+        user.display_name = 'Builder'
+        user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_user('builder').display_name, 'Builder')
+
+
+class AvailabilityFilterTests(TestCase):
+    """Signup only asks the database about names the filter may have seen"""
+
+    signup_data = {
+        'username': 'builder',
+        'email': 'builder@example.com',
+        'password': 'Tr1cky-Passw0rd!',
+        'confirm_password': 'Tr1cky-Passw0rd!',
+        'agree_terms': 'on',
+    }
+
+    def setUp(self):
+        cache.clear()
+        # Confirming queries and rebuilds read the primary, where the test users are
+        patcher = mock.patch.object(router, 'routers', [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def built_filter(self):
+        taken = TakenIdentifiers({**get_availability_filter_settings(), 'MIN_CAPACITY': 100})
+        taken.start = lambda: None
+        taken.rebuild()
+        return taken
+
+    def stale_filter(self):
+        """A filter built before another worker stored 'builder'"""
+        taken = self.built_filter()
+        user, = User.objects.bulk_create([User(username='builder', email='builder@example.com')])
+        self.built_filter().add_user(user)  # the other worker's post_save
+        return taken
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        keys = [f'username:player{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertTrue(bloom.is_full)
+        misses = sum(f'username:stranger{i}' in bloom for i in range(1000))
+        self.assertLess(misses, 50)
+
+    def test_filter_sees_the_table_and_local_saves(self):
+        User.objects.create(username='Existing', email='existing@example.com')
+        taken = TakenIdentifiers({**get_availability_filter_settings(), 'MIN_CAPACITY': 100})
+        taken.start = lambda: None
+        self.assertTrue(taken.might_be_taken('username', 'newcomer'))  # not built yet
+
+        taken.rebuild()
+        self.assertTrue(taken.might_be_taken('username', 'existing'))
+        self.assertTrue(taken.might_be_taken('email', 'EXISTING@example.com'))
+        self.assertFalse(taken.might_be_taken('username', 'newcomer'))
+
+        taken.add('username', 'Newcomer')
+        self.assertTrue(taken.might_be_taken('username', 'newcomer'))
+
+    def test_free_name_validates_without_queries(self):
+        with mock.patch.object(availability, '_taken', self.built_filter()):
+            form = SignupForm(self.signup_data)
+            with self.assertNumQueries(0):
+                self.assertTrue(form.is_valid(), form.errors)
+
+    def test_rebuild_reads_from_a_replica(self):
+        with mock.patch('authentication.db_router.replica_reads', wraps=replica_reads) as reads:
+            self.built_filter()
+        reads.assert_called_once_with()
+
+    def test_stale_filter_still_rejects_a_taken_username(self):
+        stale = self.stale_filter()
+        # Not in the Bloom filter, but the shared cache has the other worker's save
+        self.assertTrue(stale.might_be_taken('username', 'builder'))
+
+        with mock.patch.object(availability, '_taken', stale):
+            form = SignupForm(self.signup_data)
+            self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['username'], ['This username is already taken'])
+        self.assertEqual(form.errors['email'], ['This email is already registered'])
+
+    async def test_stale_filter_still_rejects_a_taken_username_async(self):
+        stale = await sync_to_async(self.stale_filter)()
+
+        with mock.patch.object(availability, '_taken', stale):
+            form = SignupForm(self.signup_data)
+            self.assertFalse(await form.ais_valid())
+        self.assertEqual(form.errors['username'], ['This username is already taken'])
+
+    def test_lost_uniqueness_race_is_reported_as_taken(self):
+        User.objects.create(username='builder', email='builder@example.com')
+
+        # Validation ran before the other signup committed
+        with mock.patch.object(SignupForm, 'clean_username', lambda form: form.cleaned_data['username']), \
+                mock.patch.object(SignupForm, 'clean_email', lambda form: form.cleaned_data['email']), \
+                mock.patch.object(SignupForm, 'validate_unique', lambda form: None):
+            response = self.client.post(reverse('authentication:signup'), self.signup_data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'This username or email is already taken',
+            [str(message) for message in get_messages(response.wsgi_request)],
+        )
+        self.assertEqual(User.objects.filter(username='builder').count(), 1)
+
+
+class CheckAvailabilityViewTests(TestCase):
+    """Live availability answers never report a claimed name as free"""
+
+    def setUp(self):
+        cache.clear()
+        self.taken = self.built_filter()
+        patchers = [
+            mock.patch.object(availability, '_taken', self.taken),
+            mock.patch.object(availability, 'availability_results', ResultCache(30, 100)),
+            # Confirming queries read the primary, where the test users are
+            mock.patch.object(router, 'routers', []),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def built_filter(self):
+        taken = TakenIdentifiers({**get_availability_filter_settings(), 'MIN_CAPACITY': 100})
+        taken.start = lambda: None
+        taken.rebuild()
+        return taken
+
+    def check(self, **params):
+        return self.client.get(reverse('authentication:check_availability'), params)
+
+    def test_free_name_is_available_and_not_cached(self):
+        with self.assertNumQueries(0):
+            response = self.check(username='Newcomer')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['value'], 'newcomer')
+        self.assertTrue(response.json()['available'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        User.objects.create(username='newcomer', email='newcomer@example.com')
+        response = self.check(username='newcomer')
+        self.assertFalse(response.json()['available'])
+        self.assertEqual(response.json()['message'], 'This username is already taken')
+        self.assertIn('max-age=10', response['Cache-Control'])
+
+    def test_taken_answer_is_cached(self):
+        User.objects.create(username='builder', email='builder@example.com')
+        with self.assertNumQueries(1):
+            self.assertFalse(self.check(email='Builder@Example.com').json()['available'])
+        with self.assertNumQueries(0):
+            self.assertFalse(self.check(email='builder@example.com').json()['available'])
+
+    def test_signup_in_another_process_is_seen_before_the_rebuild(self):
+        # This process's filter predates the signup; the other process's filter recorded it
+        User.objects.bulk_create([User(username='builder', email='builder@example.com')])
+        self.built_filter().add_user(User(username='builder', email='builder@example.com'))
+
+        self.assertFalse(self.check(username='builder').json()['available'])
+
+    def test_invalid_value_is_a_400(self):
+        response = self.check(username='ab')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Username must be at least 3 characters')
+        self.assertEqual(self.check().status_code, 400)
+
+    @override_settings(AVAILABILITY_CHECK={'RATE_LIMIT': 2})
+    def test_checks_are_rate_limited_per_ip(self):
+        url = reverse('authentication:check_availability')
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, {'username': 'newcomer'}, REMOTE_ADDR='203.0.113.9').status_code, 200)
+        response = self.client.get(url, {'username': 'newcomer'}, REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_normalize_identifier_matches_the_form(self):
+        self.assertEqual(normalize_identifier('username', ' Builder_1 '), 'builder_1')
+        self.assertEqual(normalize_identifier('email', ' Player@Example.COM '), 'player@example.com')
+        for kind, value in (('username', 'ab'), ('username', 'x' * 21), ('email', ''), ('email', 'not-an-email')):
+            with self.assertRaises(ValidationError):
+                normalize_identifier(kind, value)
+
+
+class EmailRenderStatsTests(SimpleTestCase):
+    """The one-time compile is timed apart from per-message renders"""
+
+    template_name = 'authentication/emails/verify_email.html'
+
+    def setUp(self):
+        render_stats.clear()
+        self.addCleanup(render_stats.clear)
+        patcher = mock.patch.dict(email_rendering._compiled, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def slow_precompile_check(self, *args):
+        time.sleep(0.02)
+        return True
+
+    @override_settings(EMAIL_RENDER_BUDGET_MS=5)
+    def test_slow_compile_does_not_count_against_the_budget(self):
+        user = User(username='builder', email='builder@example.com')
+        context = {'user': user, 'verification_url': 'https://example.com/verify/'}
+
+        with mock.patch.object(email_rendering, '_is_precompilable', self.slow_precompile_check), \
+                self.assertNoLogs('authentication.email_rendering', 'WARNING'):
+            html, text = render_email(self.template_name, context)
+            render_email(self.template_name, context)
+        self.assertIn('https://example.com/verify/', html)
+
+        stats = get_email_render_stats()[self.template_name]
+        self.assertEqual(stats['compiles'], 1)
+        self.assertGreaterEqual(stats['compile_ms'], 20)
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['over_budget'], 0)
+
+    def test_bench_command_reports_render_stats(self):
+        out = StringIO()
+        call_command('bench_email_backend', '--render-only', '--messages', '3', stdout=out)
+        self.assertIn('verify_email.html', out.getvalue())
+        self.assertIn('(1x)', out.getvalue())
+
+
+class PageCacheTests(TestCase):
+    """Marketing pages are cached per path, never per query string"""
+
+    def setUp(self):
+        page_cache.clear()
+        self.addCleanup(page_cache.clear)
+
+    def test_page_is_cached_by_path(self):
+        self.client.get(reverse('authentication:about'))
+        with mock.patch.object(views, 'render') as render:
+            response = self.client.get(reverse('authentication:about'))
+        render.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+
+    def test_query_strings_bypass_the_cache(self):
+        self.client.get(reverse('authentication:about'))
+        for i in range(3):
+            response = self.client.get(reverse('authentication:about'), {'utm_source': f'ad{i}'})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('ETag', response)
+        self.assertEqual(len(page_cache._data), 1)
+
+
+class PasswordHashingPoolTests(TestCase):
+    """Hashing runs on a bounded pool that sheds load with a 429"""
+
+    def saturated_pool(self):
+        pool = PasswordHashingPool(workers=1, max_pending=2)
+        release = threading.Event()
+        self.addCleanup(pool.shutdown)
+        self.addCleanup(release.set)
+        self.blocked = [pool.submit(release.wait) for _ in range(2)]
+        return pool, release
+
+    def test_full_queue_sheds_new_hashes(self):
+        pool, release = self.saturated_pool()
+        with self.assertRaises(HashingOverloaded):
+            pool.run(make_password, 'secret-password')
+        self.assertEqual(pool.stats.snapshot()['shed'], 1)
+
+        release.set()
+        for future in self.blocked:
+            future.result()
+        self.assertEqual(pool.pending, 0)
+        self.assertTrue(pool.run(make_password, 'secret-password'))
+
+    def test_overloaded_login_is_a_429_with_retry_after(self):
+        pool, release = self.saturated_pool()
+        with mock.patch.object(hashing, '_pool', pool):
+            response = self.client.post(
+                reverse('authentication:login'),
+                {'username': 'nobody', 'password': 'secret-password'},
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(hashing.get_password_hashing_settings()['RETRY_AFTER']))
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_outdated_hash_is_upgraded(self):
+        user = User.objects.create(
+            username='legacy', email='legacy@example.com',
+            password=make_password('secret-password', hasher='md5'),
+        )
+        self.assertTrue(check_user_password(user, 'secret-password'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(check_user_password(user, 'secret-password'))
+        self.assertFalse(check_user_password(user, 'wrong-password'))
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+])
+class LoginRehashTests(TestCase):
+    """An outdated hash is upgraded in the UPDATE that logging in makes anyway"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            username='legacy', email='legacy@example.com',
+            password=make_password('secret-password', hasher='md5'), is_verified=True,
+        )
+        self.addCleanup(get_otp_store().discard, self.user.pk)
+
+    def user_updates(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('UPDATE "users"')]
+
+    @override_settings(SESSION_ACTIVITY={'ENABLED': False}, LOGIN_AUDIT={'ENABLED': False})
+    def test_upgrade_rides_with_the_login_write(self):
+        with mock.patch('authentication.views.send_otp_email', return_value=True) as send, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('authentication:login'),
+                {'username': 'legacy', 'password': 'secret-password'},
+                REMOTE_ADDR='198.51.100.30',
+            )
+        self.assertRedirects(response, reverse('authentication:verify_otp'), fetch_redirect_response=False)
+        self.assertEqual(self.user_updates(queries), [])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('authentication:verify_otp'), {'otp': send.call_args[0][1]})
+        self.assertRedirects(response, reverse('authentication:games'), fetch_redirect_response=False)
+        self.assertEqual(len(self.user_updates(queries)), 1)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.otp_verified)
+        self.assertIsNotNone(self.user.last_login)
+        self.assertNotIn('password_rehash', self.client.session)
+
+    def test_pending_rehash_is_dropped_after_a_password_change(self):
+        pending = {'from': 'stale', 'to': 'pbkdf2_sha256$new'}
+        self.assertFalse(apply_pending_rehash(self.user, pending))
+        self.assertTrue(self.user.password.startswith('md5$'))
+
+
+class TuneArgon2Tests(SimpleTestCase):
+    """tune_argon2 never silently writes weaker parameters than the current ones"""
+
+    def setUp(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.params_file = Path(spool.name) / 'argon2.json'
+        settings_override = override_settings(
+            ARGON2_PARAMS_FILE=self.params_file,
+            ARGON2_PARAMS={'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def tune(self, elapsed_ms, **options):
+        # elapsed_ms at two iterations, growing with time_cost
+        with mock.patch(
+            'authentication.management.commands.tune_argon2.Command._measure',
+            side_effect=lambda time_cost, *args: elapsed_ms * time_cost / 2,
+        ) as measure:
+            call_command('tune_argon2', parallelism=8, stdout=StringIO(), **options)
+        return measure
+
+    def test_starts_from_the_current_memory_cost(self):
+        measure = self.tune(40.0, target_ms=100.0, dry_run=True)
+        self.assertEqual(measure.call_args_list[0].args[1], 102400)
+
+    def test_weaker_parameters_are_refused(self):
+        with self.assertRaisesMessage(CommandError, '--allow-weaker'):
+            self.tune(500.0, target_ms=100.0)
+        self.assertFalse(self.params_file.exists())
+
+    def test_weaker_parameters_need_the_flag(self):
+        self.tune(500.0, target_ms=100.0, allow_weaker=True)
+        self.assertTrue(self.params_file.exists())
+
+
+# e.g. DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3; mirrors default under test
+HAS_REPLICA = 'replica_0' in settings.DATABASES
+
+
+@skipUnless(HAS_REPLICA, 'set DATABASE_REPLICA_URLS to test replica routing')
+@override_settings(DB_ROUTING={'REPLICAS': ['replica_0'], 'STICKY_SECONDS': 15})
+class ReplicaRoutingTests(TestCase):
+    """Opted-in reads go to a replica unless the request wrote recently"""
+
+    databases = {'default', 'replica_0'} if HAS_REPLICA else {'default'}
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        patcher = mock.patch.object(router, 'routers', [self.router])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_request(self, view, method='get', cookies=None):
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinningMiddleware(view)(request)
+
+    def read_alias(self):
+        with replica_reads():
+            return self.router.db_for_read(User)
+
+    def reader(self, seen):
+        def view(request):
+            seen.append(self.read_alias())
+            return HttpResponse()
+        return view
+
+    def test_reads_go_to_the_replica_only_when_opted_in(self):
+        def view(request):
+            list(User.objects.all())
+            with replica_reads():
+                list(User.objects.all())
+            return HttpResponse()
+
+        with CaptureQueriesContext(connections['replica_0']) as replica_queries:
+            response = self.run_request(view)
+        self.assertEqual(len(replica_queries), 1)
+        self.assertNotIn('dbpin', response.cookies)
+
+    def test_write_pins_the_rest_of_the_request_and_sets_the_cookie(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.read_alias())
+            # What every save(), update() or delete() asks the router
+            self.router.db_for_write(User)
+            seen.append(self.read_alias())
+            return HttpResponse()
+
+        response = self.run_request(view)
+        self.assertEqual(seen, ['replica_0', DEFAULT_DB_ALIAS])
+        self.assertEqual(response.cookies['dbpin']['max-age'], 15)
+
+        # The pin does not leak into the next request without the cookie
+        self.run_request(self.reader(seen))
+        self.assertEqual(seen[-1], 'replica_0')
+
+    def test_unsafe_method_sets_the_cookie(self):
+        response = self.run_request(self.reader([]), method='post')
+        self.assertIn('dbpin', response.cookies)
+
+    def test_cookie_pins_the_next_request(self):
+        seen = []
+        response = self.run_request(self.reader(seen), cookies={'dbpin': '1'})
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS])
+        self.assertNotIn('dbpin', response.cookies)
+
+    def test_unhealthy_replica_falls_back_to_the_primary(self):
+        seen = []
+        with mock.patch.object(self.router.health, 'measure_lag', return_value=60.0):
+            self.run_request(self.reader(seen))
+
+        self.router = ReplicaRouter()
+        with mock.patch.object(self.router.health, 'measure_lag', side_effect=OSError('replica down')):
+            self.run_request(self.reader(seen))
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS])
+
+    def test_migrations_skip_replicas(self):
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'authentication'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'authentication'))
@@ -1,20 +1,26 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'authentication'
 
+# Signup, login and OTP views come in a sync and an async flavour;
+# ASGI deployments turn on ASYNC_AUTH_VIEWS to skip the thread hops
+auth_views = async_views if getattr(settings, 'ASYNC_AUTH_VIEWS', False) else views
+
 urlpatterns = [
     # Main Pages
     path("join/", views.join, name="join"),
-    path("signup/", views.signup_view, name="signup"),
-    path("login/", views.login_view, name="login"),
+    path("signup/", auth_views.signup_view, name="signup"),
+    path("login/", auth_views.login_view, name="login"),
     path("logout/", views.logout_view, name="logout"),
+    path("check-availability/", views.check_availability_view, name="check_availability"),
 
     # Email verification
     path("verify-email/<uuid:token>/", views.verify_email_view, name="verify_email"),
 
-    path("verify-otp/", views.verify_otp_view, name="verify_otp"),
-    path("resend-otp/", views.resend_otp_view, name="resend_otp"),
+    path("verify-otp/", auth_views.verify_otp_view, name="verify_otp"),
+    path("resend-otp/", auth_views.resend_otp_view, name="resend_otp"),
 
     # Password reset
     path("reset-password/", views.password_reset_request_view, name="password_reset_request"),
@@ -0,0 +1,129 @@
+# authentication/user_agents.py
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+from django.conf import settings
+
+
+DEFAULT_USER_AGENTS = {
+    'CACHE_SIZE': 4096,  # distinct User-Agent strings remembered per process
+    'MAX_LENGTH': 500,  # longer headers are classified by their first 500 characters
+}
+
+
+def get_user_agent_settings():
+    """Merge USER_AGENTS from settings over the defaults"""
+    options = dict(DEFAULT_USER_AGENTS)
+    options.update(getattr(settings, 'USER_AGENTS', {}))
+    return options
+
+
+UserAgentInfo = namedtuple('UserAgentInfo', ['device', 'os', 'browser'])
+
+# ============================
+# RULES
+# ============================
+
+# (class, any of these tokens, none of these tokens) in priority order;
+# the first rule that matches wins. Tokens are matched in the lowercased
+# header, anywhere, except "cros" which needs a delimiter after it.
+DEVICE_RULES = [
+    ('bot', {'bot/', 'crawl', 'spider', 'slurp', 'headless', 'facebookexternalhit', 'curl/', 'python-requests'}, ()),
+    # Before mobile: tablets also say "android"; Android phones add "Mobile"
+    ('tablet', {'ipad', 'tablet', 'kindle', 'silk/', 'playbook'}, ()),
+    ('tablet', {'android'}, {'mobi', 'windows phone'}),
+    ('mobile', {'mobi', 'iphone', 'ipod', 'android', 'windows phone', 'blackberry', 'bb10', 'opera mini'}, ()),
+]
+
+OS_RULES = [
+    ('Windows Phone', {'windows phone'}, ()),
+    ('Windows', {'windows'}, ()),
+    ('iOS', {'iphone', 'ipad', 'ipod'}, ()),
+    ('Android', {'android'}, ()),
+    ('Chrome OS', {'cros;', 'cros '}, ()),
+    ('macOS', {'mac os x', 'macintosh'}, ()),
+    ('Linux', {'linux', 'x11'}, ()),
+]
+
+BROWSER_RULES = [
+    ('Edge', {'edg/', 'edge/', 'edga/', 'edgios/'}, ()),
+    ('Opera', {'opr/', 'opera', 'opera mini'}, ()),
+    ('Samsung Internet', {'samsungbrowser/'}, ()),
+    ('Firefox', {'firefox/', 'fxios/'}, ()),
+    ('Chrome', {'crios/', 'chrome/'}, ()),
+    ('Safari', {'safari/'}, ()),
+    ('Internet Explorer', {'msie ', 'trident/'}, ()),
+]
+
+
+def compile_tokens(words):
+    """
+    Compile literal tokens into one regex shaped like a trie.
+    Alternatives that share a prefix are factored together, so at each
+    position the engine compares one character per branch instead of
+    trying every token; a single findall() pass collects all tokens for
+    the device, OS and browser rules at once.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        group = '(?:' + '|'.join(branches) + ')' if len(branches) > 1 else branches[0]
+        # A word ends here too: the rest is optional (longest match wins)
+        if '' in node:
+            return '(?:' + group + ')?'
+        return group
+
+    return re.compile(build(trie))
+
+
+_TOKENS_RE = compile_tokens(
+    {token for rules in (DEVICE_RULES, OS_RULES, BROWSER_RULES) for _, tokens, _ in rules for token in tokens}
+)
+
+
+def _first(rules, found, default):
+    for name, any_of, none_of in rules:
+        if not found.isdisjoint(any_of) and found.isdisjoint(none_of):
+            return name
+    return default
+
+
+def classify_user_agent(user_agent):
+    """Classify a User-Agent string without caching"""
+    found = set(_TOKENS_RE.findall(user_agent.lower()))
+    return UserAgentInfo(
+        device=_first(DEVICE_RULES, found, 'desktop'),
+        os=_first(OS_RULES, found, 'Other'),
+        browser=_first(BROWSER_RULES, found, 'Other'),
+    )
+
+
+_options = get_user_agent_settings()
+_classify_cached = lru_cache(maxsize=_options['CACHE_SIZE'])(classify_user_agent)
+
+
+def parse_user_agent(user_agent):
+    """
+    Return UserAgentInfo(device, os, browser) for a User-Agent header.
+    A handful of strings make up most traffic, so results are kept in a
+    bounded LRU keyed by the (truncated) raw header.
+    """
+    return _classify_cached((user_agent or '')[:_options['MAX_LENGTH']])
+
+
+def user_agent_cache_info():
+    """lru_cache statistics for the parse_user_agent() cache"""
+    return _classify_cached.cache_info()
+
+
+def clear_user_agent_cache():
+    _classify_cached.cache_clear()
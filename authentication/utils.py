@@ -1,15 +1,18 @@
 # authentication/utils.py
 
-import random
+import hmac
 import secrets
-import hashlib
-from datetime import timedelta
-from django.utils import timezone
+import time
 from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.template.loader import render_to_string
+from django.core import signing
+from django.utils.crypto import salted_hmac
 from django.utils.html import strip_tags
+from .client_ip import resolve_client_ip
+from .email_rendering import render_email
+from .otp_store import OTP_EXPIRED, OTP_INVALID, OTP_LOCKED, OTP_VALID, get_otp_store, get_otp_store_settings
+from .user_agents import parse_user_agent
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,13 +21,12 @@ user = get_user_model()
 
 
 def get_client_ip(request):
-    """Get the client's IP address from the request"""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    """
+    Get the client's IP address from the request.
+    X-Forwarded-For is only honoured behind the proxies listed in
+    settings.CLIENT_IP['TRUSTED_PROXIES'] (see authentication/client_ip.py).
+    """
+    return resolve_client_ip(request)
 
 
 def get_user_agent(request):
@@ -35,49 +37,218 @@ def get_user_agent(request):
 # OTP FUNCTIONS
 # ============================
 
+OTP_LENGTH = 6
+
+
 def generate_otp():
-    """Generate a 6 digit OTP"""
-    return ''.join([str(random.randint(0, 9)) for _ in range(6)])
+    """Generate a 6 digit OTP from the OS CSPRNG"""
+    return f'{secrets.randbelow(10 ** OTP_LENGTH):0{OTP_LENGTH}d}'
 
-def hash_otp(otp):
-    """Hash OTP for secure storage"""
-    return hashlib.sha256(otp.encode()).hexdigest()
+def hash_otp(user_id, otp):
+    """
+    HMAC the OTP with a key derived from SECRET_KEY, bound to the user.
+    Six digits are trivial to brute force from a plain hash; without the
+    server key a leaked OTP store entry is useless.
+    """
+    return salted_hmac('authentication.otp', f'{user_id}:{otp}', algorithm='sha256').hexdigest()
 
-def verify_otp(user, entered_otp):
-    """Verify if entered OTP matches stored hash"""
-    if not user.otp_code or not entered_otp:
-        return False
+def is_well_formed_otp(otp):
+    """True if otp could be a code we issued (ASCII digits, right length)"""
+    return len(otp) == OTP_LENGTH and otp.isascii() and otp.isdigit()
+
+def issue_otp(user):
+    """
+    Generate an OTP for user and keep its hash in the OTP store.
+    Returns (code, challenge); the challenge goes in the session.
+    """
+    otp = generate_otp()
+    code_hash = hash_otp(user.pk, otp)
+    get_otp_store().issue(user.pk, code_hash)
+    return otp, dump_otp_challenge(_new_challenge(user, code_hash))
+
+async def aissue_otp(user):
+    """Async issue_otp()"""
+    otp = generate_otp()
+    code_hash = hash_otp(user.pk, otp)
+    await get_otp_store().aissue(user.pk, code_hash)
+    return otp, dump_otp_challenge(_new_challenge(user, code_hash))
+
+def verify_otp(challenge, entered_otp):
+    """
+    Check entered OTP against a loaded challenge; returns an OTP_* result.
+    Expired, malformed and over-budget guesses are answered from the
+    challenge alone. Other guesses are counted in the OTP store, which
+    every worker shares, and a correct code is consumed there. Nothing
+    reads the users table. Updates challenge['n'] on a failed attempt.
+    """
+    early = _precheck(challenge, entered_otp)
+    if early:
+        return early
+
+    store = get_otp_store()
+    code_hash = hash_otp(challenge['uid'], entered_otp)
+    if hmac.compare_digest(code_hash, challenge['mac']):
+        result = store.check(challenge['uid'], code_hash)
+    else:
+        result = store.record_attempt(challenge['uid'])
+    return _count_attempt(challenge, result)
+
+async def averify_otp(challenge, entered_otp):
+    """Async verify_otp()"""
+    early = _precheck(challenge, entered_otp)
+    if early:
+        return early
+
+    store = get_otp_store()
+    code_hash = hash_otp(challenge['uid'], entered_otp)
+    if hmac.compare_digest(code_hash, challenge['mac']):
+        result = await store.acheck(challenge['uid'], code_hash)
+    else:
+        result = await store.arecord_attempt(challenge['uid'])
+    return _count_attempt(challenge, result)
+
+def _precheck(challenge, entered_otp):
+    if challenge['exp'] < time.time():
+        return OTP_EXPIRED
+    if not is_well_formed_otp(entered_otp):
+        # Can't match, so it doesn't use up an attempt either
+        return OTP_INVALID
+    if challenge['n'] >= get_otp_store().max_attempts:
+        return OTP_LOCKED
+    return None
+
+def _count_attempt(challenge, result):
+    if result == OTP_LOCKED:
+        challenge['n'] = get_otp_store().max_attempts
+    elif result != OTP_VALID:
+        challenge['n'] += 1
+    return result
+
+# ============================
+# OTP CHALLENGE
+# ============================
+
+# The pending login lives in the session as one signed token:
+#   uid    user id
+#   email  shown on the verification page
+#   mac    hash_otp() of the code that was sent
+#   exp    unix time the code expires
+#   n      failed attempts so far
+# so the OTP page can be shown and most bad guesses rejected without
+# loading the user.
+
+OTP_CHALLENGE_SALT = 'authentication.otp_challenge'
+
+
+def _new_challenge(user, code_hash):
+    return {
+        'uid': str(user.pk),
+        'email': user.email,
+        'mac': code_hash,
+        'exp': int(time.time()) + get_otp_store().ttl,
+        'n': 0,
+    }
+
+def dump_otp_challenge(challenge):
+    """Sign a challenge dict for the session"""
+    return signing.dumps(challenge, salt=OTP_CHALLENGE_SALT)
+
+def load_otp_challenge(token):
+    """Return the challenge dict from a session token, or None if missing or tampered with"""
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=OTP_CHALLENGE_SALT)
+    except signing.BadSignature:
+        return None
+
+def send_email(subject, html_message, recipient, plain_message=None):
+    """
+    Deliver a transactional email
+    With EMAIL_QUEUE enabled the message is stored for the sender workers
+    (see authentication/mail_queue.py) and the queued OutboundEmail is
+    returned; otherwise it is sent inline and True is returned.
+    Raises on failure.
+    """
+    from .mail_queue import get_email_queue_settings, queue_email
+
+    if plain_message is None:
+        plain_message = strip_tags(html_message)
+
+    if get_email_queue_settings()['ENABLED']:
+        return queue_email(
+            subject=subject,
+            body=plain_message,
+            html_body=html_message,
+            to_email=recipient,
+        )
+
+    send_mail(
+        subject=subject,
+        message=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[recipient],
+        html_message=html_message,
+        fail_silently=False,
+    )
+    return True
+
+
+async def asend_email(subject, html_message, recipient, plain_message=None):
+    """Async send_email(): the queue insert or the SMTP exchange never blocks the event loop"""
+    from django.core.mail import EmailMultiAlternatives
+    from .mail_backends import asend_message
+    from .mail_queue import aqueue_email, get_email_queue_settings
+
+    if plain_message is None:
+        plain_message = strip_tags(html_message)
+
+    if get_email_queue_settings()['ENABLED']:
+        return await aqueue_email(
+            subject=subject,
+            body=plain_message,
+            html_body=html_message,
+            to_email=recipient,
+        )
+
+    message = EmailMultiAlternatives(subject, plain_message, settings.DEFAULT_FROM_EMAIL, [recipient])
+    message.attach_alternative(html_message, 'text/html')
+    await asend_message(message)
+    return True
 
-    # Check if OTP has expired
-    if user.otp_expires_at and timezone.now() > user.otp_expires_at:
-        return False
-    
-    # Verify hash
-    entered_hash = hash_otp(entered_otp)
-    return user.otp_code == entered_hash
 
 def send_otp_email(user, otp):
     """Send OTP code to user's email"""
     try:
         subject = 'Your Roblox Login Code'
-        html_message = render_to_string('authentication/emails/otp_email.html', {
-            'user': user,
-            'otp': otp,
-            'valid_minutes': 10,
-        })
-        plain_message = strip_tags(html_message)
+        html_message, plain_message = render_email(
+            'authentication/emails/otp_email.html',
+            {'user': user, 'otp': otp},
+            static_context={'valid_minutes': get_otp_store_settings()['TTL'] // 60},
+        )
 
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
+        result = send_email(subject, html_message, user.email, plain_message)
+
+        logger.info(f"OTP email queued for {user.email}")
+        return result
+    except Exception as e:
+        logger.error(f"Failed to send OTP email to {user.email}: {str(e)}")
+        return False
+
+
+async def asend_otp_email(user, otp):
+    """Async send_otp_email()"""
+    try:
+        html_message, plain_message = render_email(
+            'authentication/emails/otp_email.html',
+            {'user': user, 'otp': otp},
+            static_context={'valid_minutes': get_otp_store_settings()['TTL'] // 60},
         )
 
-        logger.info(f"OTP email sent to {user.email}")
-        return True
+        result = await asend_email('Your Roblox Login Code', html_message, user.email, plain_message)
+
+        logger.info(f"OTP email queued for {user.email}")
+        return result
     except Exception as e:
         logger.error(f"Failed to send OTP email to {user.email}: {str(e)}")
         return False
@@ -92,23 +263,34 @@ def send_verification_email(user, verification_token):
         verification_url = f"{settings.SITE_URL}/auth/verify-email/{verification_token}/"
 
         subject = 'Welcome to Roblox - Verify Your Email'
-        html_message = render_to_string('authentication/emails/verify_email.html', {
-            'user': user,
-            'verification_url': verification_url,
-        })
-        plain_message = strip_tags(html_message)
+        html_message, plain_message = render_email(
+            'authentication/emails/verify_email.html',
+            {'user': user, 'verification_url': verification_url},
+        )
 
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
+        result = send_email(subject, html_message, user.email, plain_message)
+
+        logger.info(f"Verification email queued for {user.email}")
+        return result
+    except Exception as e:
+        logger.error(f"Failed to send verification email to {user.email}: {str(e)}")
+        return False
+
+
+async def asend_verification_email(user, verification_token):
+    """Async send_verification_email()"""
+    try:
+        verification_url = f"{settings.SITE_URL}/auth/verify-email/{verification_token}/"
+
+        html_message, plain_message = render_email(
+            'authentication/emails/verify_email.html',
+            {'user': user, 'verification_url': verification_url},
         )
 
-        logger.info(f"Verification email sent to {user.email}")
-        return True
+        result = await asend_email('Welcome to Roblox - Verify Your Email', html_message, user.email, plain_message)
+
+        logger.info(f"Verification email queued for {user.email}")
+        return result
     except Exception as e:
         logger.error(f"Failed to send verification email to {user.email}: {str(e)}")
         return False
@@ -123,23 +305,16 @@ def send_password_reset_email(user, reset_token):
         reset_url = f"{settings.SITE_URL}/auth/reset-password/{reset_token}/"
 
         subject = 'Reset Your Roblox Password'
-        html_message = render_to_string('authentication/emails/reset_password.html', {
-            'user': user,
-            'reset_url': reset_url,
-        })
-        plain_message = strip_tags(html_message)
-
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
+        html_message, plain_message = render_email(
+            'authentication/emails/reset_password.html',
+            {'user': user, 'reset_url': reset_url},
+            static_context={'domain': settings.SITE_URL},
         )
 
-        logger.info(f"Password reset email sent to {user.email}")
-        return True
+        result = send_email(subject, html_message, user.email, plain_message)
+
+        logger.info(f"Password reset email queued for {user.email}")
+        return result
     except Exception as e:
         logger.error(f"Failed to send password reset email to {user.email}: {str(e)}")
         return False
@@ -148,45 +323,169 @@ def send_password_reset_email(user, reset_token):
 # RATE LIMITING
 # ============================
 
-def check_rate_limit(ip_address, username_or_email, limit=5, window_minutes=15):
+def check_rate_limit(ip_address, username_or_email, limit=None, window_minutes=None):
     """
-    Check if login attempts from this IP or for this user exceed the limit
+    Check if failed login attempts from this IP or for this user exceed the limit
+    Counters live in the rate limit backend (see authentication/ratelimit.py),
+    so this never queries the login_attempts table. limit and window_minutes
+    default to settings.RATE_LIMIT.
     Returns (is_limited, attemts_count)
     """
-    from .models import LoginAttempt
+    from .ratelimit import get_rate_limiter, ip_key, identity_key
+
+    limiter = get_rate_limiter(window_minutes=window_minutes, limit=limit)
+
+    try:
+        ip_attempts = limiter.count(ip_key(ip_address))
+        user_attempts = limiter.count(identity_key(username_or_email))
+    except Exception as e:
+        # Fail open: a broken cache must not lock everyone out
+        logger.error(f"Rate limit backend error: {str(e)}")
+        return False, 0
+
+    max_attempts = max(ip_attempts, user_attempts)
+
+    return max_attempts >= limiter.limit, max_attempts
+
+
+def record_failed_login(ip_address, username_or_email, window_minutes=None):
+    """Count a failed login against both the IP and the username/email"""
+    from .ratelimit import get_rate_limiter, ip_key, identity_key
+
+    limiter = get_rate_limiter(window_minutes=window_minutes)
+
+    try:
+        limiter.hit(ip_key(ip_address))
+        limiter.hit(identity_key(username_or_email))
+    except Exception as e:
+        logger.error(f"Rate limit backend error: {str(e)}")
 
-    cutoff_time = timezone.now() - timedelta(minutes=window_minutes)
 
-    # Check IP-based attempts
-    ip_attempts = LoginAttempt.objects.filter(
-        ip_address=ip_address,
-        attempted_at__gte=cutoff_time,
-        success=False
-    ).count()
+async def acheck_rate_limit(ip_address, username_or_email, limit=None, window_minutes=None):
+    """Async check_rate_limit(); a shared cache is awaited instead of blocking the event loop"""
+    from .ratelimit import get_rate_limiter, ip_key, identity_key
 
-    # Check user-based attempts
-    user_attempts = LoginAttempt.objects.filter(
-        username_or_email=username_or_email,
-        attempted_at__gte=cutoff_time,
-        success=False
-    ).count()
+    limiter = get_rate_limiter(window_minutes=window_minutes, limit=limit)
+
+    try:
+        ip_attempts = await limiter.acount(ip_key(ip_address))
+        user_attempts = await limiter.acount(identity_key(username_or_email))
+    except Exception as e:
+        logger.error(f"Rate limit backend error: {str(e)}")
+        return False, 0
 
     max_attempts = max(ip_attempts, user_attempts)
 
-    return max_attempts >= limit, max_attempts
+    return max_attempts >= limiter.limit, max_attempts
+
+
+async def arecord_failed_login(ip_address, username_or_email, window_minutes=None):
+    """Async record_failed_login()"""
+    from .ratelimit import get_rate_limiter, ip_key, identity_key
+
+    limiter = get_rate_limiter(window_minutes=window_minutes)
+
+    try:
+        await limiter.ahit(ip_key(ip_address))
+        await limiter.ahit(identity_key(username_or_email))
+    except Exception as e:
+        logger.error(f"Rate limit backend error: {str(e)}")
+
+
+def _otp_resend_limiter():
+    from .otp_store import get_otp_store_settings
+    from .ratelimit import get_rate_limiter
+
+    options = get_otp_store_settings()
+    return get_rate_limiter(window_minutes=options['RESEND_WINDOW_MINUTES'], limit=options['RESEND_LIMIT'])
+
+
+def allow_otp_resend(ip_address, user_id):
+    """
+    Count one code resend against the user and the IP.
+    Returns False once either has used up OTP_STORE RESEND_LIMIT.
+    """
+    from .ratelimit import ip_key
+
+    limiter = _otp_resend_limiter()
+    keys = (f"otp-resend:user:{user_id}", f"otp-resend:{ip_key(ip_address)}")
+
+    try:
+        if any(limiter.is_limited(key) for key in keys):
+            return False
+        for key in keys:
+            limiter.hit(key)
+    except Exception as e:
+        logger.error(f"Rate limit backend error: {str(e)}")
+    return True
+
+
+async def aallow_otp_resend(ip_address, user_id):
+    """Async allow_otp_resend()"""
+    from .ratelimit import ip_key
+
+    limiter = _otp_resend_limiter()
+    keys = (f"otp-resend:user:{user_id}", f"otp-resend:{ip_key(ip_address)}")
+
+    try:
+        for key in keys:
+            if await limiter.ais_limited(key):
+                return False
+        for key in keys:
+            await limiter.ahit(key)
+    except Exception as e:
+        logger.error(f"Rate limit backend error: {str(e)}")
+    return True
 
 
 def log_login_attempt(username_or_email, ip_address, user_agent, success):
-    """Log a login attempt for security tracking"""
+    """
+    Log a login attempt for security tracking
+    Rows are buffered and bulk inserted by the audit writer (see
+    authentication/audit.py) unless LOGIN_AUDIT['ENABLED'] is off.
+    """
+    from .audit import get_login_audit_settings, get_login_attempt_writer
     from .models import LoginAttempt
 
+    if not success:
+        record_failed_login(ip_address, username_or_email)
+
+    fields = {
+        'username_or_email': username_or_email,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'success': success,
+    }
+
     try:
-        LoginAttempt.objects.create(
-            username_or_email=username_or_email,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            success=success
-        )
+        if get_login_audit_settings()['ENABLED']:
+            get_login_attempt_writer().enqueue(**fields)
+        else:
+            LoginAttempt.objects.create(**fields)
+    except Exception as e:
+        logger.error(f"Failed to log login attempt: {str(e)}")
+
+
+async def alog_login_attempt(username_or_email, ip_address, user_agent, success):
+    """Async log_login_attempt(); the audit writer queue never blocks, the fallback insert is awaited"""
+    from .audit import get_login_audit_settings, get_login_attempt_writer
+    from .models import LoginAttempt
+
+    if not success:
+        await arecord_failed_login(ip_address, username_or_email)
+
+    fields = {
+        'username_or_email': username_or_email,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'success': success,
+    }
+
+    try:
+        if get_login_audit_settings()['ENABLED']:
+            get_login_attempt_writer().enqueue(**fields)
+        else:
+            await LoginAttempt.objects.acreate(**fields)
     except Exception as e:
         logger.error(f"Failed to log login attempt: {str(e)}")
 
@@ -195,40 +494,88 @@ def log_login_attempt(username_or_email, ip_address, user_agent, success):
 # ============================
 
 def create_user_session(request, user):
-    """Create a tracked session for the user"""
+    """
+    Create a tracked session for the user
+    Recorded by the session activity tracker (see
+    authentication/session_activity.py) and written with its next batch,
+    which also retires the user's older sessions, unless
+    SESSION_ACTIVITY['ENABLED'] is off.
+    """
     from .models import UserSession
+    from .session_activity import get_session_activity_settings, get_session_activity_tracker
+
+    fields = {
+        'ip_address': get_client_ip(request),
+        'user_agent': get_user_agent(request),
+        'device_type': detect_device_type(request),
+    }
 
     try:
-        # Deactivate old sessions
-        UserSession.objects.filter(user=user, is_active=True).update(is_active=False)
+        if get_session_activity_settings()['ENABLED']:
+            get_session_activity_tracker().start(request.session.session_key, user.pk, **fields)
+        else:
+            # Deactivate old sessions
+            UserSession.objects.filter(user=user, is_active=True).update(is_active=False)
+
+            # Create new session
+            UserSession.objects.create(
+                user=user,
+                session_key=request.session.session_key,
+                is_active=True,
+                **fields
+            )
 
-        # Create new session
-        session = UserSession.objects.create(
-            user=user,
-            session_key=request.session.session_key,
-            ip_address=get_client_ip(request),
-            user_agent=get_user_agent(request),
-            device_type=detect_device_type(request),
-            is_active=True
-        )
+        logger.info(f"Created session for user {user.username}")
+    except Exception as e:
+        logger.error(f"Failed to create user session: {str(e)}")
+
+
+async def acreate_user_session(request, user):
+    """Async create_user_session(); the tracker never blocks, the fallback writes are awaited"""
+    from .models import UserSession
+    from .session_activity import get_session_activity_settings, get_session_activity_tracker
+
+    fields = {
+        'ip_address': get_client_ip(request),
+        'user_agent': get_user_agent(request),
+        'device_type': detect_device_type(request),
+    }
+
+    try:
+        if get_session_activity_settings()['ENABLED']:
+            get_session_activity_tracker().start(request.session.session_key, user.pk, **fields)
+        else:
+            await UserSession.objects.filter(user=user, is_active=True).aupdate(is_active=False)
+
+            await UserSession.objects.acreate(
+                user=user,
+                session_key=request.session.session_key,
+                is_active=True,
+                **fields
+            )
 
         logger.info(f"Created session for user {user.username}")
-        return session
     except Exception as e:
         logger.error(f"Failed to create user session: {str(e)}")
-        return None
 
 
-def detect_device_type(request):
-    """Detect device type from user agent"""
-    user_agent = request.META.get('HTTP_USER_AGENT', '').lower()
+def end_user_sessions(user):
+    """Deactivate the user's tracked sessions on logout"""
+    from .models import UserSession
+    from .session_activity import get_session_activity_settings, get_session_activity_tracker
 
-    if 'mobile' in user_agent or 'android' in user_agent or 'iphone' in user_agent:
-        return 'mobile'
-    elif 'tablet' in user_agent or 'ipad' in user_agent:
-        return 'tablet'
-    else:
-        return 'desktop'
+    try:
+        if get_session_activity_settings()['ENABLED']:
+            get_session_activity_tracker().end(user.pk)
+        else:
+            UserSession.objects.filter(user=user, is_active=True).update(is_active=False)
+    except Exception as e:
+        logger.error(f"Failed to end user sessions: {str(e)}")
+
+
+def detect_device_type(request):
+    """Detect device type (desktop, mobile, tablet or bot) from user agent"""
+    return parse_user_agent(request.META.get('HTTP_USER_AGENT', '')).device
 
 # ============================
 # INPUT SANITIZATION
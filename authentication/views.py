@@ -1,19 +1,27 @@
 # authentication/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, logout, authenticate, get_user_model
+from django.contrib.auth import login, logout, get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
 from django.views.decorators.cache import never_cache
 from django.views.decorators.http import require_http_methods
-from datetime import timedelta
 import logging
 
 from .forms import SignupForm, LoginForm, PasswordResetRequestForm, PasswordResetConfirmationForm
-from .models import EmailVerification, PasswordResetToken, LoginAttempt
+from .models import EmailVerification, PasswordResetToken, LoginAttempt, OutboundEmail
+from .mail_queue import get_email_status, queued_email_id
+from .page_cache import cached_page
+from .identity import authenticate_user
+from .hashing import HashingOverloaded, apply_pending_rehash, pending_rehash, set_user_password
+from .availability import get_availability_check_settings, is_available, normalize_identifier
+from .otp_store import OTP_EXPIRED, OTP_LOCKED, OTP_VALID
 from .utils import (
-    send_verification_email, send_password_reset_email, send_otp_email,check_rate_limit, log_login_attempt, create_user_session, get_client_ip, get_user_agent, generate_otp, hash_otp, verify_otp, sanitize_username, sanitize_email
+    send_verification_email, send_password_reset_email, send_otp_email,check_rate_limit, log_login_attempt, create_user_session, end_user_sessions, get_client_ip, get_user_agent, issue_otp, verify_otp, allow_otp_resend, load_otp_challenge, dump_otp_challenge, sanitize_username, sanitize_email
 )
 
 logger = logging.getLogger(__name__)
@@ -63,6 +71,17 @@ def signup_view(request):
 
                 return redirect('authentication:join')
             
+            except HashingOverloaded:
+                # Let HashingOverloadMiddleware answer with a 429
+                raise
+            except IntegrityError as e:
+                # A concurrent signup claimed the name after validation; the unique index caught it
+                logger.info(f"Signup lost a uniqueness race: {str(e)}")
+                messages.error(
+                    request,
+                    'This username or email is already taken',
+                    extra_tags='error'
+                )
             except Exception as e:
                 logger.error(f"Signup error: {str(e)}")
                 messages.error(
@@ -81,6 +100,59 @@ def signup_view(request):
     
     return render(request, 'authentication/auth.html', {'form': form})
 
+# ============================
+# AVAILABILITY CHECK
+# ============================
+
+@require_http_methods(["GET"])
+def check_availability_view(request):
+    """
+    Live signup feedback: GET ?username=... or ?email=...
+    Returns {"field", "value", "available", "message"}. Never touches the
+    session, answers from the availability filter or a cached result when
+    it can, and is rate limited per IP. Only "taken" answers may be cached
+    downstream; "available" is always rechecked.
+    """
+    from .ratelimit import get_rate_limiter, ip_key
+
+    options = get_availability_check_settings()
+
+    field = 'username' if 'username' in request.GET else 'email' if 'email' in request.GET else None
+    if field is None:
+        return JsonResponse({'message': 'Pass a username or email parameter.'}, status=400)
+
+    limiter = get_rate_limiter(window_minutes=options['RATE_WINDOW_MINUTES'], limit=options['RATE_LIMIT'])
+    key = f"availability:{ip_key(get_client_ip(request))}"
+    try:
+        if limiter.is_limited(key):
+            response = JsonResponse({'message': 'Too many checks. Please slow down.'}, status=429)
+            response['Retry-After'] = str(options['RATE_WINDOW_MINUTES'] * 60)
+            return response
+        limiter.hit(key)
+    except Exception as e:
+        # Fail open, like the login limiter
+        logger.error(f"Rate limit backend error: {str(e)}")
+
+    try:
+        value = normalize_identifier(field, request.GET[field])
+    except ValidationError as e:
+        return JsonResponse({'field': field, 'available': False, 'message': e.messages[0]}, status=400)
+
+    available = is_available(field, value)
+    if available:
+        message = f'This {field} is available'
+    elif field == 'username':
+        message = 'This username is already taken'
+    else:
+        message = 'This email is already registered'
+
+    response = JsonResponse({'field': field, 'value': value, 'available': available, 'message': message})
+    if available:
+        patch_cache_control(response, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=options['MAX_AGE'])
+    return response
+
 # ============================
 # EMAIL VERIFICATION
 # ============================
@@ -162,17 +234,10 @@ def login_view(request):
                 return render(request, 'authentication/auth.html', {'form': form})
 
             # Try to authenticate
-            # Check if input is email or username
-            if '@' in username_or_email:
-                try:
-                    user_obj = User.objects.get(email=username_or_email)
-                    username = user_obj.username
-                except User.DoesNotExist:
-                    username = username_or_email
-            else:
-                username = username_or_email
-
-            user = authenticate(request, username=username, password=password)
+            # Username or email is resolved with one lookup and the same
+            # user object is used for the password check. An upgraded hash
+            # isn't saved here; it goes out with the login write after OTP
+            user = authenticate_user(request, username_or_email, password, save_rehash=False)
 
             # Log the attempt
             log_login_attempt(username_or_email, ip_address, user_agent, success=user is not None)
@@ -190,17 +255,19 @@ def login_view(request):
                     )
                     return render(request, 'authentication/auth.html', {'form': form})
 
-                # Generate and send OTP
-                otp = generate_otp()
-                user.otp_code = hash_otp(otp)
-                user.otp_expires_at = timezone.now() + timedelta(minutes=10)
-                user.save()
+                # Generate and send OTP; the code lives in the OTP store, not on the user row
+                otp, challenge = issue_otp(user)
 
                 # Send OTP email
-                if send_otp_email(user, otp):
-                    # Store user ID in session for OTP verification
-                    request.session['otp_user_id'] = str(user.id)
+                otp_email = send_otp_email(user, otp)
+                if otp_email:
+                    # Store the signed challenge in session for OTP verification
+                    request.session['otp_challenge'] = challenge
                     request.session['remember_me'] = remember_me
+                    request.session['otp_email_id'] = queued_email_id(otp_email)
+                    rehash = pending_rehash(user)
+                    if rehash:
+                        request.session['password_rehash'] = rehash
 
                     messages.info(
                         request,
@@ -231,61 +298,79 @@ def login_view(request):
 def verify_otp_view(request):
     """OTP verification view - Step 2"""
 
-    # Check if user came from login
-    user_id = request.session.get('otp_user_id')
-    if not user_id:
+    # Check if user came from login; everything up to a matching code
+    # is answered from this challenge and the OTP store, without a query
+    challenge = load_otp_challenge(request.session.get('otp_challenge'))
+    if challenge is None:
         messages.error(request, 'Please log in first.', extra_tags='error')
         return redirect('authentication:join')
 
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        messages.error(request, 'Invalid session.', extra_tags='error')
-        return redirect('authentication:join')
-    
     if request.method == 'POST':
         otp = request.POST.get('otp', '').strip()
 
         if not otp:
             messages.error(request, 'Please enter the verification code.', extra_tags='error')
-            return render(request, 'authentication/auth.html', {'user': user})
-        
-        # Verify OTP
-        if verify_otp(user, otp):
-            # Mark as OTP verified
+            return redirect('authentication:verify_otp')
+
+        # Verify OTP (a correct code is consumed by the store)
+        attempts = challenge['n']
+        result = verify_otp(challenge, otp)
+        if result != OTP_VALID:
+            if challenge['n'] != attempts:
+                request.session['otp_challenge'] = dump_otp_challenge(challenge)
+            if result == OTP_LOCKED:
+                messages.error(request, 'Too many incorrect codes. Please try again in a few minutes.', extra_tags='error')
+            elif result == OTP_EXPIRED:
+                messages.error(request, 'Verification code expired. Please request a new one.', extra_tags='error')
+            else:
+                messages.error(request, 'Invalid verification code.', extra_tags='error')
+            return redirect('authentication:verify_otp')
+
+        # The code matched: load the user to log them in
+        try:
+            user = User.objects.get(id=challenge['uid'])
+        except User.DoesNotExist:
+            messages.error(request, 'Invalid session.', extra_tags='error')
+            return redirect('authentication:join')
+
+        # An upgraded hash from the login step and otp_verified (only set
+        # the first time) go out in login()'s last_login UPDATE
+        apply_pending_rehash(user, request.session.pop('password_rehash', None))
+        if not user.otp_verified:
             user.otp_verified = True
-            user.otp_code = None # Clear OTP
-            user.save()
 
-            # Log user in
-            login(request, user)
+        # Log user in
+        login(request, user)
 
-            # Create session tracking
-            create_user_session(request, user)
+        # Create session tracking
+        create_user_session(request, user)
 
-            # Handle remember me
-            remember_me = request.session.get('remember_me', False)
-            if remember_me:
-                request.session.set_expiry(30 * 24 * 60 * 60) # 30 days
-            else:
-                request.session.set_expiry(0)
+        # Handle remember me
+        remember_me = request.session.get('remember_me', False)
+        if remember_me:
+            request.session.set_expiry(30 * 24 * 60 * 60) # 30 days
+        else:
+            request.session.set_expiry(0)
 
-            # Clear session data
-            request.session.pop('otp_user_id', None)
-            request.session.pop('remember_me', None)
+        # Clear session data
+        request.session.pop('otp_challenge', None)
+        request.session.pop('remember_me', None)
+        request.session.pop('otp_email_id', None)
 
-            logger.info(f"User logged in with 2FA: {user.username}")
-            messages.success(request, f'Welcome back, {user.get_full_name}!', extra_tags='success')
+        logger.info(f"User logged in with 2FA: {user.username}")
+        messages.success(request, f'Welcome back, {user.get_full_name}!', extra_tags='success')
 
-            return redirect('authentication:games')
-        else:
-            # Check if expired
-            if user.otp_expires_at and timezone.now() > user.otp_expires_at:
-                messages.error(request, 'Verification code expired. Please request a new one.', extra_tags='error')
-            else:
-                messages.error(request, 'Invalid verification code.', extra_tags='error')
-    
-    return render(request, 'authentication/verify_otp.html', {'user': user})
+        return redirect('authentication:games')
+
+    # Let the user know early if the queued code could not be delivered
+    if get_email_status(request.session.get('otp_email_id')) == OutboundEmail.STATUS_FAILED:
+        messages.error(
+            request,
+            'We could not deliver your verification code. Please request a new one.',
+            extra_tags='error'
+        )
+
+    return render(request, 'authentication/verify_otp.html', {'otp_email': challenge['email']})
 
 # ============================
 # EMAIL VERIFICATION
@@ -295,22 +380,28 @@ def verify_otp_view(request):
 def resend_otp_view(request):
     """Resend OTP code"""
 
-    user_id = request.session.get('otp_user_id')
-    if not user_id:
+    challenge = load_otp_challenge(request.session.get('otp_challenge'))
+    if challenge is None:
         messages.error(request, 'Please log in first.', extra_tags='error')
         return redirect('authentication:join')
+
+    # Resent codes share one guess budget, but each one is still an email
+    if not allow_otp_resend(get_client_ip(request), challenge['uid']):
+        messages.error(request, 'Too many codes requested. Please wait a few minutes.', extra_tags='error')
+        return redirect('authentication:verify_otp')
     
     try:
-        user = User.objects.get(id=user_id)
+        # The email template needs the user
+        user = User.objects.get(id=challenge['uid'])
 
-        # Generate new OTP
-        otp = generate_otp()
-        user.otp_code = hash_otp(otp)
-        user.otp_expires_at = timezone.now() + timedelta(minutes=10)
-        user.save()
+        # Generate new OTP; replaces the pending one but keeps its attempt count
+        otp, challenge = issue_otp(user)
+        request.session['otp_challenge'] = challenge
 
         # Send OTP
-        if send_otp_email(user, otp):
+        otp_email = send_otp_email(user, otp)
+        if otp_email:
+            request.session['otp_email_id'] = queued_email_id(otp_email)
             messages.success(request, 'New code sent to your email.', extra_tags='success')
         else:
             messages.error(request, 'Failed to send code.', extra_tags='error')
@@ -415,7 +506,7 @@ def password_reset_confirm_view(request, token):
 
                 # Reset password
                 user = reset_token.user
-                user.set_password(password)
+                set_user_password(user, password)
                 user.save()
 
                 # Mark token as used
@@ -440,6 +531,8 @@ def password_reset_confirm_view(request, token):
 
         return render(request, 'authentication/password_reset_confirm.html', {'form': form})
     
+    except HashingOverloaded:
+        raise
     except Exception as e:
         logger.error(f"Password reset error: {str(e)}")
         messages.error(request, 'Invalid or expired reset link.', extra_tags='error')
@@ -457,11 +550,7 @@ def logout_view(request):
     username = request.user.username
 
     # Deactivate user sessions
-    from .models import UserSession
-    UserSession.objects.filter(
-        user=request.user,
-        is_active=True
-    ).update(is_active=False)
+    end_user_sessions(request.user)
 
     logout(request)
 
@@ -487,69 +576,89 @@ def join(request):
     """Main authentication page with tab switching"""
     return render(request, 'authentication/auth.html')
 
+@cached_page
 def games(request):
     return render(request, 'authentication/games.html')
 
+@cached_page
 def create(request):
     return render(request, 'authentication/create.html')
 
+@cached_page
 def robux(request):
     return render(request, 'authentication/robux.html')
 
+@cached_page
 def support(request):
     return render(request, 'authentication/support.html')
 
 # For About Roblox Section
 
+@cached_page
 def about(request):
     return render(request, 'authentication/about_roblox/about.html')
 
+@cached_page
 def career(request):
     return render(request, 'authentication/about_roblox/career.html')
 
+@cached_page
 def press(request):
     return render(request, 'authentication/about_roblox/press.html')
 
+@cached_page
 def investors(request):
     return render(request, 'authentication/about_roblox/investors.html')
 
 # For Help section
 
+@cached_page
 def customer_support(request):
     return render(request, 'authentication/help/customer_support.html')
 
+@cached_page
 def safety(request):
     return render(request, 'authentication/help/safety.html')
 
+@cached_page
 def report_abuse(request):
     return render(request, 'authentication/help/report_abuse.html')
 
+@cached_page
 def community_standards(request):
     return render(request, 'authentication/help/community_standards.html')
 
 # For Resources Section
 
+@cached_page
 def developer_hub(request):
     return render(request, 'authentication/resources/developer_hub.html')
 
+@cached_page
 def education(request):
     return render(request, 'authentication/resources/education.html')
 
+@cached_page
 def blog(request):
     return render(request, 'authentication/resources/blog.html')
 
+@cached_page
 def community(request):
     return render(request, 'authentication/resources/community.html')
 
 # For Legal Section
+@cached_page
 def term_of_use(request):
     return render(request, 'authentication/legal/term_of_use.html')
 
+@cached_page
 def privacy_policy(request):
     return render(request, 'authentication/legal/privacy_policy.html')
 
+@cached_page
 def cookie_policy(request):
     return render(request, 'authentication/legal/cookie_policy.html')
 
+@cached_page
 def license_view(request):
     return render(request, 'authentication/legal/license.html')
\ No newline at end of file
@@ -7,10 +7,31 @@ For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
 
+import asyncio
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'roblox_demo.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from authentication.availability import get_taken_identifiers  # noqa: E402
+from authentication.shutdown import run_shutdown_hooks  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Django's ASGI handler plus lifespan support to drain background writers"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Start building the username/email availability filter
+                get_taken_identifiers().start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.to_thread(run_shutdown_hooks)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    await django_application(scope, receive, send)
@@ -38,10 +38,11 @@ else:
         ALLOWED_HOSTS.append(RAILWAY_EXTERNAL_HOSTNAME)
 
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Pooled SMTP keeps authenticated TLS connections open between messages
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='authentication.mail_backends.PooledSMTPBackend')
 EMAIL_HOST = config('EMAIL_HOST')
-EMAIL_PORT = config('EMAIL_PORT')
-EMAIL_USE_TLS = config('EMAIL_USE_TLS')
+EMAIL_PORT = config('EMAIL_PORT', cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
@@ -51,6 +52,21 @@ DEFAULT_FROM_EMAIL = config(
     default=EMAIL_HOST_USER
 )
 
+# Used to build absolute links in emails
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
+
+# Email templates are precompiled (see authentication/email_rendering.py);
+# renders slower than this are logged
+EMAIL_RENDER_BUDGET_MS = 5
+
+EMAIL_POOL = {
+    'MAX_SIZE': 4,
+    'ACQUIRE_TIMEOUT': 10.0,
+    'HEALTH_CHECK_INTERVAL': 30.0,
+    'MAX_AGE': 300.0,
+    'MAX_MESSAGES': 100,
+}
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -66,12 +82,16 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'authentication.prerender.PrerenderedPageMiddleware',  # before sessions, see prerender_pages
+    'authentication.db_router.ReplicaPinningMiddleware',  # read-your-writes with replicas
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'authentication.session_activity.SessionActivityMiddleware',  # buffered last-seen tracking
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'authentication.hashing.HashingOverloadMiddleware',
 ]
 
 # FIXED: Less aggressive security headers for development
@@ -144,13 +164,26 @@ WSGI_APPLICATION = 'roblox_demo.wsgi.application'
 
 DATABASE_URL = config('DATABASE_URL', default=None)
 
+# Connection pooling (psycopg_pool, Django 5.1+). A pool replaces
+# persistent connections, so CONN_MAX_AGE must stay 0 while it is on.
+# Each process keeps MIN_SIZE connections open and never opens more than
+# MAX_SIZE; a request waits up to TIMEOUT seconds for a free one
+DB_POOL = config('DB_POOL', default='True') in ['True', 'true', '1', 'yes']
+DB_POOL_OPTIONS = {
+    'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+    'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+    'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+    'max_idle': 300,  # close connections idle for 5 minutes, down to min_size
+    'max_lifetime': 3600,  # recycle every connection after an hour
+}
+
 if DATABASE_URL:
     # Production - PostgreSQL from the HOST Platform
-    DATABASE = {
+    DATABASES = {
         'default': dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=600,
-            conn_health_checks=True,
+            conn_max_age=0 if DB_POOL else 600,
+            conn_health_checks=not DB_POOL,
         )
     }
     print("Using PostgreSQL (Production)")
@@ -167,6 +200,37 @@ else:
         }
     }
 
+# Read replicas, comma separated URLs (postgres://... or sqlite:///...).
+# Only reads wrapped in replica_reads() use them, see authentication/db_router.py
+DATABASE_REPLICA_URLS = [url.strip() for url in config('DATABASE_REPLICA_URLS', default='').split(',') if url.strip()]
+
+for i, url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASES[f'replica_{i}'] = dict(
+        dj_database_url.parse(url, conn_max_age=0 if DB_POOL else 600, conn_health_checks=not DB_POOL),
+        TEST={'MIRROR': 'default'},
+    )
+
+if DB_POOL:
+    for alias, database in DATABASES.items():
+        if database['ENGINE'] == 'django.db.backends.postgresql':
+            database.setdefault('OPTIONS', {})['pool'] = DB_POOL_OPTIONS
+
+DATABASE_ROUTERS = ['authentication.db_router.ReplicaRouter']
+
+DB_ROUTING = {
+    'REPLICAS': [f'replica_{i}' for i in range(len(DATABASE_REPLICA_URLS))],
+    'STICKY_SECONDS': config('DB_STICKY_SECONDS', default=15, cast=int),
+    'MAX_REPLICA_LAG': config('DB_MAX_REPLICA_LAG', default=5.0, cast=float),
+    'LAG_CHECK_INTERVAL': 10.0,
+}
+
+# Pool wait time and saturation, logged by authentication/db_pool.py
+DB_POOL_METRICS = {
+    'ENABLED': DB_POOL,
+    'INTERVAL': config('DB_POOL_METRICS_INTERVAL', default=60.0, cast=float),
+    'SATURATION_WARNING': 0.9,
+}
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -212,10 +276,22 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Output of `manage.py prerender_pages`
+PRERENDER_ROOT = BASE_DIR / 'prerendered'
+
 STATICFILES_DIRS = [
     BASE_DIR / "authentication/static"
 ]
 
+# Build output of `manage.py build_fontawesome` and `manage.py build_assets`;
+# the Font Awesome subset shadows the full fontawesome/ tree
+# (see authentication/fontawesome.py) and bundles/ holds the page bundles
+FONTAWESOME_BUILD_ROOT = BASE_DIR / 'build' / 'static'
+FONTAWESOME_EXTRA_ICONS = []  # icon names built dynamically in JS
+
+if FONTAWESOME_BUILD_ROOT.exists():
+    STATICFILES_DIRS.insert(0, FONTAWESOME_BUILD_ROOT)
+
 # White noise configuration
 # This is necessary because when I host this to get all the styles of pages
 if DEBUG:
@@ -224,10 +300,14 @@ if DEBUG:
 else:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFileStorage'
 
+# Hashed page bundles from `manage.py build_assets` (bundles/<page>.<hash>.css)
+# never change in place, so let WhiteNoise send far-future immutable headers
+WHITENOISE_IMMUTABLE_FILE_TEST = r'^.+\.[0-9a-f]{12}\..+$'
+
 # Static files finders
 STATICFILES_FINDERS = [
-    'django.contrib.staticfiles.finders.FileSystemFinder',
-    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'authentication.fontawesome.FileSystemFinder',
+    'authentication.fontawesome.AppDirectoriesFinder',
 ]
 
 # Media files (user uploads)
@@ -243,8 +323,159 @@ else:
 
 # Password hashes
 PASSWORD_HASHERS = [
-    'django.contrib.auth.hashers.Argon2PasswordHasher',  # Most secure
+    'authentication.hashers.TunedArgon2PasswordHasher',  # Most secure
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
     'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
-]
\ No newline at end of file
+]
+
+# Serve signup, login and OTP from authentication/async_views.py. Turn on
+# when running under ASGI (uvicorn/daphne); under WSGI every async view
+# would need its own event loop
+ASYNC_AUTH_VIEWS = config('ASYNC_AUTH_VIEWS', default='False') in ['True', 'true', '1', 'yes']
+
+# In-memory Bloom filter of taken usernames/emails (authentication/availability.py).
+# The availability endpoint and signup validation skip the database for names
+# that are certainly free; about 10 bits per key, so ~12 MB per
+# process for 5M users
+AVAILABILITY_FILTER = {
+    'ENABLED': config('AVAILABILITY_FILTER', default='True') in ['True', 'true', '1', 'yes'],
+    'ERROR_RATE': 0.01,
+    'REBUILD_INTERVAL': 600,
+    'CACHE_ALIAS': 'default',  # recent signups, shared by every worker
+}
+
+# GET /auth/check-availability/?username=... used by auth.js while typing
+AVAILABILITY_CHECK = {
+    'RATE_LIMIT': 30,  # per IP per minute
+    'RATE_WINDOW_MINUTES': 1,
+    'CACHE_SECONDS': 30,  # "taken" answers only
+    'MAX_AGE': 10,
+}
+
+# Argon2 cost tuned for this machine with `manage.py tune_argon2`, which
+# writes ARGON2_PARAMS_FILE; entries in ARGON2_PARAMS override the file.
+# Hashes made with other parameters are upgraded on the next login
+ARGON2_PARAMS_FILE = BASE_DIR / 'var' / 'argon2.json'
+ARGON2_PARAMS = {}
+
+# Argon2 runs on a bounded per-process pool (see authentication/hashing.py);
+# requests beyond MAX_PENDING get a 429 instead of piling up
+PASSWORD_HASHING = {
+    'WORKERS': config('PASSWORD_HASHING_WORKERS', default=2, cast=int),
+    'MAX_PENDING': config('PASSWORD_HASHING_MAX_PENDING', default=8, cast=int),
+    'RETRY_AFTER': 5,
+}
+
+# Login rate limiting
+# LocalMemoryBackend keeps counters per process; switch to CacheBackend
+# when running several workers so they share one view of failed attempts
+RATE_LIMIT = {
+    'BACKEND': config('RATE_LIMIT_BACKEND', default='authentication.ratelimit.LocalMemoryBackend'),
+    'LIMIT': 5,
+    'WINDOW_MINUTES': 15,
+    'MAX_KEYS': 10000,
+    'CACHE_ALIAS': 'default',
+}
+
+# Login audit trail
+# LoginAttempt rows are buffered in memory, journaled to SPOOL_DIR and
+# bulk inserted by a background thread
+LOGIN_AUDIT = {
+    'ENABLED': config('LOGIN_AUDIT_BUFFERED', default='True') in ['True', 'true', '1', 'yes'],
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 2.0,  # seconds
+    'MAX_QUEUE': 10000,
+    'SPOOL_DIR': BASE_DIR / 'var' / 'login_audit',
+}
+
+# Session activity (see authentication/session_activity.py)
+# Logins, logouts and last-seen times are buffered in memory and written
+# to user_sessions as batched upserts every FLUSH_INTERVAL seconds
+SESSION_ACTIVITY = {
+    'ENABLED': config('SESSION_ACTIVITY_BUFFERED', default='True') in ['True', 'true', '1', 'yes'],
+    'TRACK_REQUESTS': True,
+    'FLUSH_INTERVAL': 30.0,  # seconds
+    'MIN_TOUCH_INTERVAL': 60.0,  # seconds
+    'MAX_BUFFER': 10000,
+}
+
+# User-Agent classification for session tracking (see authentication/user_agents.py)
+USER_AGENTS = {
+    'CACHE_SIZE': 4096,  # distinct headers cached per process
+}
+
+# Client IP resolution (see authentication/client_ip.py)
+# X-Forwarded-For is only believed when the connection comes from one of
+# these networks. Only loopback by default: trusting whole private ranges
+# would let any host in the same VPC or pod network pick the IP that gets
+# rate limited. Deployments behind a proxy must set CLIENT_IP_TRUSTED_PROXIES
+# to that proxy's CIDRs (comma separated).
+CLIENT_IP = {
+    'TRUSTED_PROXIES': config('CLIENT_IP_TRUSTED_PROXIES', default='127.0.0.0/8,::1/128').split(','),
+    'IPV6_PREFIX': 64,  # IPv6 clients are rate limited per /64
+}
+
+if not DEBUG and not config('CLIENT_IP_TRUSTED_PROXIES', default=''):
+    print("⚠️  CLIENT_IP_TRUSTED_PROXIES is not set - X-Forwarded-For from your proxy is ignored")
+
+# Outbound mail queue
+# OTP, verification and reset emails are stored in outbound_emails and
+# delivered by sender threads (or `manage.py send_queued_mail`)
+EMAIL_QUEUE = {
+    'ENABLED': config('EMAIL_QUEUE_ENABLED', default='True') in ['True', 'true', '1', 'yes'],
+    'RUN_IN_PROCESS': config('EMAIL_QUEUE_IN_PROCESS', default='True') in ['True', 'true', '1', 'yes'],
+    'WORKERS': 2,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_SECONDS': 5,
+    'MAX_BACKOFF_SECONDS': 600,
+    'POLL_INTERVAL': 5.0,
+    'IDLE_CONNECTION_TIMEOUT': 60.0,
+    'STALE_CLAIM_SECONDS': 600,
+    'RETENTION_DAYS': 7,  # sent and failed rows are deleted after a week
+}
+
+# Full-page cache for the static marketing and footer pages
+# (see authentication/page_cache.py); bypassed while DEBUG is on
+PAGE_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 500,
+    'VERSION': config('RELEASE_VERSION', default=None),
+}
+
+
+# Username/email lookups in login_view (see authentication/identity.py)
+IDENTITY_CACHE = {
+    'NEGATIVE_TTL': 60,  # kept in CACHE_ALIAS, shared by all workers with REDIS_URL
+    'POSITIVE_TTL': 0,  # only enable with a cache shared by all workers
+    'CACHE_ALIAS': 'default',
+}
+
+# Caches
+# Local memory by default; set REDIS_URL when running several workers so
+# OTP codes, rate limits and identity entries are shared between them
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Pending login codes (see authentication/otp_store.py); kept out of the
+# users table and expired by the cache
+OTP_STORE = {
+    'BACKEND': 'authentication.otp_store.CacheBackend',
+    'CACHE_ALIAS': 'default',
+    'TTL': 600,
+    'MAX_ATTEMPTS': 5,  # shared by every code resent within TTL
+    'RESEND_LIMIT': 3,  # resends per user and per IP ...
+    'RESEND_WINDOW_MINUTES': 15,  # ... per this many minutes
+}
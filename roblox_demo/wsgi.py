@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'roblox_demo.settings')
 
 application = get_wsgi_application()
+
+# WSGI has no shutdown event; background writers (e.g. the login audit
+# buffer) are drained from atexit when the worker exits
+import authentication.shutdown  # noqa: E402,F401
+
+# Start building the username/email availability filter right away
+from authentication.availability import get_taken_identifiers  # noqa: E402
+
+get_taken_identifiers().start()